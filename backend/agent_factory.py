@@ -8,7 +8,7 @@ Description: 这是默认设置,请设置`customMade`, 打开koroFileHeader查
 '''
 
 try:
-    from agents import Agent, OpenAIChatCompletionsModel, ModelSettings, Runner, set_tracing_disabled, set_default_openai_api
+    from agents import Agent, OpenAIChatCompletionsModel, ModelSettings, Runner, RunConfig, set_tracing_disabled, set_default_openai_api
     if not hasattr(__import__('agents'), 'Agent'):
         raise ImportError
 except Exception:
@@ -25,10 +25,16 @@ from dotenv import dotenv_values
 from .utils.globals import (
     LLM_DEFAULT_BASE_URL, LMSTUDIO_DEFAULT_BASE_URL,
     GROQ_DEFAULT_BASE_URL, ANTHROPIC_DEFAULT_BASE_URL,
-    get_comfyui_copilot_api_key, is_lmstudio_url, detect_provider,
+    get_comfyui_copilot_api_key, get_language, is_lmstudio_url, detect_provider,
+    LLM_CLIENT_POOL_SIZE,
 )
+from .utils.ext_channel import with_ext_side_channel
 from openai import AsyncOpenAI
 import httpx
+import json
+import hashlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
 
 
 from agents._config import set_default_openai_api
@@ -54,6 +60,72 @@ import asyncio
 set_default_openai_api("chat_completions")
 set_tracing_disabled(False)
 
+# AsyncOpenAI clients by (base_url, api key hash, provider, timeout), least recently used first.
+# Reusing them keeps their keep-alive connections, so agents do not redo TLS handshakes.
+_openai_clients: "OrderedDict[tuple, AsyncOpenAI]" = OrderedDict()
+# Evicted clients are closed after this delay, so agent runs still using them can finish
+EVICTED_CLIENT_CLOSE_DELAY = 300.0
+# Pending close task -> evicted client (closed right away on shutdown)
+_closing_clients: Dict[asyncio.Task, AsyncOpenAI] = {}
+
+
+async def _close_evicted_client(client: AsyncOpenAI) -> None:
+    await asyncio.sleep(EVICTED_CLIENT_CLOSE_DELAY)
+    try:
+        await client.close()
+    except Exception:
+        pass
+
+
+def _schedule_client_close(client: AsyncOpenAI) -> None:
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        # No loop to close it on; its connection pool goes with the client object
+        return
+    task = loop.create_task(_close_evicted_client(client))
+    _closing_clients[task] = client
+    task.add_done_callback(lambda t: _closing_clients.pop(t, None))
+
+
+def get_openai_client(base_url: str, api_key: str, provider: str, timeout: httpx.Timeout) -> AsyncOpenAI:
+    key = (
+        base_url,
+        hashlib.sha256(api_key.encode("utf-8")).hexdigest(),
+        provider,
+        (timeout.connect, timeout.read, timeout.write, timeout.pool),
+    )
+    client = _openai_clients.get(key)
+    if client is not None:
+        _openai_clients.move_to_end(key)
+        return client
+
+    client = _openai_clients[key] = AsyncOpenAI(
+        api_key=api_key,
+        base_url=base_url,
+        timeout=timeout,
+        max_retries=1,
+    )
+    while len(_openai_clients) > max(1, LLM_CLIENT_POOL_SIZE):
+        _, evicted = _openai_clients.popitem(last=False)
+        _schedule_client_close(evicted)
+    return client
+
+
+async def close_openai_clients(app=None) -> None:
+    """Close all pooled clients (aiohttp on_shutdown hook)."""
+    clients = list(_openai_clients.values())
+    _openai_clients.clear()
+    for task, client in list(_closing_clients.items()):
+        task.cancel()
+        clients.append(client)
+    _closing_clients.clear()
+    for client in clients:
+        try:
+            await client.close()
+        except Exception:
+            pass
+
 
 def create_agent(**kwargs) -> Agent:
     # 通过用户配置拿/环境变量
@@ -111,13 +183,10 @@ def create_agent(**kwargs) -> Agent:
     }
     _timeout = timeout_map.get(provider, timeout_map["openai"])
 
-    client = AsyncOpenAI(
-        api_key=api_key,
-        base_url=sdk_base_url,
-        default_headers=default_headers,
-        timeout=_timeout,
-        max_retries=1,
-    )
+    # Per-request headers go on a copy that shares the pooled client's connections
+    client = get_openai_client(sdk_base_url, api_key, provider, _timeout)
+    if default_headers:
+        client = client.with_options(default_headers=default_headers)
 
     # Determine model with proper precedence:
     # 1) Explicit selection from config (model_select or model from frontend)
@@ -142,6 +211,56 @@ def create_agent(**kwargs) -> Agent:
     # Safety: ensure no stray 'model' remains in kwargs to avoid duplicate kwarg errors
     kwargs.pop("model", None)
 
+    # Tool ext payloads go to the stream handler, not back into the model context
+    if kwargs.get("tools"):
+        kwargs["tools"] = [with_ext_side_channel(tool) for tool in kwargs["tools"]]
+
     if config.get("max_tokens"):
         return Agent(model=model, model_settings=ModelSettings(max_tokens=config.get("max_tokens") or 8192), **kwargs)
-    return Agent(model=model, **kwargs)
\ No newline at end of file
+    return Agent(model=model, **kwargs)
+
+def cancel_streamed_run(result) -> None:
+    """Stop a Runner.run_streamed run (LLM calls and running tools) that has not completed."""
+    if result is not None and not getattr(result, "is_complete", False):
+        result.cancel()
+
+
+# Prebuilt agent graphs (see get_agent_template), least recently used first
+_AGENT_TEMPLATE_CACHE_SIZE = 32
+_agent_templates: "OrderedDict[tuple, Agent]" = OrderedDict()
+# Config entries that only identify the request; they never change how an agent is built
+_PER_REQUEST_CONFIG_KEYS = ("session_id", "workflow_checkpoint_id")
+
+
+def get_agent_template(kind: str, config: Optional[Dict[str, Any]],
+                       build: Callable[[Dict[str, Any]], Agent], *key: Any) -> Agent:
+    """
+    The agent graph returned by build(config), built once per (kind, LLM
+    config, language, *key) and reused by later requests.
+
+    build gets the config without its per-request entries and must not
+    capture other request state: tools and handoff callbacks read it from the
+    request context, and the session header is sent per run through
+    session_run_config(). Attach per-request MCP servers with agent.clone().
+    """
+    shared_config = {k: v for k, v in (config or {}).items() if k not in _PER_REQUEST_CONFIG_KEYS}
+    # create_agent falls back to the Copilot API key when the config has none
+    llm_key = json.dumps([shared_config, get_comfyui_copilot_api_key()], sort_keys=True, default=str)
+    cache_key = (kind, hashlib.sha256(llm_key.encode("utf-8")).hexdigest(), get_language(), *key)
+
+    agent = _agent_templates.get(cache_key)
+    if agent is not None:
+        _agent_templates.move_to_end(cache_key)
+        return agent
+
+    agent = _agent_templates[cache_key] = build(shared_config)
+    while len(_agent_templates) > _AGENT_TEMPLATE_CACHE_SIZE:
+        _agent_templates.popitem(last=False)
+    return agent
+
+
+def session_run_config(config: Optional[Dict[str, Any]]) -> RunConfig:
+    """Run config carrying the per-request X-Session-ID header for every agent of the run."""
+    session_id = (config or {}).get("session_id")
+    headers = {"X-Session-ID": session_id} if session_id else None
+    return RunConfig(model_settings=ModelSettings(extra_headers=headers))
@@ -24,9 +24,15 @@ from ..service.debug_agent import debug_workflow_errors
 from ..service.agent_mode import agent_mode_invoke
 from ..dao.workflow_table import save_workflow_data, get_workflow_data_by_id, update_workflow_ui_by_id
 from ..service.mcp_client import comfyui_agent_invoke
+from ..service.mcp_pool import start_mcp_warmup
+from ..agent_factory import close_openai_clients
 from ..utils.request_context import set_request_context, get_session_id
 from ..utils.logger import log
 from ..utils.modelscope_gateway import ModelScopeGateway
+from ..utils.comfy_gateway import invalidate_object_info_cache
+from ..utils.stream_writer import CoalescingStreamWriter, DisconnectWatcher, is_client_connected, CLIENT_DISCONNECT_POLL_INTERVAL
+from ..utils.stream_replay import start_stream_replay, get_stream_replay
+from ..utils.workflow_patch import WorkflowPatchEncoder
 import folder_paths
 
 
@@ -42,6 +48,16 @@ def get_llm_config_from_headers(request):
     }
 
 
+# Connect the MCP servers and cache their tool schemas while ComfyUI starts;
+# close the pooled LLM clients when it shuts down
+try:
+    server.PromptServer.instance.app.on_startup.append(start_mcp_warmup)
+    server.PromptServer.instance.app.on_shutdown.append(close_openai_clients)
+except RuntimeError as e:
+    # The app is already running (plugin loaded late); requests warm the pool instead
+    log.warning(f"MCP warmup / LLM client cleanup not scheduled: {e}")
+
+
 # 全局下载进度存储
 download_progress = {}
 download_lock = threading.Lock()
@@ -83,6 +99,16 @@ class ChatResponse(TypedDict):
     format: str  # 返回的格式
     ext: Optional[List[ExtItem]]  # 扩展信息
 
+class ChatDeltaResponse(ChatResponse, total=False):
+    offset: int  # 增量协议：text 在完整文本中的起始位置（客户端执行 text = text[:offset] + frame.text）
+
+# /api/chat/invoke 流式协议版本，客户端通过请求体中的 stream_protocol 选择
+STREAM_PROTOCOL_FULL = 1   # 每帧发送完整的累计文本（默认，兼容旧前端）
+STREAM_PROTOCOL_DELTA = 2  # 每帧只发送新增文本和 offset，最后一帧 offset=0 携带完整文本
+
+# 增量协议下用于检测累计文本被改写（而不是追加）的尾部校验长度
+_DELTA_PROBE_CHARS = 32
+
 # 下载进度回调类
 class DownloadProgressCallback:
     def __init__(self, id: str, filename: str, file_size: int, download_id: str):
@@ -213,6 +239,22 @@ async def upload_to_oss(file_data: bytes, filename: str) -> str:
         base64_data = base64.b64encode(file_data).decode('utf-8')
         return f"data:image/jpeg;base64,{base64_data}"
 
+def get_workflow_patch_encoder(req_json, session_id) -> Optional[WorkflowPatchEncoder]:
+    """Patch encoder for clients that opted in (workflow_patch=true), based on their workflow checkpoint."""
+    if not req_json.get('workflow_patch'):
+        return None
+    base_version_id = req_json.get('workflow_checkpoint_id')
+    base_workflow = None
+    if base_version_id:
+        try:
+            version = get_workflow_data_by_id(int(base_version_id))
+            # A checkpoint of another session is not what this client holds
+            if version and version.get('session_id') == session_id:
+                base_workflow = version.get('workflow_data')
+        except Exception as e:
+            log.warning(f"Failed to load workflow checkpoint {base_version_id} as patch base: {e}")
+    return WorkflowPatchEncoder(base_version_id, base_workflow)
+
 # 关联用户消息和AI响应的checkpoint信息
 def processMessagesWithCheckpoints(messages):
     # ... existing code ...
@@ -245,6 +287,7 @@ async def invoke_chat(request):
     ext = req_json.get('ext')
     historical_messages = req_json.get('messages', [])
     workflow_checkpoint_id = req_json.get('workflow_checkpoint_id')
+    stream_protocol = STREAM_PROTOCOL_DELTA if req_json.get('stream_protocol') == STREAM_PROTOCOL_DELTA else STREAM_PROTOCOL_FULL
     
     # 获取当前语言
     language = request.headers.get('Accept-Language', 'en')
@@ -283,6 +326,15 @@ async def invoke_chat(request):
     openai_messages = historical_messages
     
     # 不再需要创建用户消息存储到后端，前端负责消息存储
+    # Frames carry event ids and stay resumable via /api/chat/resume
+    replay = start_stream_replay(session_id)
+    writer = CoalescingStreamWriter(response, replay=replay)
+    patch_encoder = get_workflow_patch_encoder(req_json, session_id)
+    # Pass messages in OpenAI format (images are now included in messages)
+    # Config is now available through request context
+    stream = comfyui_agent_invoke(openai_messages, None)
+    # Cancel the run when the client goes away
+    watcher = DisconnectWatcher(request, replay)
 
     try:
         # Call the MCP client to get streaming response with historical messages and image support
@@ -292,12 +344,41 @@ async def invoke_chat(request):
         finished = True  # Default to True
         has_sent_response = False
         previous_text_length = 0
+        sent_probe = ""  # tail of the text already sent (delta protocol)
+
+        def build_text_frame():
+            # Called at flush time, so coalesced updates are sent as one frame
+            nonlocal previous_text_length, sent_probe
+            if stream_protocol == STREAM_PROTOCOL_DELTA:
+                # Only the appended text; resend from 0 if the text was rewritten rather than extended
+                probe_start = max(0, previous_text_length - _DELTA_PROBE_CHARS)
+                offset = previous_text_length if accumulated_text[probe_start:previous_text_length] == sent_probe else 0
+                chat_response = ChatDeltaResponse(
+                    session_id=session_id,
+                    text=accumulated_text[offset:],
+                    finished=False,
+                    type="message",
+                    format="markdown",
+                    ext=None,
+                    offset=offset
+                )
+                sent_probe = accumulated_text[max(0, len(accumulated_text) - _DELTA_PROBE_CHARS):]
+            else:
+                chat_response = ChatResponse(
+                    session_id=session_id,
+                    text=accumulated_text,
+                    finished=False,  # Always false during streaming
+                    type="message",
+                    format="markdown",
+                    ext=None  # ext is only sent in final response
+                )
+            previous_text_length = len(accumulated_text)
+            return chat_response
         
         log.info(f"config: {config}")
         
-        # Pass messages in OpenAI format (images are now included in messages)
-        # Config is now available through request context
-        async for result in comfyui_agent_invoke(openai_messages, None):
+        queued_text_length = 0
+        async for result in stream:
             # The MCP client now returns tuples (text, ext_with_finished) where ext_with_finished includes finished status
             if isinstance(result, tuple) and len(result) == 2:
                 text, ext_with_finished = result
@@ -316,21 +397,11 @@ async def invoke_chat(request):
                     accumulated_text += text_chunk
                     log.info(f"-- Received text chunk: '{text_chunk}', total length: {len(accumulated_text)}")
             
-            # Send streaming response if we have new text content
+            # Queue a streaming response if we have new text content
             # Only send intermediate responses during streaming (not the final one)
-            if accumulated_text and len(accumulated_text) > previous_text_length:
-                chat_response = ChatResponse(
-                    session_id=session_id,
-                    text=accumulated_text,
-                    finished=False,  # Always false during streaming
-                    type="message",
-                    format="markdown",
-                    ext=None  # ext is only sent in final response
-                )
-                
-                await response.write(json.dumps(chat_response).encode() + b"\n")
-                previous_text_length = len(accumulated_text)
-                await asyncio.sleep(0.01)  # Small delay for streaming effect
+            if accumulated_text and len(accumulated_text) > queued_text_length:
+                await writer.write_text(build_text_frame, len(accumulated_text) - queued_text_length)
+                queued_text_length = len(accumulated_text)
 
         # Send final response with proper finished logic from MCP client
         log.info(f"-- Sending final response: {len(accumulated_text)} chars, ext: {bool(ext_data)}, finished: {finished}")
@@ -341,14 +412,25 @@ async def invoke_chat(request):
             finished=finished,  # Use finished status from MCP client
             type="message",
             format="markdown",
-            ext=ext_data
+            ext=patch_encoder.encode(ext_data) if patch_encoder else ext_data
         )
+        if stream_protocol == STREAM_PROTOCOL_DELTA:
+            # The final frame always carries the full text
+            final_response = ChatDeltaResponse(**final_response, offset=0)
         
-        await response.write(json.dumps(final_response).encode() + b"\n")
+        # The final frame carries the full text, so pending text frames are dropped
+        await writer.send(final_response, replaces_text=True)
 
         # AI响应不再存储到后端，前端负责消息存储
 
+    except asyncio.CancelledError:
+        if not watcher.disconnected:
+            raise
+        return response
     except Exception as e:
+        if replay is None and not is_client_connected(request):
+            log.info(f"Client disconnected during invoke_chat: {e}")
+            return response
         log.error(f"Error in invoke_chat: {str(e)}")
         error_response = ChatResponse(
             session_id=session_id,
@@ -358,9 +440,71 @@ async def invoke_chat(request):
             format="text",
             ext=None
         )
-        await response.write(json.dumps(error_response).encode() + b"\n")
+        if stream_protocol == STREAM_PROTOCOL_DELTA:
+            error_response = ChatDeltaResponse(**error_response, offset=0)
+        await writer.send(error_response, replaces_text=True)
+    finally:
+        watcher.stop()
+        if replay is not None:
+            replay.finish()
+        # Closing the generator stops the agent run and its MCP sessions
+        await stream.aclose()
+
+    await writer.finish()
+    return response
 
-    await response.write_eof()
+
+@server.PromptServer.instance.routes.get("/api/chat/resume")
+async def resume_stream(request):
+    """
+    Resume the latest chat / agent-mode stream of a session after a dropped
+    connection: replays the frames after last_event_id, then follows the run
+    until it finishes.
+    """
+    session_id = request.query.get('session_id')
+    try:
+        last_event_id = int(request.query.get('last_event_id', 0))
+    except ValueError:
+        return web.json_response({"success": False, "message": "Invalid last_event_id format"}, status=400)
+
+    replay = get_stream_replay(session_id) if session_id else None
+    if replay is None:
+        return web.json_response({"success": False, "message": "No resumable stream for this session"}, status=404)
+    if replay.frames_after(last_event_id) is None:
+        return web.json_response({"success": False, "message": "Requested events are no longer buffered"}, status=410)
+
+    log.info(f"Resuming stream for session {session_id} after event {last_event_id}")
+    response = web.StreamResponse(
+        status=200,
+        reason='OK',
+        headers={
+            'Content-Type': 'application/json',
+            'X-Content-Type-Options': 'nosniff'
+        }
+    )
+    await response.prepare(request)
+
+    replay.readers += 1
+    try:
+        while True:
+            finished = replay.finished
+            frames = replay.frames_after(last_event_id)
+            if frames is None:
+                log.warning(f"Resumed stream for session {session_id} fell behind the replay buffer")
+                break
+            for event_id, payload in frames:
+                await response.write(payload)
+                last_event_id = event_id
+            if finished:
+                break
+            await replay.wait(CLIENT_DISCONNECT_POLL_INTERVAL)
+            if not is_client_connected(request):
+                return response
+        await response.write_eof()
+    except ConnectionError as e:
+        log.info(f"Resumed stream client disconnected: {e}")
+    finally:
+        replay.readers -= 1
     return response
 
 
@@ -537,13 +681,17 @@ async def invoke_debug(request):
     log.info(f"Session ID: {session_id}")
     log.info(f"Workflow nodes: {list(workflow_data.keys()) if workflow_data else 'None'}")
 
+    stream = debug_workflow_errors(workflow_data)
+    # Cancel the run when the client goes away
+    watcher = DisconnectWatcher(request)
+
     try:
         # Call the debug agent with streaming response
         accumulated_text = ""
         final_ext_data = None
         finished = False
         
-        async for result in debug_workflow_errors(workflow_data):
+        async for result in stream:
             # Stream the response
             if isinstance(result, tuple) and len(result) == 2:
                 text, ext = result
@@ -666,7 +814,14 @@ async def invoke_debug(request):
         await response.write(json.dumps(final_response).encode() + b"\n")
         log.info("Debug agent processing complete")
 
+    except asyncio.CancelledError:
+        if not watcher.disconnected:
+            raise
+        return response
     except Exception as e:
+        if not is_client_connected(request):
+            log.info(f"Client disconnected during debug agent run: {e}")
+            return response
         log.error(f"Error in debug agent: {str(e)}")
         import traceback
         traceback.print_exc()
@@ -680,6 +835,10 @@ async def invoke_debug(request):
             ext=[{"type": "error", "data": {"error": str(e)}}]
         )
         await response.write(json.dumps(error_response).encode() + b"\n")
+    finally:
+        watcher.stop()
+        # Closing the generator stops the agent run
+        await stream.aclose()
 
     await response.write_eof()
     return response
@@ -903,6 +1062,9 @@ async def download_model(request):
                     log.info(f"Moved {moved_count} files with extensions {sorted(list(allowed_exts))} to: {resolved_dest_dir}")
                 except Exception as move_err:
                     log.error(f"Post-download move failed: {move_err}")
+
+                # 新模型文件会改变节点的枚举选项，丢弃缓存的节点目录
+                invalidate_object_info_cache()
                 
             except Exception as e:
                 progress_callback.fail(str(e))
@@ -1131,20 +1293,45 @@ async def invoke_agent_mode(request):
     log.info(f"Agent mode config: model={config.get('model')}, session={session_id}")
     log.info(f"Agent mode goal: {goal}")
 
+    # Frames carry event ids and stay resumable via /api/chat/resume
+    replay = start_stream_replay(session_id)
+    writer = CoalescingStreamWriter(response, replay=replay)
+    patch_encoder = get_workflow_patch_encoder(req_json, session_id)
+    encode_ext = patch_encoder.encode if patch_encoder else (lambda ext: ext)
+    stream = agent_mode_invoke(messages, goal=goal)
+    # Cancel the run when the client goes away
+    watcher = DisconnectWatcher(request, replay)
+
     try:
         accumulated_text = ""
         final_ext_data = None
+        # Encoded once: the encoder moves its base to each item's version, so
+        # encoding the same ext again would produce an empty patch
+        encoded_final_ext = None
         finished = False
-
-        async for result in agent_mode_invoke(messages, goal=goal):
+        queued_text_length = 0
+
+        def build_text_frame():
+            return ChatResponse(
+                session_id=session_id,
+                text=accumulated_text,
+                finished=False,
+                type="agent_mode",
+                format="markdown",
+                ext=None
+            )
+
+        async for result in stream:
             if isinstance(result, tuple) and len(result) == 2:
                 text, ext = result
                 if text:
                     accumulated_text = text
 
                 if ext:
+                    # ext frames are flushed immediately; they carry the full text too
                     if isinstance(ext, dict) and "data" in ext and "finished" in ext:
                         final_ext_data = ext["data"]
+                        encoded_final_ext = encode_ext(final_ext_data)
                         finished = ext["finished"]
 
                         chat_response = ChatResponse(
@@ -1153,32 +1340,23 @@ async def invoke_agent_mode(request):
                             finished=finished,
                             type="agent_mode",
                             format="markdown",
-                            ext=final_ext_data
+                            ext=encoded_final_ext
                         )
-                        await response.write(json.dumps(chat_response).encode() + b"\n")
                     else:
                         final_ext_data = ext
+                        encoded_final_ext = encode_ext(ext if isinstance(ext, list) else [ext])
                         chat_response = ChatResponse(
                             session_id=session_id,
                             text=accumulated_text,
                             finished=False,
                             type="agent_mode",
                             format="markdown",
-                            ext=ext if isinstance(ext, list) else [ext] if ext else None
+                            ext=encoded_final_ext
                         )
-                        await response.write(json.dumps(chat_response).encode() + b"\n")
+                    await writer.send(chat_response, replaces_text=True)
                 else:
-                    chat_response = ChatResponse(
-                        session_id=session_id,
-                        text=accumulated_text,
-                        finished=False,
-                        type="agent_mode",
-                        format="markdown",
-                        ext=None
-                    )
-                    await response.write(json.dumps(chat_response).encode() + b"\n")
-
-                await asyncio.sleep(0.01)
+                    await writer.write_text(build_text_frame, max(0, len(accumulated_text) - queued_text_length))
+                queued_text_length = len(accumulated_text)
 
         # Final response
         final_response = ChatResponse(
@@ -1187,11 +1365,18 @@ async def invoke_agent_mode(request):
             finished=True,
             type="agent_mode",
             format="markdown",
-            ext=final_ext_data if isinstance(final_ext_data, list) else [{"type": "agent_complete", "data": {"status": "completed"}}]
+            ext=encoded_final_ext if isinstance(final_ext_data, list) else [{"type": "agent_complete", "data": {"status": "completed"}}]
         )
-        await response.write(json.dumps(final_response).encode() + b"\n")
+        await writer.send(final_response, replaces_text=True)
 
+    except asyncio.CancelledError:
+        if not watcher.disconnected:
+            raise
+        return response
     except Exception as e:
+        if replay is None and not is_client_connected(request):
+            log.info(f"Client disconnected during agent mode run: {e}")
+            return response
         log.error(f"Agent mode error: {e}")
         import traceback
         traceback.print_exc()
@@ -1203,7 +1388,13 @@ async def invoke_agent_mode(request):
             format="markdown",
             ext=[{"type": "agent_error", "data": {"error": str(e)}}]
         )
-        await response.write(json.dumps(error_response).encode() + b"\n")
-
-    await response.write_eof()
+        await writer.send(error_response, replaces_text=True)
+    finally:
+        watcher.stop()
+        if replay is not None:
+            replay.finish()
+        # Closing the generator stops the agent run and its MCP sessions
+        await stream.aclose()
+
+    await writer.finish()
     return response
\ No newline at end of file
@@ -7,7 +7,8 @@ from ..dao.expert_table import (
     get_rewrite_expert,
     list_rewrite_experts,
     update_rewrite_expert_by_id,
-    delete_rewrite_expert_by_id
+    delete_rewrite_expert_by_id,
+    invalidate_rewrite_experts_cache
 )
 
 # 配置日志
@@ -55,6 +56,7 @@ async def create_expert(request):
             content=validated_data['content']
         )
         
+        invalidate_rewrite_experts_cache()
         logger.info(f"成功创建专家记录，ID: {expert_id}")
         
         return web.json_response({"success": True, "message": "创建成功", "data": {"id": expert_id}}, status=200)
@@ -120,6 +122,7 @@ async def update_expert(request):
         if not success:
             return web.json_response({"success": False, "message": "ID不存在", "data": None}, status=404)
         
+        invalidate_rewrite_experts_cache()
         logger.info(f"成功更新专家记录，ID: {expert_id}")
         
         return web.json_response({"success": True, "message": "更新成功", "data": {"id": expert_id}}, status=200)
@@ -138,6 +141,7 @@ async def delete_expert(request):
         if not success:
             return web.json_response({"success": False, "message": "ID不存在", "data": None}, status=404)
         
+        invalidate_rewrite_experts_cache()
         logger.info(f"成功删除专家记录，ID: {expert_id}")
         
         return web.json_response({"success": True, "message": "删除成功", "data": {"id": expert_id}}, status=200)
@@ -180,6 +184,7 @@ async def partial_update_expert(request):
         if not success:
             return web.json_response({"success": False, "message": "ID不存在", "data": None}, status=404)
         
+        invalidate_rewrite_experts_cache()
         logger.info(f"成功部分更新专家记录，ID: {expert_id}")
         
         return web.json_response({"success": True, "message": "更新成功", "data": {"id": expert_id}}, status=200)
@@ -1,6 +1,6 @@
 import os
 import json
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
@@ -174,10 +174,11 @@ class DatabaseManager:
             session.close()
     
     def list_rewrite_experts_short(self) -> List[Dict[str, Any]]:
-        """获取所有专家记录，按ID倒序"""
+        """获取所有专家的名称和描述，按ID排序（不加载content）"""
         session = self.get_session()
         try:
-            experts = session.query(RewriteExpert).order_by(RewriteExpert.id.asc()).all()
+            experts = session.query(RewriteExpert.id, RewriteExpert.name, RewriteExpert.description) \
+                .order_by(RewriteExpert.id.asc()).all()
             return [{"name": e.name, "description": e.description} for e in experts]
         finally:
             session.close()
@@ -277,8 +278,26 @@ def update_rewrite_expert_by_id(expert_id: int, name: Optional[str] = None, desc
 def delete_rewrite_expert_by_id(expert_id: int) -> bool:
     return db_manager.delete_rewrite_expert(expert_id)
 
+# 专家简要列表的内存缓存（每条聊天消息的改写agent提示词都会用到）。
+# 专家增删改后由 expert_api 调用 invalidate_rewrite_experts_cache() 使其失效。
+_experts_version = 0
+_experts_short_cache: Optional[Tuple[int, List[Dict[str, Any]]]] = None
+
+def invalidate_rewrite_experts_cache() -> None:
+    global _experts_version
+    _experts_version += 1
+
 def list_rewrite_experts_short() -> List[Dict[str, Any]]:
-    return db_manager.list_rewrite_experts_short()
+    """专家简要列表（缓存，调用方不要修改返回值）"""
+    global _experts_short_cache
+    # 先取版本号：查询期间发生的修改会让这次的结果在下次读取时失效
+    version = _experts_version
+    cached = _experts_short_cache
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    experts = db_manager.list_rewrite_experts_short()
+    _experts_short_cache = (version, experts)
+    return experts
 
 def get_rewrite_expert_by_name(name: str) -> Optional[Dict[str, Any]]:
     return db_manager.get_rewrite_expert_by_name(name)
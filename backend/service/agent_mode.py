@@ -19,7 +19,6 @@ try:
     from agents.items import ItemHelpers
     from agents.run import Runner
     from agents.tool import function_tool
-    from agents.mcp import MCPServerSse
     if not hasattr(__import__('agents'), 'Agent'):
         raise ImportError
 except Exception:
@@ -32,7 +31,7 @@ except Exception:
 from openai.types.responses import ResponseTextDeltaEvent
 from openai import APIError
 
-from ..agent_factory import create_agent
+from ..agent_factory import create_agent, cancel_streamed_run, get_agent_template, session_run_config
 from ..utils.globals import (
     BACKEND_BASE_URL,
     WORKFLOW_MODEL_NAME,
@@ -41,7 +40,9 @@ from ..utils.globals import (
     DISABLE_WORKFLOW_GEN,
     detect_provider,
 )
+from ..service.mcp_pool import get_mcp_server, prefetch_mcp_tools, COPILOT_MCP_URL, BING_MCP_URL
 from ..utils.request_context import get_session_id, get_config
+from ..utils.ext_channel import open_ext_channel, take_tool_ext
 from ..utils.logger import log
 from ..service.agent_mode_tools import (
     reset_task_queue,
@@ -128,30 +129,8 @@ async def agent_mode_invoke(
         mcp_servers: list = []
 
         if not is_constrained:
-            mcp_server = MCPServerSse(
-                params={
-                    "url": BACKEND_BASE_URL + "/mcp-server/mcp",
-                    "timeout": _MCP_TIMEOUT,
-                    "headers": {
-                        "X-Session-Id": session_id,
-                        "Authorization": f"Bearer {get_comfyui_copilot_api_key()}",
-                    },
-                },
-                cache_tools_list=True,
-                client_session_timeout_seconds=_MCP_SESSION,
-            )
-            bing_server = MCPServerSse(
-                params={
-                    "url": "https://mcp.api-inference.modelscope.net/8c9fe550938e4f/sse",
-                    "timeout": _MCP_TIMEOUT,
-                    "headers": {
-                        "X-Session-Id": session_id,
-                        "Authorization": f"Bearer {get_comfyui_copilot_api_key()}",
-                    },
-                },
-                cache_tools_list=True,
-                client_session_timeout_seconds=_MCP_SESSION,
-            )
+            mcp_server = get_mcp_server(COPILOT_MCP_URL, timeout=_MCP_TIMEOUT, session_timeout=_MCP_SESSION)
+            bing_server = get_mcp_server(BING_MCP_URL, timeout=_MCP_TIMEOUT, session_timeout=_MCP_SESSION)
             mcp_servers = [mcp_server, bing_server]
 
         # Choose tool set based on provider capacity.
@@ -183,6 +162,7 @@ async def agent_mode_invoke(
         _ctx2 = bing_server if bing_server else _NullCtx()
 
         async with _ctx1, _ctx2:
+            await prefetch_mcp_tools(mcp_servers)
             local_names = [getattr(t, "__name__", str(t)) for t in local_tools]
             log.info(
                 f"[AgentMode] provider={provider}, constrained={is_constrained}, "
@@ -190,19 +170,26 @@ async def agent_mode_invoke(
             )
 
             # ---- Build Agent Mode agent ----
-            agent = create_agent(
-                name="ComfyUI-Agent",
-                instructions=_build_agent_instructions(is_constrained),
-                mcp_servers=mcp_servers,
-                tools=local_tools,
-                config=config,
-            )
+            # Prebuilt per LLM config / constrained flag; only the MCP server leases are per request
+            agent = get_agent_template(
+                "agent_mode", config,
+                lambda shared_config: create_agent(
+                    name="ComfyUI-Agent",
+                    instructions=_build_agent_instructions(is_constrained),
+                    tools=local_tools,
+                    config=shared_config,
+                ),
+                is_constrained,
+            ).clone(mcp_servers=mcp_servers)
 
             # ---- Stream the agent run ----
+            # Tool ext payloads are delivered through the side channel (keyed by tool call id)
+            open_ext_channel()
             result = Runner.run_streamed(
                 agent,
                 input=messages,
                 max_turns=25,  # Enough for complex workflows, but prevents hour-long loops
+                run_config=session_run_config(config),
             )
 
             current_text = ""
@@ -305,123 +292,133 @@ async def agent_mode_invoke(
                             # When a tool like save_workflow returns an "ext" key,
                             # yield it immediately so the frontend can apply the
                             # workflow to the canvas in real time.
+                            side_ext = take_tool_ext(event.item)
+                            if side_ext:
+                                ext_data = side_ext
+                                # Yield immediately with ext data so the
+                                # frontend applies it to the canvas NOW
+                                yield (current_text, ext_data)
+                                continue
+                            # Tools outside the side channel still return ext inline
                             try:
                                 out = json.loads(str(event.item.output))
                                 if "ext" in out and out["ext"]:
                                     ext_data = out["ext"]
-                                    # Yield immediately with ext data so the
-                                    # frontend applies it to the canvas NOW
                                     yield (current_text, ext_data)
                             except (json.JSONDecodeError, TypeError):
                                 pass
                         continue
 
-            while retry_count <= max_retries:
-                try:
-                    async for chunk in _process_events(result):
-                        yield chunk
-                    break  # success
-                except (AttributeError, TypeError, ConnectionError, OSError, APIError, TimeoutError, asyncio.TimeoutError, Exception) as e:
-                    retry_count += 1
-                    err = str(e)
-
-                    # --- failed_generation: model couldn't produce valid tool call JSON ---
-                    is_failed_gen = (
-                        "failed_generation" in err.lower()
-                        or "failed to call a function" in err.lower()
-                    )
-                    if is_failed_gen:
-                        if retry_count <= max_retries:
-                            # Retry once — Groq is probabilistic, often succeeds on second try
-                            log.warning(f"[AgentMode] failed_generation (attempt {retry_count}/{max_retries}), retrying...")
-                            await asyncio.sleep(1)
-                            result = Runner.run_streamed(agent, input=messages, max_turns=25)
-                            continue
-                        failed_msg = (
-                            "\n\n\u274c **Tool call failed** \u2014 the model couldn't generate valid function call JSON.\n\n"
-                            "**Try:**\n"
-                            "- Send the request again (may succeed on retry)\n"
-                            "- Use a simpler, shorter request\n"
-                            "- Try a different model (some handle tool calling better)\n"
+            try:
+                while retry_count <= max_retries:
+                    try:
+                        async for chunk in _process_events(result):
+                            yield chunk
+                        break  # success
+                    except (AttributeError, TypeError, ConnectionError, OSError, APIError, TimeoutError, asyncio.TimeoutError, Exception) as e:
+                        retry_count += 1
+                        err = str(e)
+
+                        # --- failed_generation: model couldn't produce valid tool call JSON ---
+                        is_failed_gen = (
+                            "failed_generation" in err.lower()
+                            or "failed to call a function" in err.lower()
                         )
-                        log.error(f"[AgentMode] failed_generation: {err}")
-                        current_text += failed_msg
-                        yield (current_text, None)
-                        break
-
-                    # --- 413 / rate-limit: message too large or TPM exceeded ---
-                    is_rate_limit = (
-                        "413" in err or "rate_limit" in err.lower()
-                        or "request too large" in err.lower()
-                        or "tokens per minute" in err.lower()
-                        or "429" in err
-                    )
-                    if is_rate_limit:
-                        if retry_count <= max_retries:
-                            # Wait for the rate limit window to reset, then retry
-                            # with only the last user message (drop all history)
-                            wait_msg = "\n\n⏳ Rate limit hit — waiting 30s before retrying with trimmed history...\n"
-                            current_text += wait_msg
+                        if is_failed_gen:
+                            if retry_count <= max_retries:
+                                # Retry once — Groq is probabilistic, often succeeds on second try
+                                log.warning(f"[AgentMode] failed_generation (attempt {retry_count}/{max_retries}), retrying...")
+                                await asyncio.sleep(1)
+                                result = Runner.run_streamed(agent, input=messages, max_turns=25, run_config=session_run_config(config))
+                                continue
+                            failed_msg = (
+                                "\n\n\u274c **Tool call failed** \u2014 the model couldn't generate valid function call JSON.\n\n"
+                                "**Try:**\n"
+                                "- Send the request again (may succeed on retry)\n"
+                                "- Use a simpler, shorter request\n"
+                                "- Try a different model (some handle tool calling better)\n"
+                            )
+                            log.error(f"[AgentMode] failed_generation: {err}")
+                            current_text += failed_msg
                             yield (current_text, None)
-                            log.warning(f"[AgentMode] Rate limit hit (attempt {retry_count}), waiting 30s...")
-                            await asyncio.sleep(30)
-                            # Retry with only the last message
-                            trimmed = [m for m in messages if True][-1:]
-                            result = Runner.run_streamed(agent, input=trimmed, max_turns=25)
-                            continue
-                        rate_msg = (
-                            "\n\n⚠️ **Rate limit exceeded** — the model's tokens-per-minute limit was hit twice.\n\n"
-                            "**Try:**\n"
-                            "- Wait a minute, then send the request again\n"
-                            "- Start a **new** Agent Mode conversation (shorter history)\n"
-                            "- Upgrade your Groq plan for higher TPM limits\n"
-                        )
-                        log.error(f"[AgentMode] Rate limit / 413: {err}")
-                        current_text += rate_msg
-                        yield (current_text, None)
-                        break
-
-                    # Detect timeout errors specifically — these usually mean
-                    # LMStudio's tool-call SamplingSwitch hung.  Retrying the
-                    # exact same request will hit the same wall, so give the
-                    # user an actionable message instead of silently retrying.
-                    is_timeout = isinstance(e, (TimeoutError, asyncio.TimeoutError)) or any(t in err.lower() for t in [
-                        "timed out", "timeout", "read timeout", "clientrequest",
-                    ])
-                    if is_timeout:
-                        timeout_hint = (
-                            "\n\n⏱️ **Request timed out** while waiting for a response. "
-                            "This can happen when the MCP server or LLM takes too long.\n\n"
-                            "**Try:**\n"
-                            "- Send the request again (may succeed on retry)\n"
-                            "- Use a faster cloud model (e.g. Groq `llama-3.3-70b-versatile`)\n"
-                            "- Simplify your request to fewer steps\n"
-                            "- If using a local model, ensure it's not overloaded\n"
+                            break
+
+                        # --- 413 / rate-limit: message too large or TPM exceeded ---
+                        is_rate_limit = (
+                            "413" in err or "rate_limit" in err.lower()
+                            or "request too large" in err.lower()
+                            or "tokens per minute" in err.lower()
+                            or "429" in err
                         )
-                        log.error(f"[AgentMode] Timeout detected: {err}")
-                        current_text += timeout_hint
-                        yield (current_text, None)
-                        break  # don't retry timeouts
-
-                    should_retry = any(
-                        s in err
-                        for s in [
-                            "'NoneType' object has no attribute 'strip'",
-                            "Connection broken",
-                            "InvalidChunkLength",
-                            "socket hang up",
-                            "Connection reset",
-                        ]
-                    )
-                    if should_retry and retry_count <= max_retries:
-                        wait = min(2 ** (retry_count - 1), 10)
-                        log.error(f"[AgentMode] Stream error (attempt {retry_count}/{max_retries}): {err}")
-                        if current_text:
+                        if is_rate_limit:
+                            if retry_count <= max_retries:
+                                # Wait for the rate limit window to reset, then retry
+                                # with only the last user message (drop all history)
+                                wait_msg = "\n\n⏳ Rate limit hit — waiting 30s before retrying with trimmed history...\n"
+                                current_text += wait_msg
+                                yield (current_text, None)
+                                log.warning(f"[AgentMode] Rate limit hit (attempt {retry_count}), waiting 30s...")
+                                await asyncio.sleep(30)
+                                # Retry with only the last message
+                                trimmed = [m for m in messages if True][-1:]
+                                result = Runner.run_streamed(agent, input=trimmed, max_turns=25, run_config=session_run_config(config))
+                                continue
+                            rate_msg = (
+                                "\n\n⚠️ **Rate limit exceeded** — the model's tokens-per-minute limit was hit twice.\n\n"
+                                "**Try:**\n"
+                                "- Wait a minute, then send the request again\n"
+                                "- Start a **new** Agent Mode conversation (shorter history)\n"
+                                "- Upgrade your Groq plan for higher TPM limits\n"
+                            )
+                            log.error(f"[AgentMode] Rate limit / 413: {err}")
+                            current_text += rate_msg
+                            yield (current_text, None)
+                            break
+
+                        # Detect timeout errors specifically — these usually mean
+                        # LMStudio's tool-call SamplingSwitch hung.  Retrying the
+                        # exact same request will hit the same wall, so give the
+                        # user an actionable message instead of silently retrying.
+                        is_timeout = isinstance(e, (TimeoutError, asyncio.TimeoutError)) or any(t in err.lower() for t in [
+                            "timed out", "timeout", "read timeout", "clientrequest",
+                        ])
+                        if is_timeout:
+                            timeout_hint = (
+                                "\n\n⏱️ **Request timed out** while waiting for a response. "
+                                "This can happen when the MCP server or LLM takes too long.\n\n"
+                                "**Try:**\n"
+                                "- Send the request again (may succeed on retry)\n"
+                                "- Use a faster cloud model (e.g. Groq `llama-3.3-70b-versatile`)\n"
+                                "- Simplify your request to fewer steps\n"
+                                "- If using a local model, ensure it's not overloaded\n"
+                            )
+                            log.error(f"[AgentMode] Timeout detected: {err}")
+                            current_text += timeout_hint
                             yield (current_text, None)
-                        await asyncio.sleep(wait)
-                        result = Runner.run_streamed(agent, input=messages, max_turns=25)
-                    else:
-                        raise
+                            break  # don't retry timeouts
+
+                        should_retry = any(
+                            s in err
+                            for s in [
+                                "'NoneType' object has no attribute 'strip'",
+                                "Connection broken",
+                                "InvalidChunkLength",
+                                "socket hang up",
+                                "Connection reset",
+                            ]
+                        )
+                        if should_retry and retry_count <= max_retries:
+                            wait = min(2 ** (retry_count - 1), 10)
+                            log.error(f"[AgentMode] Stream error (attempt {retry_count}/{max_retries}): {err}")
+                            if current_text:
+                                yield (current_text, None)
+                            await asyncio.sleep(wait)
+                            result = Runner.run_streamed(agent, input=messages, max_turns=25, run_config=session_run_config(config))
+                        else:
+                            raise
+            finally:
+                # Stop the run (LLM calls, tools) if the stream was closed or cancelled early
+                cancel_streamed_run(result)
 
             # ---- Detect hallucination: agent produced text but called 0 tools ----
             if _tool_call_count == 0 and current_text.strip():
@@ -22,38 +22,15 @@ except Exception:
     )
 
 from ..dao.workflow_table import get_workflow_data, save_workflow_data, get_workflow_data_by_id
-from ..utils.comfy_gateway import ComfyGateway, get_object_info, get_object_info_by_class
+from ..utils.comfy_gateway import get_gateway, get_object_info_by_class
+from ..utils.node_name_matcher import get_node_name_matcher
+from ..utils.node_schema_cache import compact_node_schema, get_node_schema_cache
+from ..utils.node_search_index import get_node_search_index
 from ..utils.request_context import get_session_id, get_config
+from ..utils.workflow_validator import prevalidate_workflow
 from ..utils.logger import log
 
 
-# ---------------------------------------------------------------------------
-# Object-info cache — /api/object_info is huge (10-50 MB) and never changes
-# during a session.  Caching it avoids repeated multi-second fetches that
-# amplify tool-call timeouts on local models.
-# ---------------------------------------------------------------------------
-
-_object_info_cache: dict = {}
-_object_info_cache_time: float = 0.0
-_OBJECT_INFO_TTL = 300.0   # 5-minute TTL
-
-
-async def _get_cached_object_info() -> dict:
-    """Return cached /api/object_info, refreshing if stale."""
-    global _object_info_cache, _object_info_cache_time
-    now = time.time()
-    if _object_info_cache and (now - _object_info_cache_time) < _OBJECT_INFO_TTL:
-        return _object_info_cache
-    try:
-        data = await get_object_info()
-        if data:
-            _object_info_cache = data
-            _object_info_cache_time = now
-        return data or _object_info_cache  # return stale cache on failure
-    except Exception:
-        return _object_info_cache  # stale is better than empty
-
-
 # ---------------------------------------------------------------------------
 # Task Queue — lightweight in-memory task tracker scoped to a single run
 # ---------------------------------------------------------------------------
@@ -215,6 +192,9 @@ def get_tool_tracker() -> ToolCallTracker:
 # Agent Mode tools (decorated with @function_tool for the openai-agents SDK)
 # ---------------------------------------------------------------------------
 
+# check_execution_result blocks on execution events for at most this long
+EXECUTION_WAIT_MAX_SECONDS = 300
+
 @function_tool
 def plan_tasks(tasks: list[str]) -> str:
     """Create a step-by-step plan. Call first."""
@@ -322,7 +302,7 @@ def _robust_json_loads(raw: str) -> Any:
 
 
 @function_tool
-def save_workflow(workflow_json: str, description: str = "Agent mode checkpoint") -> str:
+async def save_workflow(workflow_json: str, description: str = "Agent mode checkpoint") -> str:
     """Save workflow JSON. Pass MCP output exactly as-is."""
     limit_err = get_tool_tracker().check("save_workflow")
     if limit_err:
@@ -337,6 +317,9 @@ def save_workflow(workflow_json: str, description: str = "Agent mode checkpoint"
             data,
             attributes={"action": "agent_mode_save", "description": description},
         )
+        # Saving never fails on validation errors (the workflow may be work in
+        # progress), but the model sees them right away.
+        validation = await prevalidate_workflow(data)
         # Return ext data so the frontend applies the workflow to the canvas.
         # The agent_mode.py _process_events() extracts the "ext" key from tool
         # outputs and propagates it through to the frontend MessageList, which
@@ -344,10 +327,11 @@ def save_workflow(workflow_json: str, description: str = "Agent mode checkpoint"
         return json.dumps({
             "success": True,
             "version_id": version_id,
+            **({"validation": validation} if validation is not None and not validation["success"] else {}),
             "ext": [
                 {
                     "type": "workflow_update",
-                    "data": {"workflow_data": data},
+                    "data": {"workflow_data": data, "version_id": version_id},
                 },
                 {
                     "type": "workflow_update_complete",
@@ -375,12 +359,17 @@ async def validate_workflow(reason: str = "check") -> str:
     if not workflow_data:
         return json.dumps({"error": "No workflow data found to validate"})
     try:
-        gateway = ComfyGateway()
+        # Static check against the node catalog catches most errors without a server round trip
+        static_result = await prevalidate_workflow(workflow_data)
+        if static_result is not None and not static_result["success"]:
+            return json.dumps(static_result)
+        gateway = get_gateway()
         request_data = {
             "prompt": workflow_data,
             "client_id": f"agent_mode_{session_id}",
         }
-        result = await gateway.run_prompt(request_data)
+        # Dry run: validate in-process without queueing a generation job
+        result = await gateway.validate_prompt(request_data)
         return json.dumps(result)
     except Exception as e:
         return json.dumps({"error": f"Validation failed: {str(e)}"})
@@ -399,7 +388,14 @@ async def execute_workflow(reason: str = "run") -> str:
     if not workflow_data:
         return json.dumps({"error": "No workflow data found to execute"})
     try:
-        gateway = ComfyGateway()
+        static_result = await prevalidate_workflow(workflow_data)
+        if static_result is not None and not static_result["success"]:
+            return json.dumps({
+                "success": False,
+                "error": static_result.get("error"),
+                "node_errors": static_result.get("node_errors", {}),
+            })
+        gateway = get_gateway()
         request_data = {
             "prompt": workflow_data,
             "client_id": f"agent_mode_{session_id}",
@@ -410,7 +406,7 @@ async def execute_workflow(reason: str = "run") -> str:
             return json.dumps({
                 "success": True,
                 "prompt_id": prompt_id,
-                "message": "Workflow queued for execution. Use check_execution_result to monitor progress.",
+                "message": "Workflow queued for execution. Use check_execution_result to wait for the result.",
             })
         else:
             return json.dumps({
@@ -423,27 +419,32 @@ async def execute_workflow(reason: str = "run") -> str:
 
 
 @function_tool
-async def check_execution_result(prompt_id: str) -> str:
-    """Check if execution is done. Returns outputs."""
+async def check_execution_result(prompt_id: str, wait_seconds: int = 60) -> str:
+    """Wait (up to wait_seconds) for an execution to finish. Returns status, outputs and per-node timings."""
     try:
-        gateway = ComfyGateway()
-        history = await gateway.get_history(prompt_id)
-        if not history:
-            # Check queue status
-            queue_status = await gateway.get_queue_status()
-            running = queue_status.get("queue_running", [])
-            pending = queue_status.get("queue_pending", [])
-            is_running = any(item[1] == prompt_id for item in running)
-            is_pending = any(item[1] == prompt_id for item in pending)
-            if is_running:
-                return json.dumps({"status": "running", "message": "Workflow is currently executing..."})
-            elif is_pending:
-                return json.dumps({"status": "pending", "message": "Workflow is queued, waiting to start..."})
-            else:
-                return json.dumps({"status": "unknown", "message": "Prompt ID not found in queue or history. It may still be processing."})
-        
+        session_id = get_session_id()
+        gateway = get_gateway()
+        wait_seconds = max(0, min(int(wait_seconds), EXECUTION_WAIT_MAX_SECONDS))
+        execution = await gateway.wait_for_prompt(
+            prompt_id,
+            timeout=wait_seconds,
+            client_id=f"agent_mode_{session_id}" if session_id else None,
+        )
+        status = execution["status"]
+        if status == "running":
+            return json.dumps({"status": "running", "message": f"Workflow is still executing after {wait_seconds}s."})
+        if status == "pending":
+            return json.dumps({"status": "pending", "message": f"Workflow has not started after {wait_seconds}s, it may still be queued."})
+        if status in ("error", "interrupted"):
+            return json.dumps({
+                "status": status,
+                "error": execution.get("error"),
+                "node_timings": execution["node_timings"],
+                "message": f"Execution {status}.",
+            })
+
         # Extract outputs
-        outputs = history.get("outputs", {})
+        outputs = execution["outputs"]
         output_summary = {}
         for node_id, node_output in outputs.items():
             if "images" in node_output:
@@ -460,6 +461,8 @@ async def check_execution_result(prompt_id: str) -> str:
         return json.dumps({
             "status": "completed",
             "outputs": output_summary,
+            "node_timings": execution["node_timings"],
+            "elapsed": execution.get("elapsed"),
             "message": f"Execution completed. {len(output_summary)} node(s) produced output.",
         })
     except Exception as e:
@@ -473,8 +476,8 @@ async def search_nodes(query: str, keywords: list[str] = None, limit: int = 5) -
     if limit_err:
         return json.dumps({"error": limit_err})
     try:
-        object_info = await _get_cached_object_info()
-        if not object_info:
+        search_index = await get_node_search_index()
+        if not len(search_index):
             return json.dumps({"error": "Failed to fetch node info from ComfyUI"})
 
         tokens = []
@@ -486,30 +489,14 @@ async def search_nodes(query: str, keywords: list[str] = None, limit: int = 5) -
         if not tokens:
             return json.dumps({"error": "No search query provided"})
 
-        candidates = []
-        for cls_name, meta in object_info.items():
-            if not isinstance(meta, dict):
-                continue
-            # Build searchable text from node metadata
-            # Use `or ""` to guard against None values in metadata
-            search_text = " ".join([
-                cls_name.lower(),
-                (meta.get("display_name") or "").lower(),
-                (meta.get("category") or "").lower(),
-                (meta.get("description") or "").lower(),
-            ])
-            score = sum(1 for t in tokens if t in search_text)
-            if score > 0:
-                candidates.append((score, cls_name, meta.get("display_name") or cls_name, meta.get("category") or ""))
-
-        candidates.sort(key=lambda x: -x[0])
         # Cap at limit (default 5) to keep token usage low
         capped = min(limit, 5)
+        hits, total_found = search_index.search(tokens, capped)
         results = [
-            {"class_name": c[1], "display_name": c[2], "category": c[3]}
-            for c in candidates[:capped]
+            {"class_name": h.class_name, "display_name": h.doc["display_name"] or h.class_name, "category": h.doc["category"]}
+            for h in hits
         ]
-        return json.dumps({"results": results, "total_found": len(candidates)})
+        return json.dumps({"results": results, "total_found": total_found})
     except Exception as e:
         return json.dumps({"error": f"Search failed: {str(e)}"})
 
@@ -521,14 +508,17 @@ async def get_node_details(node_class: str) -> str:
     if limit_err:
         return json.dumps({"error": limit_err})
     try:
+        schemas = await get_node_schema_cache()
+        if node_class in schemas:
+            return schemas.render([node_class])
+        # Not in the cached catalog (e.g. registered since the last refresh)
         info = await get_object_info_by_class(node_class)
         if info:
-            return json.dumps(info, ensure_ascii=False)
-        # Fallback: fuzzy search
-        object_info = await get_object_info()
-        similar = [k for k in object_info.keys() if node_class.lower() in k.lower()]
+            return json.dumps({k: compact_node_schema(v) for k, v in info.items()}, ensure_ascii=False)
+        # Fallback: fuzzy (trigram) match, tolerant of typos
+        similar = (await get_node_name_matcher()).suggest(node_class, 5)
         if similar:
-            return json.dumps({"error": f"Node '{node_class}' not found", "suggestions": similar[:5]})
+            return json.dumps({"error": f"Node '{node_class}' not found", "suggestions": similar})
         return json.dumps({"error": f"Node '{node_class}' not found and no similar nodes detected"})
     except Exception as e:
         return json.dumps({"error": f"Failed to get node details: {str(e)}"})
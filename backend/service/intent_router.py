@@ -0,0 +1,203 @@
+"""
+Intent Router
+
+Local pre-routing for the chat agent. The ComfyUI-Copilot router agent
+spends a full LLM turn classifying the user message into one of three cases
+(see the router prompt in mcp_client): modify the current workflow, analyze
+it, or search / create a new one. Most messages are unambiguous, so they are
+scored locally first with the same multilingual keyword sets plus a few
+weighted context features. Confident rewrite / analyze decisions are
+dispatched without the router turn; search still goes through the LLM
+router, which has to fill in the search tool arguments, and so do
+low-confidence messages.
+
+Scores are turned into probabilities with a softmax that includes a fixed
+"unclear" baseline, so weak evidence never reaches the confidence
+threshold. Messages that the router handles specially (pasted errors,
+prompt writing, images) are never routed locally.
+"""
+
+import re
+import math
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from ..utils.globals import DISABLE_INTENT_ROUTER, INTENT_ROUTER_MIN_CONFIDENCE
+from ..utils.logger import log
+
+INTENT_REWRITE = "rewrite"  # CASE 1: modify / update / fix the current workflow
+INTENT_ANALYZE = "analyze"  # CASE 2: analyze / explain the current workflow
+INTENT_SEARCH = "search"    # CASE 3: find / generate a new workflow
+
+# Score of the implicit "unclear" class
+_BASELINE_SCORE = 1.0
+
+# (phrase, weight) per intent. English phrases match on word boundaries, Chinese as substrings.
+_INTENT_FEATURES: Dict[str, List[Tuple[str, float]]] = {
+    INTENT_REWRITE: [
+        # Router prompt keywords
+        ("modify", 2.0), ("update", 2.0), ("add", 2.0), ("change", 2.0), ("fix", 1.5),
+        ("current", 1.0), ("canvas", 1.5),
+        ("修改", 2.0), ("更新", 1.5), ("添加", 2.0), ("画布", 1.5), ("加一个", 2.0), ("换一个", 2.0), ("调一下", 2.0),
+        # Graph edits
+        ("replace", 2.0), ("remove", 2.0), ("delete", 2.0), ("insert", 2.0), ("connect", 1.5),
+        ("swap", 2.0), ("adjust", 2.0), ("tweak", 2.0), ("set", 1.5), ("increase", 2.0), ("decrease", 2.0),
+        ("删除", 2.0), ("替换", 2.0), ("连接", 1.5), ("调整", 2.0), ("改成", 2.0), ("改为", 2.0),
+        ("加上", 2.0), ("去掉", 2.0), ("增加", 2.0), ("减少", 2.0), ("设置", 1.5),
+        # Things that are edited in a workflow
+        ("lora", 1.0), ("controlnet", 1.0), ("sampler", 1.0), ("checkpoint", 1.0), ("vae", 1.0),
+        ("node", 1.0), ("steps", 1.0), ("cfg", 1.0), ("seed", 1.0), ("denoise", 1.0), ("resolution", 1.0),
+        ("节点", 1.0), ("采样", 1.0), ("步数", 1.0), ("种子", 1.0), ("分辨率", 1.0), ("模型", 0.5),
+    ],
+    INTENT_ANALYZE: [
+        # Router prompt keywords
+        ("analyze", 3.0), ("analyse", 3.0), ("explain", 3.0), ("understand", 2.0),
+        ("how it works", 3.0), ("how does", 2.0), ("workflow structure", 2.5),
+        ("分析", 3.0), ("解释", 3.0), ("怎么工作的", 3.0), ("解读", 3.0),
+        ("what does", 1.5), ("walk me through", 2.5), ("describe", 2.0),
+        ("作用", 1.5), ("是什么意思", 2.0), ("讲解", 2.5), ("介绍一下", 1.5),
+    ],
+    INTENT_SEARCH: [
+        # Router prompt keywords
+        ("create", 2.0), ("generate", 2.0), ("search", 2.5), ("find", 2.0), ("recommend", 2.5),
+        ("生成", 2.0), ("查找", 2.5), ("推荐", 2.5),
+        ("new workflow", 2.0), ("from scratch", 2.5), ("搜索", 2.5), ("找一个", 2.5), ("新的工作流", 2.0),
+    ],
+}
+
+# References to the workflow on the canvas: evidence for rewrite / analyze, against search
+_CURRENT_WORKFLOW_PHRASES = [
+    "this workflow", "my workflow", "current workflow", "the workflow", "this graph", "on the canvas",
+    "当前", "这个工作流", "我的工作流", "画布上",
+]
+_CURRENT_WORKFLOW_WEIGHTS = {INTENT_REWRITE: 1.5, INTENT_ANALYZE: 1.5, INTENT_SEARCH: -2.0}
+
+# Questions ("how do I add a lora?") mention edit verbs without asking for an edit
+_QUESTION_PHRASES = [
+    "?", "how do", "how to", "how can", "which", "what is", "why",
+    "？", "怎么", "如何", "为什么", "哪个", "吗",
+]
+_QUESTION_WEIGHTS = {INTENT_REWRITE: -2.0, INTENT_SEARCH: -1.0}
+
+# Messages the LLM router should always see
+_ABSTAIN_PHRASES = [
+    # Pasted errors / logs (ERROR MESSAGE ANALYSIS)
+    "traceback", "exception", "error:", "failed", "报错", "错误信息",
+    # Prompt writing
+    "prompt", "提示词",
+    # Follow-ups that only make sense with the conversation
+    "same as", "again", "the previous", "back", "as before", "上一个", "刚才", "再来", "改回", "原来的",
+]
+# Very short messages are usually follow-ups ("yes", "ok", "继续")
+_MIN_MESSAGE_CHARS = 6
+# Earlier user turns passed to a locally routed rewrite (the handoff summary the
+# LLM router writes has the conversation in view)
+_REWRITE_CONTEXT_TURNS = 4
+
+
+class IntentDecision(NamedTuple):
+    intent: str
+    confidence: float
+    scores: Dict[str, float]
+    text: str
+
+
+def _is_cjk(phrase: str) -> bool:
+    return any('一' <= ch <= '鿿' for ch in phrase)
+
+
+def _compile(phrase: str) -> "re.Pattern":
+    if _is_cjk(phrase):
+        return re.compile(re.escape(phrase))
+    # ASCII word boundaries (\b would treat adjacent CJK characters as part of the word)
+    return re.compile(r"(?<![a-z0-9_])" + re.escape(phrase) + r"(?![a-z0-9_])")
+
+
+_COMPILED_FEATURES = {
+    intent: [(_compile(phrase), weight) for phrase, weight in features]
+    for intent, features in _INTENT_FEATURES.items()
+}
+_COMPILED_CURRENT = [_compile(phrase) for phrase in _CURRENT_WORKFLOW_PHRASES]
+_COMPILED_QUESTION = [_compile(phrase) for phrase in _QUESTION_PHRASES]
+_COMPILED_ABSTAIN = [_compile(phrase) for phrase in _ABSTAIN_PHRASES]
+
+
+def classify_intent(text: str) -> Optional[IntentDecision]:
+    """Score text against the three router cases; None when it must go to the LLM router."""
+    original = (text or "").strip()
+    text = original.lower()
+    if len(text) < _MIN_MESSAGE_CHARS or any(p.search(text) for p in _COMPILED_ABSTAIN):
+        return None
+
+    scores = {
+        intent: sum(weight for pattern, weight in features if pattern.search(text))
+        for intent, features in _COMPILED_FEATURES.items()
+    }
+    for patterns, weights in ((_COMPILED_CURRENT, _CURRENT_WORKFLOW_WEIGHTS),
+                              (_COMPILED_QUESTION, _QUESTION_WEIGHTS)):
+        if any(p.search(text) for p in patterns):
+            for intent, weight in weights.items():
+                scores[intent] += weight
+
+    exp_scores = {intent: math.exp(score) for intent, score in scores.items()}
+    total = sum(exp_scores.values()) + math.exp(_BASELINE_SCORE)
+    intent = max(exp_scores, key=exp_scores.get)
+    return IntentDecision(intent, exp_scores[intent] / total, scores, original)
+
+
+def _message_text(message: Dict[str, Any]) -> str:
+    content = message.get("content")
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return " ".join(part.get("text", "") for part in content
+                        if isinstance(part, dict) and part.get("type") in ("text", "input_text"))
+    return ""
+
+
+def _has_images(message: Dict[str, Any]) -> bool:
+    content = message.get("content")
+    return isinstance(content, list) and any(
+        isinstance(part, dict) and part.get("type") not in ("text", "input_text") for part in content)
+
+
+def _last_user_text(messages: List[Dict[str, Any]]) -> Optional[str]:
+    """Text of the last user message, or None if it is missing or carries images."""
+    for message in reversed(messages or []):
+        if message.get("role") != "user":
+            continue
+        if _has_images(message) or not isinstance(message.get("content"), (str, list)):
+            return None
+        return _message_text(message)
+    return None
+
+
+def rewrite_input(messages: List[Dict[str, Any]], text: str) -> List[Dict[str, str]]:
+    """
+    Input for a locally routed rewrite: the request as a single user message,
+    as the handoff builds it, preceded by the recent earlier user turns so
+    follow-ups ("use a higher cfg than that") keep their meaning.
+    """
+    user_turns = [m for m in messages or [] if m.get("role") == "user"][:-1]
+    earlier = [t.strip() for t in map(_message_text, user_turns[-_REWRITE_CONTEXT_TURNS:]) if t.strip()]
+    if not earlier:
+        return [{"role": "user", "content": text}]
+    context = "\n".join(f"- {turn}" for turn in earlier)
+    return [{"role": "user", "content": f"Earlier requests in this conversation (already handled, for context only):\n"
+                                        f"{context}\n\nCurrent request: {text}"}]
+
+
+def route_intent(messages: List[Dict[str, Any]]) -> Optional[IntentDecision]:
+    """Confident local decision for the last user message, or None to use the LLM router."""
+    if DISABLE_INTENT_ROUTER:
+        return None
+    text = _last_user_text(messages)
+    if text is None:
+        return None
+    decision = classify_intent(text)
+    if decision is None or decision.confidence < INTENT_ROUTER_MIN_CONFIDENCE:
+        log.info(f"[IntentRouter] No confident local route, using the LLM router: "
+                 f"{decision and (decision.intent, round(decision.confidence, 2), decision.scores)}")
+        return None
+    log.info(f"[IntentRouter] Routed locally to '{decision.intent}' "
+             f"(confidence={decision.confidence:.2f}, scores={decision.scores})")
+    return decision
@@ -2,12 +2,13 @@
 
 import json
 import time
-from typing import Dict, Optional, List
+from typing import Dict, Optional, List, Tuple
 
 from agents.tool import function_tool
 from ..utils.request_context import get_session_id
 from ..dao.workflow_table import get_workflow_data, save_workflow_data
 from ..utils.comfy_gateway import get_object_info
+from ..utils.node_type_index import NodeTypeIndex, WILDCARD_TYPE, get_node_type_index, split_io_type
 from ..utils.logger import log
 
 @function_tool
@@ -34,6 +35,7 @@ async def analyze_missing_connections(reason: str = "analyze") -> str:
             return json.dumps({"error": "No workflow data found for this session"})
         
         object_info = await get_object_info()
+        type_index = None  # 仅在需要推荐新节点时获取
         
         analysis_result = {
             "missing_connections": [],
@@ -50,16 +52,20 @@ async def analyze_missing_connections(reason: str = "analyze") -> str:
             }
         }
         
-        # 构建现有节点的输出映射
-        available_outputs = {}
-        for node_id, node_data in workflow_data.items():
+        # 构建现有节点的输出映射：输出类型 -> [(节点顺序, 节点ID, 节点类型, 输出索引, 输出类型)]
+        # 每个缺失输入按类型直接查表，避免对所有节点输出的重复扫描
+        outputs_by_type: Dict[str, List[Tuple[int, str, str, int, str]]] = {}
+        wildcard_outputs: List[Tuple[int, str, str, int, str]] = []
+        for position, (node_id, node_data) in enumerate(workflow_data.items()):
             node_class = node_data.get("class_type")
             if node_class in object_info and "output" in object_info[node_class]:
-                outputs = object_info[node_class]["output"]
-                available_outputs[node_id] = {
-                    "class_type": node_class,
-                    "outputs": [(i, output_type) for i, output_type in enumerate(outputs)]
-                }
+                for output_index, output_type in enumerate(object_info[node_class]["output"]):
+                    entry = (position, node_id, node_class, output_index, output_type)
+                    for t in split_io_type(output_type):
+                        if t == WILDCARD_TYPE:
+                            wildcard_outputs.append(entry)
+                        else:
+                            outputs_by_type.setdefault(t, []).append(entry)
         
         # 分析每个节点的缺失连接
         for node_id, node_data in workflow_data.items():
@@ -113,23 +119,25 @@ async def analyze_missing_connections(reason: str = "analyze") -> str:
                         missing_connection["is_universal"] = True
                     else:
                         # 查找具体类型匹配的连接
+                        candidates = {}
+                        for expected_type in expected_types:
+                            for t in split_io_type(expected_type):
+                                for entry in outputs_by_type.get(t, []):
+                                    candidates[(entry[0], entry[3])] = entry
+                        for entry in wildcard_outputs:
+                            candidates[(entry[0], entry[3])] = entry
+                        
                         possible_matches = []
-                        for source_node_id, source_info in available_outputs.items():
+                        for _, source_node_id, source_class, output_index, output_type in sorted(candidates.values(), key=lambda e: (e[0], e[3])):
                             if source_node_id == node_id:  # 不能连接自己
                                 continue
-                                
-                            for output_index, output_type in source_info["outputs"]:
-                                # 检查类型匹配（排除通用类型的情况）
-                                type_match = (output_type in expected_types or output_type == "*")
-                                
-                                if type_match:
-                                    possible_matches.append({
-                                        "source_node_id": source_node_id,
-                                        "source_class": source_info["class_type"],
-                                        "output_index": output_index,
-                                        "output_type": output_type,
-                                        "match_confidence": "high" if output_type in expected_types else "medium"
-                                    })
+                            possible_matches.append({
+                                "source_node_id": source_node_id,
+                                "source_class": source_class,
+                                "output_index": output_index,
+                                "output_type": output_type,
+                                "match_confidence": "high" if output_type in expected_types else "medium"
+                            })
                         
                         missing_connection["possible_matches"] = possible_matches
                         missing_connection["is_universal"] = False
@@ -156,7 +164,9 @@ async def analyze_missing_connections(reason: str = "analyze") -> str:
                             analysis_result["connection_summary"]["requires_new_nodes"] += 1
                             
                             # 分析需要什么类型的节点
-                            required_node_types = analyze_required_node_types(expected_types, object_info)
+                            if type_index is None:
+                                type_index = await get_node_type_index()
+                            required_node_types = analyze_required_node_types(expected_types, object_info, type_index)
                             analysis_result["required_new_nodes"].extend([{
                                 "for_node": node_id,
                                 "for_input": input_name,
@@ -203,7 +213,7 @@ async def analyze_missing_connections(reason: str = "analyze") -> str:
     except Exception as e:
         return json.dumps({"error": f"Failed to analyze missing connections: {str(e)}"})
 
-def analyze_required_node_types(expected_types: List[str], object_info: Dict) -> List[Dict]:
+def analyze_required_node_types(expected_types: List[str], object_info: Dict, type_index: NodeTypeIndex) -> List[Dict]:
     """分析需要什么类型的节点来提供指定的输出类型"""
     suggested_nodes = []
     
@@ -232,17 +242,14 @@ def analyze_required_node_types(expected_types: List[str], object_info: Dict) ->
                         "description": f"{node_class} can provide {expected_type}"
                     })
         else:
-            # 搜索所有能提供该类型输出的节点
-            for node_class, node_info in object_info.items():
-                if "output" in node_info:
-                    outputs = node_info["output"]
-                    if expected_type in outputs:
-                        suggested_nodes.append({
-                            "node_class": node_class,
-                            "output_type": expected_type,
-                            "confidence": "medium",
-                            "description": f"{node_class} can provide {expected_type}"
-                        })
+            # 从类型索引查找所有能提供该类型输出的节点
+            for node_class, _ in type_index.producers_of(expected_type):
+                suggested_nodes.append({
+                    "node_class": node_class,
+                    "output_type": expected_type,
+                    "confidence": "medium",
+                    "description": f"{node_class} can provide {expected_type}"
+                })
     
     # 去重并排序
     unique_nodes = {}
@@ -422,6 +429,7 @@ def apply_connection_fixes(fixes_json: str) -> str:
             "type": "workflow_update",
             "data": {
                 "workflow_data": workflow_data,
+                "version_id": version_id,
                 "changes": {
                     "applied_fixes": applied_fixes,
                     "failed_fixes": failed_fixes
@@ -7,10 +7,13 @@ FilePath: /comfyui_copilot/backend/service/mcp-client.py
 Description: 这是默认设置,请设置`customMade`, 打开koroFileHeader查看配置 进行设置: https://github.com/OBKoro1/koro1FileHeader/wiki/%E9%85%8D%E7%BD%AE
 '''
 from ..service.workflow_rewrite_tools import get_current_workflow
+from ..dao.workflow_table import get_workflow_data
 from ..utils.globals import BACKEND_BASE_URL, get_comfyui_copilot_api_key, DISABLE_WORKFLOW_GEN
 from .. import core
 import asyncio
+import json
 import os
+import uuid
 import traceback
 from typing import List, Dict, Any, Optional
 
@@ -18,7 +21,6 @@ try:
     from agents._config import set_default_openai_api
     from agents.agent import Agent
     from agents.items import ItemHelpers
-    from agents.mcp import MCPServerSse
     from agents.run import Runner
     from agents.tracing import set_tracing_disabled
     from agents import handoff, RunContextWrapper, HandoffInputData
@@ -33,10 +35,13 @@ except Exception:
         "  python -m pip install -U openai-agents"
     )
 
-from ..agent_factory import create_agent
+from ..agent_factory import create_agent, cancel_streamed_run, get_agent_template, session_run_config
 from ..service.workflow_rewrite_agent import create_workflow_rewrite_agent
 from ..service.message_memory import message_memory_optimize
+from ..service.mcp_pool import get_mcp_server, prefetch_mcp_tools, COPILOT_MCP_URL, BING_MCP_URL
+from ..service.intent_router import route_intent, rewrite_input, INTENT_REWRITE, INTENT_ANALYZE
 from ..utils.request_context import get_rewrite_context, get_session_id, get_config
+from ..utils.ext_channel import open_ext_channel, take_tool_ext
 from ..utils.logger import log
 from openai.types.responses import ResponseTextDeltaEvent
 from openai import APIError, RateLimitError
@@ -50,181 +55,94 @@ class ImageData:
         self.data = data  # base64 data
         self.url = url    # uploaded URL
 
-async def comfyui_agent_invoke(messages: List[Dict[str, Any]], images: List[ImageData] = None):
+def _build_copilot_agent(config: Dict[str, Any]) -> Agent:
     """
-    Invoke the ComfyUI agent with MCP tools and image support.
+    Router agent with the workflow rewrite handoff. Built once per LLM config
+    (see get_agent_template); the MCP servers are attached per request.
+    """
+    # 创建workflow_rewrite_agent实例 (session_id通过context获取)，与本地路由直接调用的是同一个实例
+    workflow_rewrite_agent_instance = get_agent_template("rewrite", config, create_workflow_rewrite_agent)
     
-    This function mimics the behavior of the reference facade.py chat function,
-    yielding (text, ext) tuples similar to the reference implementation.
+    class HandoffRewriteData(BaseModel):
+        latest_rewrite_intent: str
     
-    Args:
-        messages: List of messages in OpenAI format [{"role": "user", "content": "..."}, ...]
-        images: List of image data objects (optional)
-        
-    Yields:
-        tuple: (text, ext) where text is accumulated text and ext is structured data
-    """
-    try:
-        def _strip_trailing_whitespace_from_messages(
-            msgs: List[Dict[str, Any]]
-        ) -> List[Dict[str, Any]]:
-            cleaned: List[Dict[str, Any]] = []
-            for msg in msgs:
-                role = msg.get("role")
-                # Only touch assistant messages to minimize impact
-                if role != "assistant":
-                    cleaned.append(msg)
-                    continue
-
-                msg_copy = dict(msg)
-                content = msg_copy.get("content")
-
-                # Simple string content
-                if isinstance(content, str):
-                    msg_copy["content"] = content.rstrip()
-                # OpenAI / Agents style list content blocks
-                elif isinstance(content, list):
-                    new_content = []
-                    for part in content:
-                        if isinstance(part, dict):
-                            part_copy = dict(part)
-                            # Common text block key is "text"
-                            text_val = part_copy.get("text")
-                            if isinstance(text_val, str):
-                                part_copy["text"] = text_val.rstrip()
-                            new_content.append(part_copy)
-                        else:
-                            new_content.append(part)
-                    msg_copy["content"] = new_content
-
-                cleaned.append(msg_copy)
-
-            return cleaned
-
-        messages = _strip_trailing_whitespace_from_messages(messages)
-
-        # Get session_id and config from request context
-        session_id = get_session_id()
-        config = get_config()
+    async def on_handoff(ctx: RunContextWrapper[None], input_data: HandoffRewriteData):
+        get_rewrite_context().rewrite_intent = input_data.latest_rewrite_intent
+        log.info(f"Rewrite agent called with intent: {input_data.latest_rewrite_intent}")
+    
+    def rewrite_handoff_input_filter(data: HandoffInputData) -> HandoffInputData:
+        """Filter to replace message history with just the rewrite intent"""
+        intent = get_rewrite_context().rewrite_intent
+        log.info(f"Rewrite handoff filter called. Intent: {intent}")
         
-        if not session_id:
-            raise ValueError("No session_id found in request context")
-        if not config:
-            raise ValueError("No config found in request context")
+        # Construct a new HandoffInputData with cleared history
+        # We keep new_items (which contains the handoff tool call) so the agent sees the immediate trigger
+        # But we clear input_history to remove the conversation context
         
-        # Optimize messages with memory compression
-        log.info(f"[MCP] Original messages count: {len(messages)}")
-        messages = message_memory_optimize(session_id, messages)
-        log.info(f"[MCP] Optimized messages count: {len(messages)}, messages: {messages}")
+        new_history = ()
+        try:
+            # Attempt to find a user message in history to clone/modify
+            # This is a best-effort attempt to make the agent see the intent as a user message
+            for item in data.input_history:
+                # Check if item looks like a user message (has role='user')
+                if hasattr(item, 'role') and getattr(item, 'role') == 'user':
+                     # Try to create a copy with new content if it's a Pydantic model
+                     if hasattr(item, 'model_copy'):
+                         # Pydantic V2
+                         new_item = item.model_copy(update={"content": intent})
+                         new_history = (new_item,)
+                         log.info("Successfully constructed new user message item for handoff (Pydantic V2)")
+                         break
+                     elif hasattr(item, 'copy'):
+                         # Pydantic V1
+                         new_item = item.copy(update={"content": intent})
+                         new_history = (new_item,)
+                         log.info("Successfully constructed new user message item for handoff (Pydantic V1)")
+                         break
+        except Exception as e:
+            log.warning(f"Failed to construct user message item: {e}")
         
-        # Create MCP server instances
-        mcp_server = MCPServerSse(
-            params= {
-                "url": BACKEND_BASE_URL + "/mcp-server/mcp",
-                "timeout": 300.0,
-                "headers": {"X-Session-Id": session_id, "Authorization": f"Bearer {get_comfyui_copilot_api_key()}"}
-            },
-            cache_tools_list=True,
-            client_session_timeout_seconds=300.0
-        )
+        # If we couldn't construct a user message, we return empty history.
+        # The agent will still see the handoff tool call in new_items, which contains the intent.
         
-        bing_server = MCPServerSse(
-            params= {
-                "url": "https://mcp.api-inference.modelscope.net/8c9fe550938e4f/sse",
-                "timeout": 300.0,
-                "headers": {"X-Session-Id": session_id, "Authorization": f"Bearer {get_comfyui_copilot_api_key()}"}
-            },
-            cache_tools_list=True,
-            client_session_timeout_seconds=300.0
+        return HandoffInputData(
+            input_history=new_history,
+            pre_handoff_items=(), # Clear pre-handoff items
+            new_items=tuple(data.new_items), # Keep the handoff tool call
         )
-        
-        server_list = [mcp_server, bing_server]
-        
-        async with mcp_server, bing_server:
-            
-            # 创建workflow_rewrite_agent实例 (session_id通过context获取)
-            workflow_rewrite_agent_instance = create_workflow_rewrite_agent()
-            
-            class HandoffRewriteData(BaseModel):
-                latest_rewrite_intent: str
-            
-            async def on_handoff(ctx: RunContextWrapper[None], input_data: HandoffRewriteData):
-                get_rewrite_context().rewrite_intent = input_data.latest_rewrite_intent
-                log.info(f"Rewrite agent called with intent: {input_data.latest_rewrite_intent}")
-            
-            def rewrite_handoff_input_filter(data: HandoffInputData) -> HandoffInputData:
-                """Filter to replace message history with just the rewrite intent"""
-                intent = get_rewrite_context().rewrite_intent
-                log.info(f"Rewrite handoff filter called. Intent: {intent}")
-                
-                # Construct a new HandoffInputData with cleared history
-                # We keep new_items (which contains the handoff tool call) so the agent sees the immediate trigger
-                # But we clear input_history to remove the conversation context
-                
-                new_history = ()
-                try:
-                    # Attempt to find a user message in history to clone/modify
-                    # This is a best-effort attempt to make the agent see the intent as a user message
-                    for item in data.input_history:
-                        # Check if item looks like a user message (has role='user')
-                        if hasattr(item, 'role') and getattr(item, 'role') == 'user':
-                             # Try to create a copy with new content if it's a Pydantic model
-                             if hasattr(item, 'model_copy'):
-                                 # Pydantic V2
-                                 new_item = item.model_copy(update={"content": intent})
-                                 new_history = (new_item,)
-                                 log.info("Successfully constructed new user message item for handoff (Pydantic V2)")
-                                 break
-                             elif hasattr(item, 'copy'):
-                                 # Pydantic V1
-                                 new_item = item.copy(update={"content": intent})
-                                 new_history = (new_item,)
-                                 log.info("Successfully constructed new user message item for handoff (Pydantic V1)")
-                                 break
-                except Exception as e:
-                    log.warning(f"Failed to construct user message item: {e}")
-                
-                # If we couldn't construct a user message, we return empty history.
-                # The agent will still see the handoff tool call in new_items, which contains the intent.
-                
-                return HandoffInputData(
-                    input_history=new_history,
-                    pre_handoff_items=(), # Clear pre-handoff items
-                    new_items=tuple(data.new_items), # Keep the handoff tool call
-                )
-
-            handoff_rewrite = handoff(
-                agent=workflow_rewrite_agent_instance,
-                input_type=HandoffRewriteData,
-                input_filter=rewrite_handoff_input_filter,
-                on_handoff=on_handoff,
-            )
-            
-            # Construct instructions based on DISABLE_WORKFLOW_GEN
-            if DISABLE_WORKFLOW_GEN:
-                workflow_creation_instruction = """
+
+    handoff_rewrite = handoff(
+        agent=workflow_rewrite_agent_instance,
+        input_type=HandoffRewriteData,
+        input_filter=rewrite_handoff_input_filter,
+        on_handoff=on_handoff,
+    )
+    
+    # Construct instructions based on DISABLE_WORKFLOW_GEN
+    if DISABLE_WORKFLOW_GEN:
+        workflow_creation_instruction = """
 **CASE 3: SEARCH WORKFLOW**
 IF the user wants to find or generate a NEW workflow.
 - Keywords: "create", "generate", "search", "find", "recommend", "生成", "查找", "推荐".
 - Action: Use `recall_workflow`.
 """
-                workflow_constraint = """
+        workflow_constraint = """
 - [Critical!] When the user's intent is to get workflows or generate images with specific requirements, you MUST call `recall_workflow` tool to find existing similar workflows.
 """
-            else:
-                workflow_creation_instruction = """
+    else:
+        workflow_creation_instruction = """
 **CASE 3: CREATE NEW / SEARCH WORKFLOW**
 IF the user wants to find or generate a NEW workflow from scratch.
 - Keywords: "create", "generate", "search", "find", "recommend", "生成", "查找", "推荐".
 - Action: Use `recall_workflow` AND `gen_workflow`.
 """
-                workflow_constraint = """
+        workflow_constraint = """
 - [Critical!] When the user's intent is to get workflows or generate images with specific requirements, you MUST ALWAYS call BOTH recall_workflow tool AND gen_workflow tool to provide comprehensive workflow options. Never call just one of these tools - both are required for complete workflow assistance. First call recall_workflow to find existing similar workflows, then call gen_workflow to generate new workflow options.
 """
 
-            agent = create_agent(
-                name="ComfyUI-Copilot",
-                instructions=f"""You are a powerful AI assistant for designing image processing workflows, capable of automating problem-solving using tools and commands.
+    return create_agent(
+        name="ComfyUI-Copilot",
+        instructions=f"""You are a powerful AI assistant for designing image processing workflows, capable of automating problem-solving using tools and commands.
 
 When handing off to workflow rewrite agent or other agents, this session ID should be used for workflow data management.
 
@@ -295,28 +213,133 @@ You must adhere to the following constraints to complete the task:
      - Updating the extension (`cd path/to/extension && git pull`)
      - Reinstalling dependencies
      - Alternative approaches if the extension is problematic
-                """,
-                mcp_servers=server_list,
-                handoffs=[handoff_rewrite],
-                tools=[get_current_workflow],
-                config=config
-            )
+        """,
+        handoffs=[handoff_rewrite],
+        tools=[get_current_workflow],
+        config=config
+    )
+
+async def comfyui_agent_invoke(messages: List[Dict[str, Any]], images: List[ImageData] = None):
+    """
+    Invoke the ComfyUI agent with MCP tools and image support.
+    
+    This function mimics the behavior of the reference facade.py chat function,
+    yielding (text, ext) tuples similar to the reference implementation.
+    
+    Args:
+        messages: List of messages in OpenAI format [{"role": "user", "content": "..."}, ...]
+        images: List of image data objects (optional)
+        
+    Yields:
+        tuple: (text, ext) where text is accumulated text and ext is structured data
+    """
+    try:
+        def _strip_trailing_whitespace_from_messages(
+            msgs: List[Dict[str, Any]]
+        ) -> List[Dict[str, Any]]:
+            cleaned: List[Dict[str, Any]] = []
+            for msg in msgs:
+                role = msg.get("role")
+                # Only touch assistant messages to minimize impact
+                if role != "assistant":
+                    cleaned.append(msg)
+                    continue
+
+                msg_copy = dict(msg)
+                content = msg_copy.get("content")
+
+                # Simple string content
+                if isinstance(content, str):
+                    msg_copy["content"] = content.rstrip()
+                # OpenAI / Agents style list content blocks
+                elif isinstance(content, list):
+                    new_content = []
+                    for part in content:
+                        if isinstance(part, dict):
+                            part_copy = dict(part)
+                            # Common text block key is "text"
+                            text_val = part_copy.get("text")
+                            if isinstance(text_val, str):
+                                part_copy["text"] = text_val.rstrip()
+                            new_content.append(part_copy)
+                        else:
+                            new_content.append(part)
+                    msg_copy["content"] = new_content
+
+                cleaned.append(msg_copy)
+
+            return cleaned
+
+        messages = _strip_trailing_whitespace_from_messages(messages)
+
+        # Get session_id and config from request context
+        session_id = get_session_id()
+        config = get_config()
+        
+        if not session_id:
+            raise ValueError("No session_id found in request context")
+        if not config:
+            raise ValueError("No config found in request context")
+        
+        # Optimize messages with memory compression
+        log.info(f"[MCP] Original messages count: {len(messages)}")
+        messages = message_memory_optimize(session_id, messages)
+        log.info(f"[MCP] Optimized messages count: {len(messages)}, messages: {messages}")
+        
+        # Leases on the pooled MCP connections (session id travels per tool call)
+        mcp_server = get_mcp_server(COPILOT_MCP_URL, timeout=300.0, session_timeout=300.0)
+        bing_server = get_mcp_server(BING_MCP_URL, timeout=300.0, session_timeout=300.0)
+        
+        server_list = [mcp_server, bing_server]
+        
+        async with mcp_server, bing_server:
+            await prefetch_mcp_tools(server_list)
+            
+            # Prebuilt router graph; only the MCP server leases are per request
+            agent = get_agent_template(
+                "copilot", config, _build_copilot_agent, bool(DISABLE_WORKFLOW_GEN)
+            ).clone(mcp_servers=server_list)
 
             # Use messages directly as agent input since they're already in OpenAI format
             # The caller has already handled image formatting within messages
             agent_input = messages
             log.info(f"-- Processing {len(messages)} messages")
 
+            # Clear intents skip the router's classification turn
+            routed_to_rewrite = False
+            decision = route_intent(messages)
+            if decision is not None and decision.intent == INTENT_REWRITE:
+                # Like the rewrite handoff: the intent as one user message, with the earlier user turns as context
+                get_rewrite_context().rewrite_intent = decision.text
+                agent = get_agent_template("rewrite", config, create_workflow_rewrite_agent)
+                agent_input = rewrite_input(messages, decision.text)
+                routed_to_rewrite = True
+            elif decision is not None and decision.intent == INTENT_ANALYZE:
+                # Pre-fetch the workflow as a get_current_workflow result, so the router answers right away
+                workflow_data = get_workflow_data(session_id)
+                if workflow_data:
+                    workflow_data_str = json.dumps(workflow_data, ensure_ascii=False)
+                    get_rewrite_context().current_workflow = workflow_data_str
+                    call_id = f"call_local_{uuid.uuid4().hex[:24]}"
+                    agent_input = list(messages) + [
+                        {"type": "function_call", "call_id": call_id, "name": get_current_workflow.name,
+                         "arguments": json.dumps({"reason": "analyze"})},
+                        {"type": "function_call_output", "call_id": call_id, "output": workflow_data_str},
+                    ]
+
             from agents import Agent, Runner, set_trace_processors, set_tracing_disabled, set_default_openai_api
             # from langsmith.wrappers import OpenAIAgentsTracingProcessor
             set_tracing_disabled(False)
             set_default_openai_api("chat_completions")
             # set_trace_processors([OpenAIAgentsTracingProcessor()])
 
+            # Tool ext payloads are delivered through the side channel (keyed by tool call id)
+            open_ext_channel()
             result = Runner.run_streamed(
                 agent,
                 input=agent_input,
                 max_turns=30,
+                run_config=session_run_config(config),
             )
             log.info("=== MCP Agent Run starting ===")
             
@@ -331,7 +354,8 @@ You must adhere to the following constraints to complete the task:
             # Collect workflow update ext data from tools and message outputs
             workflow_update_ext = None
             # Track if we've seen any handoffs to avoid showing initial handoff
-            handoff_occurred = False
+            # (a locally routed rewrite shows the switch like the handoff does)
+            handoff_occurred = routed_to_rewrite
             
             # Enhanced retry mechanism for OpenAI streaming errors
             max_retries = 3
@@ -399,6 +423,12 @@ You must adhere to the following constraints to complete the task:
                                     tool_name = 'unknown_tool'
                                     log.info(f"-- Warning: No tool call in queue for output")
                                 
+                                # Ext published by local function tools (no longer part of the output)
+                                side_ext = take_tool_ext(event.item)
+                                if side_ext and any(isinstance(item, dict) and item.get("type") in ("workflow_update", "param_update") for item in side_ext):
+                                    workflow_update_ext = side_ext
+                                    log.info(f"-- Captured workflow tool ext from side channel: {len(side_ext)} items")
+                                
                                 try:
                                     import json
                                     tool_output_data = json.loads(tool_output_data_str)
@@ -461,92 +491,97 @@ You must adhere to the following constraints to complete the task:
                     log.error(f"Traceback: {traceback.format_exc()}")
                     raise e
             
-            # Implement retry mechanism with exponential backoff
-            while retry_count <= max_retries:
-                try:
-                    async for stream_data in process_stream_events(result):
-                        if stream_data:
-                            yield stream_data
-                    # If we get here, streaming completed successfully
-                    break
+            try:
+                # Implement retry mechanism with exponential backoff
+                while retry_count <= max_retries:
+                    try:
+                        async for stream_data in process_stream_events(result):
+                            if stream_data:
+                                yield stream_data
+                        # If we get here, streaming completed successfully
+                        break
                     
-                except (AttributeError, TypeError, ConnectionError, OSError, APIError) as stream_error:
-                    retry_count += 1
-                    error_msg = str(stream_error)
+                    except (AttributeError, TypeError, ConnectionError, OSError, APIError) as stream_error:
+                        retry_count += 1
+                        error_msg = str(stream_error)
                     
-                    # Check for specific streaming errors that are worth retrying
-                    should_retry = (
-                        "'NoneType' object has no attribute 'strip'" in error_msg or
-                        "Connection broken" in error_msg or
-                        "InvalidChunkLength" in error_msg or
-                        "socket hang up" in error_msg or
-                        "Connection reset" in error_msg
-                    )
+                        # Check for specific streaming errors that are worth retrying
+                        should_retry = (
+                            "'NoneType' object has no attribute 'strip'" in error_msg or
+                            "Connection broken" in error_msg or
+                            "InvalidChunkLength" in error_msg or
+                            "socket hang up" in error_msg or
+                            "Connection reset" in error_msg
+                        )
                     
-                    if should_retry and retry_count <= max_retries:
-                        wait_time = min(2 ** (retry_count - 1), 10)  # Exponential backoff, max 10 seconds
-                        log.error(f"Stream error (attempt {retry_count}/{max_retries}): {error_msg}")
-                        log.info(f"Retrying in {wait_time} seconds...")
+                        if should_retry and retry_count <= max_retries:
+                            wait_time = min(2 ** (retry_count - 1), 10)  # Exponential backoff, max 10 seconds
+                            log.error(f"Stream error (attempt {retry_count}/{max_retries}): {error_msg}")
+                            log.info(f"Retrying in {wait_time} seconds...")
                         
-                        # Yield current progress before retry
-                        if current_text:
-                            yield (current_text, None)
+                            # Yield current progress before retry
+                            if current_text:
+                                yield (current_text, None)
                         
-                        await asyncio.sleep(wait_time)
+                            await asyncio.sleep(wait_time)
                         
-                        try:
-                            # Create a new result object for retry
-                            result = Runner.run_streamed(
-                                agent,
-                                input=agent_input,
-                            )
-                            log.info(f"=== Retry attempt {retry_count} starting ===")
-                        except Exception as retry_setup_error:
-                            log.error(f"Failed to setup retry: {retry_setup_error}")
-                            if retry_count >= max_retries:
-                                raise stream_error  # Re-raise original error if max retries reached
-                            continue
-                    else:
-                        log.error(f"Non-retryable streaming error or max retries reached: {error_msg}")
-                        log.error(f"Traceback: {traceback.format_exc()}")
-                        if isinstance(stream_error, RateLimitError):
-                            default_error_msg = 'Rate limit exceeded, please try again later.'
-                            error_body = stream_error.body
-                            error_msg = error_body['message'] if error_body and 'message' in error_body else None
-                            final_error_msg = error_msg or default_error_msg
-                            yield (final_error_msg, None)
-                            return
-                        elif "Failed to call a function" in error_msg or "failed_generation" in error_msg:
-                            yield (
-                                "The model failed to generate a valid tool call. "
-                                "Try a different model (e.g. `llama-3.3-70b-versatile` on Groq) "
-                                "or simplify your request.",
-                                None,
-                            )
-                            return
-                        elif "'required' present but 'properties' is missing" in error_msg:
-                            yield (
-                                "Tool schema validation failed. "
-                                "Please restart ComfyUI to pick up the latest fixes.",
-                                None,
-                            )
-                            return
+                            try:
+                                # Create a new result object for retry
+                                result = Runner.run_streamed(
+                                    agent,
+                                    input=agent_input,
+                                    run_config=session_run_config(config),
+                                )
+                                log.info(f"=== Retry attempt {retry_count} starting ===")
+                            except Exception as retry_setup_error:
+                                log.error(f"Failed to setup retry: {retry_setup_error}")
+                                if retry_count >= max_retries:
+                                    raise stream_error  # Re-raise original error if max retries reached
+                                continue
                         else:
-                            # Continue to normal processing, error will be handled by outer try-catch
-                            break
+                            log.error(f"Non-retryable streaming error or max retries reached: {error_msg}")
+                            log.error(f"Traceback: {traceback.format_exc()}")
+                            if isinstance(stream_error, RateLimitError):
+                                default_error_msg = 'Rate limit exceeded, please try again later.'
+                                error_body = stream_error.body
+                                error_msg = error_body['message'] if error_body and 'message' in error_body else None
+                                final_error_msg = error_msg or default_error_msg
+                                yield (final_error_msg, None)
+                                return
+                            elif "Failed to call a function" in error_msg or "failed_generation" in error_msg:
+                                yield (
+                                    "The model failed to generate a valid tool call. "
+                                    "Try a different model (e.g. `llama-3.3-70b-versatile` on Groq) "
+                                    "or simplify your request.",
+                                    None,
+                                )
+                                return
+                            elif "'required' present but 'properties' is missing" in error_msg:
+                                yield (
+                                    "Tool schema validation failed. "
+                                    "Please restart ComfyUI to pick up the latest fixes.",
+                                    None,
+                                )
+                                return
+                            else:
+                                # Continue to normal processing, error will be handled by outer try-catch
+                                break
                         
-                except Exception as unexpected_error:
-                    retry_count += 1
-                    log.error(f"Unexpected error during streaming (attempt {retry_count}/{max_retries}): {unexpected_error}")
-                    log.error(f"Traceback: {traceback.format_exc()}")
+                    except Exception as unexpected_error:
+                        retry_count += 1
+                        log.error(f"Unexpected error during streaming (attempt {retry_count}/{max_retries}): {unexpected_error}")
+                        log.error(f"Traceback: {traceback.format_exc()}")
                     
-                    if retry_count > max_retries:
-                        log.error("Max retries exceeded for unexpected error")
-                        break
-                    else:
-                        # Brief wait before retry for unexpected errors
-                        await asyncio.sleep(1)
-                        continue
+                        if retry_count > max_retries:
+                            log.error("Max retries exceeded for unexpected error")
+                            break
+                        else:
+                            # Brief wait before retry for unexpected errors
+                            await asyncio.sleep(1)
+                            continue
+            finally:
+                # Stop the run (LLM calls, tools) if the stream was closed or cancelled early
+                cancel_streamed_run(result)
 
             # Add detailed debugging info about tool results
             log.info(f"Total tool results: {len(tool_results)}")
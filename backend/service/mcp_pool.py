@@ -0,0 +1,346 @@
+"""
+MCP Pool
+
+Connected MCP (SSE) sessions shared across requests, keyed by (url, API key),
+so a chat message does not pay the SSE handshake and list_tools round trip
+before its first token.
+
+get_mcp_server() returns a per-request lease that is used like the
+MCPServerSse it replaces (`async with server: ...`, mcp_servers=[server]).
+The session id is not part of the connection: every tool call carries it
+in the request `_meta` ({"session_id": ...}), read from the request context
+at call time.
+
+Leases are lazy: entering one does not connect. Tool schemas are cached
+per server url for the whole process and returned without a round trip, so
+a turn that calls no MCP tool (most turns never search) needs no connection
+at all; the connection is opened by the first tool call. Schemas older than
+MCP_TOOLS_CACHE_TTL_SECONDS are still served while a background refresh
+fetches new ones. warm_mcp_pool() runs at startup and connects the servers
+concurrently, so requests start from warm schemas; when schemas are still
+unknown, prefetch_mcp_tools() does the same for a request.
+
+Each connection is opened and closed by its own task, because the SSE
+client's task group must be exited by the task that entered it. That task
+closes the connection after MCP_POOL_IDLE_SECONDS without use. A connection
+idle for more than MCP_POOL_HEALTH_CHECK_SECONDS is pinged before it is
+handed out, and a call that fails on the transport reconnects and is
+retried once (errors returned by the server are not retried).
+"""
+
+import time
+import asyncio
+import hashlib
+import contextvars
+from datetime import timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
+
+from agents.mcp import MCPServer, MCPServerSse
+from mcp import types as mcp_types
+from mcp.shared.exceptions import McpError
+
+from ..utils.globals import (
+    BACKEND_BASE_URL,
+    MCP_POOL_IDLE_SECONDS,
+    MCP_POOL_HEALTH_CHECK_SECONDS,
+    MCP_TOOLS_CACHE_TTL_SECONDS,
+    DISABLE_MCP_POOL,
+    COMFYUI_COPILOT_API_KEY,
+    get_comfyui_copilot_api_key,
+)
+from ..utils.request_context import get_session_id
+from ..utils.logger import log
+
+COPILOT_MCP_URL = BACKEND_BASE_URL + "/mcp-server/mcp"
+BING_MCP_URL = "https://mcp.api-inference.modelscope.net/8c9fe550938e4f/sse"
+
+# Pooled connections use the longest per-request timeouts; leases pass their own per call
+_POOL_CONNECT_TIMEOUT = 300.0
+_POOL_SESSION_TIMEOUT = 300.0
+_PING_TIMEOUT = 5.0
+
+T = TypeVar("T")
+
+# Tool schemas per server url, shared by all connections: url -> (fetched_at, tools)
+_tool_schemas: Dict[str, Tuple[float, List[Any]]] = {}
+_schema_refreshes: Dict[str, asyncio.Future] = {}
+
+
+def _start_background(coro) -> asyncio.Future:
+    # Empty context, so the task does not keep the calling request's context alive
+    return contextvars.Context().run(asyncio.ensure_future, coro)
+
+
+class _PooledConnection:
+    """The current SSE connection for one (url, API key), reconnected when it breaks."""
+
+    def __init__(self, url: str, headers: Dict[str, str]):
+        self.url = url
+        self.headers = headers
+        self.leases = 0
+        self.last_used = time.monotonic()
+        self._server: Optional[MCPServerSse] = None
+        self._owner: Optional[asyncio.Task] = None
+        self._closing: Optional[asyncio.Event] = None
+        self._last_ok = 0.0
+        self._lock = asyncio.Lock()
+
+    def connected(self) -> bool:
+        return (self._server is not None and self._server.session is not None
+                and self._owner is not None and not self._owner.done())
+
+    def expired(self, now: float) -> bool:
+        return self.leases == 0 and not self.connected() and now - self.last_used > MCP_POOL_IDLE_SECONDS
+
+    async def _hold(self, server: MCPServerSse, ready: asyncio.Future, closing: asyncio.Event) -> None:
+        """Owner task: connect, keep the connection until closed or idle, then clean it up."""
+        try:
+            await server.connect()
+        except BaseException as e:
+            if not ready.done():
+                ready.set_exception(ConnectionError(f"Failed to connect to MCP server {self.url}: {e}"))
+            return
+        ready.set_result(None)
+        try:
+            while not closing.is_set():
+                try:
+                    await asyncio.wait_for(closing.wait(), timeout=max(1.0, MCP_POOL_IDLE_SECONDS / 4))
+                except asyncio.TimeoutError:
+                    if self.leases == 0 and time.monotonic() - self.last_used > MCP_POOL_IDLE_SECONDS:
+                        log.info(f"[MCP pool] Closing idle connection to {self.url}")
+                        break
+        except asyncio.CancelledError:
+            # The SSE task group cancels its host task when the transport fails
+            log.warning(f"[MCP pool] Connection to {self.url} was lost")
+        finally:
+            try:
+                await server.cleanup()
+            except BaseException as e:
+                log.debug(f"[MCP pool] Cleanup of {self.url} failed: {e}")
+            if self._server is server:
+                self._server = None
+
+    def _disconnect(self) -> None:
+        if self._closing is not None:
+            self._closing.set()
+        self._server = None
+        self._owner = None
+        self._closing = None
+
+    async def _connect(self) -> None:
+        self._disconnect()
+        server = MCPServerSse(
+            params={
+                "url": self.url,
+                "timeout": _POOL_CONNECT_TIMEOUT,
+                "headers": self.headers,
+            },
+            # Schemas are cached process-wide in _tool_schemas
+            cache_tools_list=False,
+            client_session_timeout_seconds=_POOL_SESSION_TIMEOUT,
+        )
+        ready = asyncio.get_running_loop().create_future()
+        closing = asyncio.Event()
+        owner = _start_background(self._hold(server, ready, closing))
+        try:
+            await asyncio.shield(ready)
+        except BaseException:
+            closing.set()
+            raise
+        self._server, self._owner, self._closing = server, owner, closing
+        self._last_ok = time.monotonic()
+        log.info(f"[MCP pool] Connected to {self.url}")
+
+    async def _ping(self) -> bool:
+        try:
+            await asyncio.wait_for(self._server.session.send_ping(), timeout=_PING_TIMEOUT)
+            return True
+        except Exception as e:
+            log.warning(f"[MCP pool] Health check of {self.url} failed, reconnecting: {e}")
+            return False
+
+    async def _ensure_connected(self) -> MCPServerSse:
+        async with self._lock:
+            if self.connected() and time.monotonic() - self._last_ok > MCP_POOL_HEALTH_CHECK_SECONDS:
+                if not await self._ping():
+                    self._disconnect()
+            if not self.connected():
+                await self._connect()
+            return self._server
+
+    def acquire(self) -> None:
+        self.leases += 1
+        self.last_used = time.monotonic()
+
+    def release(self) -> None:
+        self.leases = max(0, self.leases - 1)
+        self.last_used = time.monotonic()
+
+    async def run(self, func: Callable[[MCPServerSse], Awaitable[T]]) -> T:
+        """Run func on the connection; reconnect and retry once if the transport failed."""
+        server = await self._ensure_connected()
+        try:
+            result = await func(server)
+        except McpError:
+            raise
+        except Exception as e:
+            log.warning(f"[MCP pool] Request to {self.url} failed, reconnecting: {e}")
+            async with self._lock:
+                if self._server is server or not self.connected():
+                    await self._connect()
+                server = self._server
+            result = await func(server)
+        self._last_ok = self.last_used = time.monotonic()
+        return result
+
+    async def fetch_tools(self) -> List[Any]:
+        tools = await self.run(lambda server: server.list_tools())
+        _tool_schemas[self.url] = (time.monotonic(), tools)
+        return tools
+
+    async def _refresh_tools(self) -> None:
+        try:
+            await self.fetch_tools()
+        except Exception as e:
+            log.warning(f"[MCP pool] Refreshing the tools of {self.url} failed, keeping the cached ones: {e}")
+        finally:
+            _schema_refreshes.pop(self.url, None)
+
+    async def list_tools(self) -> List[Any]:
+        cached = _tool_schemas.get(self.url)
+        if cached is None:
+            return await self.fetch_tools()
+        fetched_at, tools = cached
+        if time.monotonic() - fetched_at > MCP_TOOLS_CACHE_TTL_SECONDS and self.url not in _schema_refreshes:
+            _schema_refreshes[self.url] = _start_background(self._refresh_tools())
+        return tools
+
+
+class MCPServerLease(MCPServer):
+    """Per-request handle on a pooled connection."""
+
+    def __init__(self, connection: _PooledConnection, session_timeout: float):
+        super().__init__()
+        self._connection = connection
+        self._session_timeout = session_timeout
+        self._acquired = False
+
+    @property
+    def name(self) -> str:
+        return self._connection.url
+
+    @property
+    def tools_cached(self) -> bool:
+        return self._connection.url in _tool_schemas
+
+    async def connect(self):
+        # Lazy: the pooled connection is opened by the first request that needs it
+        if not self._acquired:
+            self._connection.acquire()
+            self._acquired = True
+
+    async def cleanup(self):
+        if self._acquired:
+            self._acquired = False
+            self._connection.release()
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.cleanup()
+
+    async def list_tools(self, run_context=None, agent=None):
+        return await self._connection.list_tools()
+
+    async def call_tool(self, tool_name: str, arguments: Optional[Dict[str, Any]]) -> mcp_types.CallToolResult:
+        request = mcp_types.ClientRequest(
+            mcp_types.CallToolRequest(
+                method="tools/call",
+                params=mcp_types.CallToolRequestParams(
+                    name=tool_name,
+                    arguments=arguments,
+                    _meta={"session_id": get_session_id()},
+                ),
+            )
+        )
+        return await self._connection.run(lambda server: server.session.send_request(
+            request,
+            mcp_types.CallToolResult,
+            request_read_timeout_seconds=timedelta(seconds=self._session_timeout),
+        ))
+
+    async def list_prompts(self):
+        return await self._connection.run(lambda server: server.list_prompts())
+
+    async def get_prompt(self, name: str, arguments: Optional[Dict[str, Any]] = None):
+        return await self._connection.run(lambda server: server.get_prompt(name, arguments))
+
+
+_pool: Dict[Tuple[str, str], _PooledConnection] = {}
+
+
+def _prune() -> None:
+    now = time.monotonic()
+    for key in [key for key, connection in _pool.items() if connection.expired(now)]:
+        del _pool[key]
+
+
+def _get_connection(url: str, api_key: Optional[str]) -> _PooledConnection:
+    _prune()
+    key = (url, hashlib.sha256(str(api_key).encode("utf-8")).hexdigest())
+    connection = _pool.get(key)
+    if connection is None:
+        connection = _pool[key] = _PooledConnection(url, {"Authorization": f"Bearer {api_key}"})
+    return connection
+
+
+def get_mcp_server(url: str, timeout: float = 300.0, session_timeout: float = 300.0) -> MCPServer:
+    """
+    MCP server for the current request: a lease on the pooled connection for
+    (url, API key), or a dedicated connection when DISABLE_MCP_POOL is set.
+    """
+    api_key = get_comfyui_copilot_api_key()
+    if DISABLE_MCP_POOL:
+        return MCPServerSse(
+            params={
+                "url": url,
+                "timeout": timeout,
+                "headers": {"X-Session-Id": get_session_id(), "Authorization": f"Bearer {api_key}"},
+            },
+            cache_tools_list=True,
+            client_session_timeout_seconds=session_timeout,
+        )
+
+    return MCPServerLease(_get_connection(url, api_key), session_timeout)
+
+
+async def prefetch_mcp_tools(servers: Sequence[MCPServer]) -> None:
+    """
+    Fetch the tool schemas of the leases that have none cached, concurrently
+    (the agent run lists the tools of its servers one after the other).
+    """
+    pending = [server for server in servers if isinstance(server, MCPServerLease) and not server.tools_cached]
+    if pending:
+        await asyncio.gather(*(server.list_tools() for server in pending))
+
+
+async def warm_mcp_pool() -> None:
+    """Connect the MCP servers concurrently and cache their tool schemas; failures are only logged."""
+    if DISABLE_MCP_POOL:
+        return
+    api_key = get_comfyui_copilot_api_key() or COMFYUI_COPILOT_API_KEY
+    connections = [_get_connection(url, api_key) for url in (COPILOT_MCP_URL, BING_MCP_URL)]
+    results = await asyncio.gather(*(connection.fetch_tools() for connection in connections),
+                                   return_exceptions=True)
+    for connection, result in zip(connections, results):
+        if isinstance(result, BaseException):
+            log.warning(f"[MCP pool] Warmup of {connection.url} failed: {result}")
+        else:
+            log.info(f"[MCP pool] Warmed up {connection.url} with {len(result)} tools")
+
+
+async def start_mcp_warmup(app) -> None:
+    """aiohttp on_startup hook: warm the pool in the background without delaying startup."""
+    _start_background(warm_mcp_pool())
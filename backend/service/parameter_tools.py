@@ -506,7 +506,7 @@ def update_workflow_parameter(node_id: str, param_name: str, new_value: str) ->
         workflow_data[node_id]["inputs"][param_name] = new_value
         
         # 保存更新的工作流到数据库
-        save_workflow_data(
+        version_id = save_workflow_data(
             session_id,
             workflow_data,
             workflow_data_ui=None,  # UI format not available here
@@ -535,6 +535,7 @@ def update_workflow_parameter(node_id: str, param_name: str, new_value: str) ->
                 "type": "param_update",
                 "data": {
                     "workflow_data": workflow_data,
+                    "version_id": version_id,
                     "changes": [{  # 包装成数组格式，与前端MessageList期望的格式匹配
                         "node_id": node_id,
                         "parameter": param_name,
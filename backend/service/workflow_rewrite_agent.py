@@ -39,27 +39,22 @@ def get_rewrite_export_schema() -> dict:
     return list_rewrite_experts_short()
 
 
-def create_workflow_rewrite_agent():
-    """创建workflow_rewrite_agent实例"""
+def create_workflow_rewrite_agent(config: Dict[str, Any] = None):
+    """创建workflow_rewrite_agent实例（不传config时使用请求上下文中的config）"""
     
-    language = get_language()
-    session_id = get_session_id() or "unknown_session"
-    config = get_config()
+    if config is None:
+        config = get_config()
     config = workflow_config_adapt(config)
 
-    return create_agent(
-        name="Workflow Rewrite Agent",
-        model=WORKFLOW_MODEL_NAME,
-        handoff_description="""
-        我是工作流改写代理，专门负责根据用户需求修改和优化当前画布上的ComfyUI工作流。
-        """,
-        instructions="""
+    def instructions(run_context, agent) -> str:
+        # 运行时生成：agent 会被缓存复用，而专家经验列表和语言可能变化
+        return """
         你是专业的ComfyUI工作流改写代理，擅长根据用户的具体需求对现有工作流进行智能修改和优化。
         如果在history_messages里有用户的历史对话，请根据历史对话中的语言来决定返回的语言。否则使用{}作为返回的语言。
 
         ## 主要处理场景
         {}
-        """.format(language, json.dumps(get_rewrite_export_schema())) + """
+        """.format(get_language(), json.dumps(get_rewrite_export_schema())) + """
 
         你必须先根据用户的需求，从上面的专家经验中选择经验(call get_rewrite_expert_by_name(name_list))，再结合经验内容进行工作流改写，但如果没有任何相关经验，则不参考专家经验。
         
@@ -110,7 +105,15 @@ def create_workflow_rewrite_agent():
         # - 工作流的每次修改都应保证整体结构的连贯性和可运行性，避免引入新的结构性错误。
 
         始终以用户的实际需求为导向，提供专业、准确、高效的工作流改写服务。
+        """
+
+    return create_agent(
+        name="Workflow Rewrite Agent",
+        model=WORKFLOW_MODEL_NAME,
+        handoff_description="""
+        我是工作流改写代理，专门负责根据用户需求修改和优化当前画布上的ComfyUI工作流。
         """,
+        instructions=instructions,
         tools=[get_rewrite_expert_by_name, get_current_workflow, search_node_local, get_node_infos, update_workflow, remove_node],
         config={
             "max_tokens": 8192,
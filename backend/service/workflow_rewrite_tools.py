@@ -2,7 +2,6 @@
 
 import json
 import time
-import copy
 from typing import Dict, Any, Optional
 
 try:
@@ -22,6 +21,9 @@ from .workflow_rewrite_agent_simple import rewrite_workflow_simple
 
 from ..dao.workflow_table import get_workflow_data, save_workflow_data, get_workflow_data_ui, get_workflow_data_by_id
 from ..utils.comfy_gateway import get_object_info, get_object_info_by_class
+from ..utils.node_name_matcher import get_node_name_matcher
+from ..utils.node_schema_cache import get_node_schema_cache
+from ..utils.node_search_index import get_node_search_index
 from ..utils.request_context import get_rewrite_context, get_session_id
 from ..utils.logger import log
 
@@ -86,12 +88,12 @@ async def get_node_info(node_class: str) -> str:
             get_rewrite_context().node_infos[node_class] = node_info_str
             return node_info_str
         else:
-            # 搜索类似的节点类
-            similar_nodes = [k for k in object_info.keys() if node_class.lower() in k.lower()]
+            # 按三元组相似度查找类似的节点类（容忍拼写错误）
+            similar_nodes = (await get_node_name_matcher()).suggest(node_class, 5)
             if similar_nodes:
                 return json.dumps({
                     "error": f"Node class '{node_class}' not found",
-                    "suggestions": similar_nodes[:5]
+                    "suggestions": similar_nodes
                 })
             return json.dumps({"error": f"Node class '{node_class}' not found"})
     except Exception as e:
@@ -101,27 +103,9 @@ async def get_node_info(node_class: str) -> str:
 async def get_node_infos(node_class_list: list[str]) -> str:
     """获取多个节点的详细信息，包括输入输出参数。只做最小化有必要的查询，不要查询很常见的LLM已知用法的节点。尽量不要超过5个"""
     try:
-        object_info = await get_object_info()
-        node_infos = {}
-        for node_class in node_class_list:
-            if node_class in object_info:
-                # Deep copy to avoid modifying the original cached object info
-                node_data = copy.deepcopy(object_info[node_class])
-                
-                # Truncate long lists in input parameters to save context
-                input_data = node_data.get("input", {})
-                for req_opt in ["required", "optional"]:
-                    params = input_data.get(req_opt, {})
-                    for param_name, param_config in params.items():
-                        # param_config is typically [type_or_list, config_dict]
-                        if isinstance(param_config, list) and len(param_config) > 0:
-                            # Check if the first element is a list (which means it's a selection list)
-                            if isinstance(param_config[0], list):
-                                if len(param_config[0]) > 3:
-                                    param_config[0] = param_config[0][:3]
-                
-                node_infos[node_class] = node_data
-        return json.dumps(node_infos)
+        # 紧凑的节点 schema（枚举列表截断、去掉 tooltip 等），按目录版本缓存序列化结果
+        schemas = await get_node_schema_cache()
+        return schemas.render(node_class_list)
     except Exception as e:
         return json.dumps({"error": f"Failed to get node infos of {','.join(node_class_list)}: {str(e)}"})
 
@@ -185,8 +169,8 @@ async def search_node_local(node_class: str = "", keywords: list[str] = None, li
         if not node_class_str and not keyword_list:
             return json.dumps({"error": "both node_class and keywords are empty"})
 
-        object_info = await get_object_info()
-        if not object_info:
+        search_index = await get_node_search_index()
+        if not len(search_index):
             return json.dumps({"error": "Failed to fetch object info from ComfyUI"})
 
         # 组合所有搜索 token：node_class + keywords
@@ -195,81 +179,20 @@ async def search_node_local(node_class: str = "", keywords: list[str] = None, li
             tokens.append(node_class_str.lower())
         tokens.extend([kw.lower() for kw in keyword_list])
 
-        candidates = []
-
-        for cls_name, meta in object_info.items():
-            cls_str = str(cls_name)
-            cls_lower = cls_str.lower()
-
-            name = str(meta.get("name", "") or "")
-            display_name = str(meta.get("display_name", "") or "")
-            category = str(meta.get("category", "") or "")
-            description = str(meta.get("description", "") or "")
-
-            text_blocks = [
-                cls_lower,
-                name.lower(),
-                display_name.lower(),
-                category.lower(),
-                description.lower(),
-            ]
-            joined_text = " ".join(text_blocks)
-
-            score = 0
-            hit_params: list[str] = []
-
-            # 输入参数信息，用于参数名匹配
-            input_meta = meta.get("input") or {}
-            required_inputs = {}
-            optional_inputs = {}
-            if isinstance(input_meta, dict):
-                required_inputs = input_meta.get("required") or {}
-                optional_inputs = input_meta.get("optional") or {}
-
-            # 针对每个 token 进行匹配和评分计算
-            for token in tokens:
-                if not token:
-                    continue
-
-                # 方案1：按类名 / 名称 / 分类 / 描述做关键字匹配
-                if token in joined_text:
-                    score += joined_text.count(token)
-                    if token in cls_lower:
-                        score += 2
-
-                # 方案2：按输入参数名搜索（brightness、contrast、saturation 等）
-                for section in (required_inputs, optional_inputs):
-                    if isinstance(section, dict):
-                        for param_name in section.keys():
-                            p_str = str(param_name)
-                            if token in p_str.lower():
-                                if p_str not in hit_params:
-                                    hit_params.append(p_str)
-
-                # 方案3：输出名称作为弱信号
-                output_names = meta.get("output_name") or []
-                if isinstance(output_names, list):
-                    for out_name in output_names:
-                        if token in str(out_name).lower():
-                            score += 1
-
-            if hit_params:
-                # 参数命中整体提高权重
-                score += len(hit_params) * 3
-
-            if score <= 0:
-                continue
-
-            candidates.append(
-                {
-                    "class_name": cls_str,
-                    "score": score,
-                    "hit_params": hit_params,
-                    "name": name,
-                    "display_name": display_name,
-                    "category": category,
-                }
-            )
+        # 倒排索引检索（类名、显示名、分类、描述、输入参数名、输出名）
+        limit = max(1, min(int(limit), 50))  # 给一个合理的上限
+        hits, _ = search_index.search(tokens, limit)
+        candidates = [
+            {
+                "class_name": hit.class_name,
+                "score": round(hit.score, 2),
+                "hit_params": hit.hit_params(tokens),
+                "name": hit.doc["name"],
+                "display_name": hit.doc["display_name"],
+                "category": hit.doc["category"],
+            }
+            for hit in hits
+        ]
 
         if not candidates:
             return json.dumps(
@@ -283,17 +206,12 @@ async def search_node_local(node_class: str = "", keywords: list[str] = None, li
                 ensure_ascii=False,
             )
 
-        # 按得分排序，并限制返回数量
-        candidates.sort(key=lambda x: x["score"], reverse=True)
-        limit = max(1, min(int(limit), 50))  # 给一个合理的上限
-        results = candidates[:limit]
-
         return json.dumps(
             {
                 "node_class": node_class_str,
                 "keywords": keyword_list,
                 "match_type": "search",
-                "results": results,
+                "results": candidates,
             },
             ensure_ascii=False,
         )
@@ -369,7 +287,8 @@ def update_workflow(workflow_data: str = "") -> str:
         ext_data = [{
             "type": "workflow_update",
             "data": {
-                "workflow_data": workflow_dict
+                "workflow_data": workflow_dict,
+                "version_id": version_id
             }
         }]
         
@@ -451,6 +370,7 @@ def remove_node(node_id: str) -> str:
             "type": "workflow_update",
             "data": {
                 "workflow_data": workflow_data,
+                "version_id": version_id,
                 "changes": {
                     "action": "remove_node",
                     "node_id": node_id,
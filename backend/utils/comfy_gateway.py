@@ -2,15 +2,20 @@
 ComfyUI Gateway Utilities
 
 This module provides Python implementations of ComfyUI API functions,
-using HTTP requests to the ComfyUI server for consistency.
+using HTTP requests to the ComfyUI server for consistency. Node definitions
+for the local ComfyUI instance are built in-process instead.
 """
 
 import json
 import os
 import uuid
+import time
+import inspect
 import logging
 import asyncio
-from typing import Dict, Any, Optional, List
+import hashlib
+import contextlib
+from typing import Dict, Any, Optional, List, Callable, Awaitable, FrozenSet, Tuple
 
 # Import ComfyUI internal modules
 import nodes
@@ -19,6 +24,210 @@ import folder_paths
 import server
 import aiohttp
 
+from .object_info_cache import ObjectInfoCache
+from .object_info_snapshot import SnapshotStore
+from .execution_monitor import RemoteExecutionMonitor, get_local_monitor
+
+
+# ---------------------------------------------------------------------------
+# Shared object_info cache — /api/object_info is huge (10-50 MB) and almost
+# never changes while ComfyUI is running.  One cache per ComfyUI base URL is
+# shared by every ComfyGateway instance and every tool in the process.
+# ---------------------------------------------------------------------------
+
+_object_info_caches: Dict[str, ObjectInfoCache] = {}
+
+# On-disk snapshot of the local catalog and its derived indexes
+_snapshot_store = SnapshotStore()
+
+
+def get_object_info_cache(base_url: str) -> ObjectInfoCache:
+    """Return the shared object_info cache for a ComfyUI base URL."""
+    cache = _object_info_caches.get(base_url)
+    if cache is None:
+        cache = _object_info_caches[base_url] = ObjectInfoCache()
+    return cache
+
+
+# ---------------------------------------------------------------------------
+# Shared HTTP session — one pooled, keep-alive aiohttp session for every
+# gateway call instead of a new session (and TCP connection) per request.
+# Created lazily on the running loop and closed when the server shuts down.
+# ---------------------------------------------------------------------------
+
+HTTP_POOL_LIMIT = 64            # total connections across all ComfyUI hosts
+HTTP_POOL_LIMIT_PER_HOST = 16
+HTTP_KEEPALIVE_TIMEOUT = 60.0   # seconds an idle connection is kept open
+
+_http_session: Optional[aiohttp.ClientSession] = None
+# Loop the shared session was created on (ClientSession.loop is deprecated)
+_http_session_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _discard_http_session(session: aiohttp.ClientSession, loop: Optional[asyncio.AbstractEventLoop]) -> None:
+    """Close a session that belongs to another event loop."""
+    if session.closed:
+        return
+    if loop is not None and loop.is_running() and not loop.is_closed():
+        asyncio.run_coroutine_threadsafe(session.close(), loop)
+    else:
+        # Its loop is gone: mark the session closed and drop the connector's sockets directly
+        connector = session.connector
+        session.detach()
+        if connector is not None:
+            with contextlib.suppress(Exception):
+                connector._close()
+
+
+def get_http_session() -> aiohttp.ClientSession:
+    """Return the shared aiohttp session, creating it on first use."""
+    global _http_session, _http_session_loop
+    loop = asyncio.get_running_loop()
+    if _http_session is None or _http_session.closed or _http_session_loop is not loop:
+        if _http_session is not None:
+            _discard_http_session(_http_session, _http_session_loop)
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_POOL_LIMIT,
+            limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+            keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+        )
+        _http_session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=30))
+        _http_session_loop = loop
+    return _http_session
+
+
+async def close_http_session(app=None) -> None:
+    """Close the shared session (registered as an aiohttp on_shutdown handler)."""
+    global _http_session, _http_session_loop
+    session, loop = _http_session, _http_session_loop
+    _http_session, _http_session_loop = None, None
+    if session is None or session.closed:
+        return
+    if loop is None or loop is asyncio.get_running_loop():
+        await session.close()
+    else:
+        _discard_http_session(session, loop)
+
+
+try:
+    server.PromptServer.instance.app.on_shutdown.append(close_http_session)
+except Exception as e:
+    logging.warning(f"Could not register ComfyGateway session shutdown hook: {e}")
+
+
+# Execution event monitors for remote ComfyUI instances, by base URL
+_remote_monitors: Dict[str, RemoteExecutionMonitor] = {}
+
+
+# ---------------------------------------------------------------------------
+# In-process object_info provider — builds node definitions straight from
+# nodes.NODE_CLASS_MAPPINGS, the same way ComfyUI's /api/object_info route
+# does, so the local instance skips the loopback HTTP round trip and the
+# JSON encode/decode of the whole catalog.
+# ---------------------------------------------------------------------------
+
+OBJECT_INFO_BUILD_CHUNK = 50    # node classes built between event-loop yields
+
+
+def _to_json_compatible(value: Any) -> Any:
+    """Convert tuples to lists (and unknown objects to str) so in-process
+    definitions look exactly like the ones parsed from the HTTP response."""
+    if isinstance(value, dict):
+        return {str(k): _to_json_compatible(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_json_compatible(v) for v in value]
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+def build_node_info(node_class: str) -> Dict[str, Any]:
+    """Build the definition of one node class, mirroring ComfyUI's node_info()."""
+    obj_class = nodes.NODE_CLASS_MAPPINGS[node_class]
+    # V3 schema nodes describe themselves
+    if hasattr(obj_class, 'GET_NODE_INFO_V1'):
+        return _to_json_compatible(obj_class.GET_NODE_INFO_V1())
+
+    input_types = obj_class.INPUT_TYPES()
+    info = {}
+    info['input'] = input_types
+    info['input_order'] = {key: list(value.keys()) for (key, value) in input_types.items()}
+    info['output'] = obj_class.RETURN_TYPES
+    info['output_is_list'] = obj_class.OUTPUT_IS_LIST if hasattr(obj_class, 'OUTPUT_IS_LIST') else [False] * len(obj_class.RETURN_TYPES)
+    info['output_name'] = obj_class.RETURN_NAMES if hasattr(obj_class, 'RETURN_NAMES') else info['output']
+    info['name'] = node_class
+    info['display_name'] = nodes.NODE_DISPLAY_NAME_MAPPINGS.get(node_class, node_class)
+    info['description'] = obj_class.DESCRIPTION if hasattr(obj_class, 'DESCRIPTION') else ''
+    info['python_module'] = getattr(obj_class, "RELATIVE_PYTHON_MODULE", "nodes")
+    info['category'] = getattr(obj_class, 'CATEGORY', 'sd')
+    info['output_node'] = getattr(obj_class, 'OUTPUT_NODE', False) is True
+    if hasattr(obj_class, 'OUTPUT_TOOLTIPS'):
+        info['output_tooltips'] = obj_class.OUTPUT_TOOLTIPS
+    if getattr(obj_class, "DEPRECATED", False):
+        info['deprecated'] = True
+    if getattr(obj_class, "EXPERIMENTAL", False):
+        info['experimental'] = True
+    if hasattr(obj_class, 'API_NODE'):
+        info['api_node'] = obj_class.API_NODE
+    return _to_json_compatible(info)
+
+
+def get_self_validated_inputs(node_class: str) -> Optional[Tuple[FrozenSet[str], bool]]:
+    """
+    (argument names, takes **kwargs) of a local node class's VALIDATE_INPUTS,
+    or None if it has none. ComfyUI skips its own enum and min/max checks for
+    the inputs VALIDATE_INPUTS receives, and its link type checks when it
+    receives "input_types".
+    """
+    obj_class = nodes.NODE_CLASS_MAPPINGS.get(node_class)
+    validate = getattr(obj_class, "VALIDATE_INPUTS", None) if obj_class is not None else None
+    if validate is None:
+        return None
+    try:
+        argspec = inspect.getfullargspec(validate)
+    except TypeError:
+        return frozenset(), True
+    return frozenset(argspec.args), argspec.varkw is not None
+
+
+def build_object_info(node_class: Optional[str] = None) -> Dict[str, Any]:
+    """Build the node catalog in-process; same shape as /api/object_info[/{node_class}]."""
+    if node_class:
+        class_names = [node_class] if node_class in nodes.NODE_CLASS_MAPPINGS else []
+    else:
+        class_names = list(nodes.NODE_CLASS_MAPPINGS.keys())
+
+    out = {}
+    _build_node_infos(class_names, out)
+    return out
+
+
+async def build_object_info_chunked(chunk_size: int = OBJECT_INFO_BUILD_CHUNK) -> Dict[str, Any]:
+    """
+    Build the full node catalog on the event-loop thread, yielding between chunks.
+
+    Not offloaded to a worker thread: custom nodes' INPUT_TYPES() are not
+    thread-safe and folder_paths.cache_helper is process-wide, shared with
+    ComfyUI's own /object_info handler and the executor. cache_helper is
+    entered per chunk so it is never held across a yield.
+    """
+    class_names = list(nodes.NODE_CLASS_MAPPINGS.keys())
+    out = {}
+    for start in range(0, len(class_names), chunk_size):
+        _build_node_infos(class_names[start:start + chunk_size], out)
+        await asyncio.sleep(0)
+    return out
+
+
+def _build_node_infos(class_names: List[str], out: Dict[str, Any]) -> None:
+    # cache_helper memoizes folder listings shared by many loader nodes
+    with getattr(folder_paths, 'cache_helper', None) or contextlib.nullcontext():
+        for x in class_names:
+            try:
+                out[x] = build_node_info(x)
+            except Exception as e:
+                logging.error(f"An error occurred while retrieving information for the '{x}' node: {e}")
+
 
 class ComfyGateway:
     """ComfyUI API Gateway for Python backend - uses internal functions instead of HTTP requests"""
@@ -34,23 +243,31 @@ class ComfyGateway:
         self.server_instance = server.PromptServer.instance
         
         # Auto-detect server URL if not provided
+        local_url = self._detect_local_url()
         if base_url:
             self.base_url = base_url.rstrip('/')
         else:
-            # Auto-detect from server instance
-            if hasattr(self.server_instance, 'address') and hasattr(self.server_instance, 'port'):
-                address = self.server_instance.address or '127.0.0.1'
-                port = self.server_instance.port or 8188
-                # Use 127.0.0.1 for localhost to avoid potential connection issues
-                if address in ['0.0.0.0', '::']:
-                    address = '127.0.0.1'
-                self.base_url = f"http://{address}:{port}"
-            else:
-                # Fallback to default
-                self.base_url = "http://127.0.0.1:8188"
+            self.base_url = local_url
+
+        # The gateway talks to the ComfyUI process we are running in, so
+        # in-process providers can be used instead of loopback HTTP.
+        self.is_local = self.base_url == local_url
         
         logging.info(f"ComfyGateway initialized with base_url: {self.base_url}")
 
+    def _detect_local_url(self) -> str:
+        """Derive the URL of the ComfyUI server this plugin is loaded into"""
+        # Auto-detect from server instance
+        if hasattr(self.server_instance, 'address') and hasattr(self.server_instance, 'port'):
+            address = self.server_instance.address or '127.0.0.1'
+            port = self.server_instance.port or 8188
+            # Use 127.0.0.1 for localhost to avoid potential connection issues
+            if address in ['0.0.0.0', '::']:
+                address = '127.0.0.1'
+            return f"http://{address}:{port}"
+        # Fallback to default
+        return "http://127.0.0.1:8188"
+
     async def run_prompt(self, json_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Run a prompt - HTTP call to ComfyUI /api/prompt endpoint
@@ -68,6 +285,10 @@ class ComfyGateway:
             # Create a timeout configuration
             timeout = aiohttp.ClientTimeout(total=30)  # 30 second timeout
             
+            if self.is_local:
+                # Start listening before the prompt is queued so no execution event is missed
+                get_local_monitor()
+
             # Make HTTP request to /api/prompt endpoint
             url = f"{self.base_url}/api/prompt"
             headers = {
@@ -75,11 +296,11 @@ class ComfyGateway:
             }
             
 
-            # Create temporary session
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.post(url, json=json_data, headers=headers) as response:
-                    response_data = await response.json()
-                    status_code = response.status
+            # Reuse the shared pooled session
+            session = get_http_session()
+            async with session.post(url, json=json_data, headers=headers, timeout=timeout) as response:
+                response_data = await response.json()
+                status_code = response.status
             
             # Handle the response based on status code
             if status_code == 200:
@@ -129,9 +350,123 @@ class ComfyGateway:
                 "node_errors": {}
             }
 
-    async def get_object_info(self, node_class: Optional[str] = None) -> Dict[str, Any]:
+    async def validate_prompt(self, json_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Validate a prompt without queueing it - ComfyUI's execution.validate_prompt in-process
+        
+        Args:
+            json_data: The prompt/workflow data in the same format as HTTP API
+            
+        Returns:
+            Dict with success flag and the same error / node_errors structure
+            as a rejected /api/prompt request
+        """
+        if not self.is_local:
+            # execution.validate_prompt only sees this process's nodes
+            logging.warning(f"Dry-run validation is only available in-process, queueing on {self.base_url} instead")
+            return await self.run_prompt(json_data)
+
+        try:
+            # on_prompt handlers are not triggered: nothing is going to be queued
+            prompt = json_data.get("prompt")
+            if not isinstance(prompt, dict):
+                return {
+                    "success": False,
+                    "error": {"type": "no_prompt", "message": "No prompt provided", "details": "No prompt provided", "extra_info": {}},
+                    "node_errors": {},
+                }
+
+            # The signature changed across ComfyUI versions:
+            # (prompt) -> (prompt_id, prompt) -> async (prompt_id, prompt, partial_execution_list)
+            param_count = len(inspect.signature(execution.validate_prompt).parameters)
+            if param_count >= 3:
+                args = (str(uuid.uuid4()), prompt, None)
+            elif param_count == 2:
+                args = (str(uuid.uuid4()), prompt)
+            else:
+                args = (prompt,)
+            result = execution.validate_prompt(*args)
+            if inspect.isawaitable(result):
+                result = await result
+
+            valid, error, _, node_errors = result[:4]
+            if valid:
+                return {
+                    "success": True,
+                    "validated_only": True,
+                    "message": "Workflow validation successful (not queued)",
+                    "node_errors": node_errors or {},
+                }
+            return {
+                "success": False,
+                "validated_only": True,
+                "error": error,
+                "node_errors": node_errors or {},
+            }
+        except Exception as e:
+            logging.error(f"Error in validate_prompt: {e}")
+            return {
+                "success": False,
+                "error": {
+                    "type": "validation_error",
+                    "message": "Failed to validate prompt",
+                    "details": str(e)
+                },
+                "node_errors": {}
+            }
+
+    async def get_object_info(self, node_class: Optional[str] = None, use_cache: bool = True) -> Dict[str, Any]:
+        """
+        Get ComfyUI node definitions, served from the shared object_info cache
+        
+        Args:
+            node_class: Optional specific node class to get info for
+            use_cache: If False, bypass the cache and hit /api/object_info directly
+            
+        Returns:
+            Dict containing node definitions and their parameters
+        """
+        if not use_cache:
+            return await self._fetch_object_info(node_class)
+
+        cache = get_object_info_cache(self.base_url)
+        if node_class:
+            # Serve single classes from the catalog when we already have it,
+            # but never pull the whole catalog just to answer one class.
+            cached = cache.peek()
+            if node_class in cached:
+                return {node_class: cached[node_class]}
+            return await self._fetch_object_info(node_class)
+
+        if self.is_local and not _snapshot_store.attached:
+            await _snapshot_store.attach(cache)
+        return await cache.get(self._fetch_object_info)
+
+    async def _fetch_object_info(self, node_class: Optional[str] = None) -> Dict[str, Any]:
         """
-        Get ComfyUI node definitions - HTTP call to ComfyUI /api/object_info endpoint
+        Fetch node definitions, in-process for the local ComfyUI instance and
+        over HTTP for remote instances (or if the in-process build fails)
+        
+        Args:
+            node_class: Optional specific node class to get info for
+            
+        Returns:
+            Dict containing node definitions and their parameters
+        """
+        if self.is_local:
+            try:
+                if node_class:
+                    return build_object_info(node_class)
+                # Building thousands of definitions is CPU bound (INPUT_TYPES
+                # lists model folders); build in chunks so the loop stays responsive.
+                return await build_object_info_chunked()
+            except Exception as e:
+                logging.error(f"In-process object info failed, falling back to HTTP: {e}")
+        return await self._fetch_object_info_http(node_class)
+
+    async def _fetch_object_info_http(self, node_class: Optional[str] = None) -> Dict[str, Any]:
+        """
+        HTTP call to ComfyUI /api/object_info endpoint
         
         Args:
             node_class: Optional specific node class to get info for
@@ -150,13 +485,13 @@ class ComfyGateway:
                 url = f"{self.base_url}/api/object_info"
             
             # Make HTTP request to /api/object_info endpoint
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.get(url) as response:
-                    if response.status == 200:
-                        return await response.json()
-                    else:
-                        logging.error(f"Failed to get object info: HTTP {response.status}")
-                        return {}
+            session = get_http_session()
+            async with session.get(url, timeout=timeout) as response:
+                if response.status == 200:
+                    return await response.json()
+                else:
+                    logging.error(f"Failed to get object info: HTTP {response.status}")
+                    return {}
                         
         except aiohttp.ClientConnectionError as e:
             logging.error(f"Connection error in get_object_info: {e}")
@@ -168,6 +503,10 @@ class ComfyGateway:
             logging.error(f"Error getting object info: {e}")
             return {}
 
+    def invalidate_object_info(self) -> None:
+        """Drop the cached node catalog for this gateway's ComfyUI instance"""
+        get_object_info_cache(self.base_url).invalidate()
+
     async def get_installed_nodes(self) -> List[str]:
         """
         Get list of installed node types - HTTP call to ComfyUI /api/object_info endpoint
@@ -210,13 +549,13 @@ class ComfyGateway:
                 'Content-Type': 'application/json'
             }
             
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.post(url, json=json_data, headers=headers) as response:
-                    if response.status == 200:
-                        return {"success": True}
-                    else:
-                        logging.error(f"Failed to manage queue: HTTP {response.status}")
-                        return {"error": f"HTTP {response.status}"}
+            session = get_http_session()
+            async with session.post(url, json=json_data, headers=headers, timeout=timeout) as response:
+                if response.status == 200:
+                    return {"success": True}
+                else:
+                    logging.error(f"Failed to manage queue: HTTP {response.status}")
+                    return {"error": f"HTTP {response.status}"}
                         
         except aiohttp.ClientConnectionError as e:
             logging.error(f"Connection error in manage_queue: {e}")
@@ -245,13 +584,13 @@ class ComfyGateway:
                 'Content-Type': 'application/json'
             }
             
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.post(url, headers=headers) as response:
-                    if response.status == 200:
-                        return {"success": True}
-                    else:
-                        logging.error(f"Failed to interrupt processing: HTTP {response.status}")
-                        return {"error": f"HTTP {response.status}"}
+            session = get_http_session()
+            async with session.post(url, headers=headers, timeout=timeout) as response:
+                if response.status == 200:
+                    return {"success": True}
+                else:
+                    logging.error(f"Failed to interrupt processing: HTTP {response.status}")
+                    return {"error": f"HTTP {response.status}"}
                         
         except aiohttp.ClientConnectionError as e:
             logging.error(f"Connection error in interrupt_processing: {e}")
@@ -280,13 +619,13 @@ class ComfyGateway:
             # Make HTTP request to /api/history/{prompt_id} endpoint
             url = f"{self.base_url}/api/history/{prompt_id}"
             
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.get(url) as response:
-                    if response.status == 200:
-                        return await response.json()
-                    else:
-                        logging.error(f"Failed to get history for prompt {prompt_id}: HTTP {response.status}")
-                        return {"error": f"HTTP {response.status}"}
+            session = get_http_session()
+            async with session.get(url, timeout=timeout) as response:
+                if response.status == 200:
+                    return await response.json()
+                else:
+                    logging.error(f"Failed to get history for prompt {prompt_id}: HTTP {response.status}")
+                    return {"error": f"HTTP {response.status}"}
                         
         except aiohttp.ClientConnectionError as e:
             logging.error(f"Connection error in get_history: {e}")
@@ -298,6 +637,49 @@ class ComfyGateway:
             logging.error(f"Error fetching history for prompt {prompt_id}: {e}")
             return {"error": f"Failed to get history: {str(e)}"}
 
+    async def _complete_from_history(self, monitor, prompt_id: str) -> None:
+        """Finish a tracked execution from /history if the prompt is already there."""
+        if monitor.track(prompt_id).done:
+            return
+        history = await self.get_history(prompt_id)
+        entry = history.get(prompt_id) if isinstance(history, dict) else None
+        if isinstance(entry, dict):
+            monitor.track(prompt_id).load_history(entry)
+
+    async def wait_for_prompt(self, prompt_id: str, timeout: float = 60.0, client_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Wait for a prompt to finish, driven by ComfyUI's execution events
+        (in-process for the local instance, /ws for remote ones)
+        
+        Args:
+            prompt_id: The ID of the prompt to wait for
+            timeout: Maximum seconds to wait
+            client_id: client_id the prompt was queued with (needed for remote instances)
+            
+        Returns:
+            Dict with status (pending/running/completed/error/interrupted), outputs,
+            per-node timings in seconds and, on failure, the error details
+        """
+        if self.is_local:
+            monitor = get_local_monitor()
+        else:
+            monitor = _remote_monitors.get(self.base_url)
+            if monitor is None:
+                monitor = _remote_monitors[self.base_url] = RemoteExecutionMonitor(self.base_url)
+            if client_id:
+                await monitor.subscribe(get_http_session(), client_id)
+        try:
+            # The prompt may have finished before we started listening
+            await self._complete_from_history(monitor, prompt_id)
+            prompt_execution = await monitor.wait(prompt_id, timeout)
+            if not prompt_execution.done:
+                # Timed out: the terminal event may have been missed (e.g. no client_id), ask /history again
+                await self._complete_from_history(monitor, prompt_id)
+            return prompt_execution.summary()
+        finally:
+            if not self.is_local and client_id:
+                monitor.unsubscribe(client_id)
+
     async def get_queue_status(self) -> Dict[str, Any]:
         """
         Get current queue status - HTTP call to ComfyUI /api/queue endpoint
@@ -312,13 +694,13 @@ class ComfyGateway:
             # Make HTTP request to /api/queue endpoint
             url = f"{self.base_url}/api/queue"
             
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.get(url) as response:
-                    if response.status == 200:
-                        return await response.json()
-                    else:
-                        logging.error(f"Failed to get queue status: HTTP {response.status}")
-                        return {"error": f"HTTP {response.status}"}
+            session = get_http_session()
+            async with session.get(url, timeout=timeout) as response:
+                if response.status == 200:
+                    return await response.json()
+                else:
+                    logging.error(f"Failed to get queue status: HTTP {response.status}")
+                    return {"error": f"HTTP {response.status}"}
                         
         except aiohttp.ClientConnectionError as e:
             logging.error(f"Connection error in get_queue_status: {e}")
@@ -331,6 +713,17 @@ class ComfyGateway:
             return {"error": f"Failed to get queue status: {str(e)}"}
 
 
+_gateways: Dict[Optional[str], ComfyGateway] = {}
+
+
+def get_gateway(base_url: Optional[str] = None) -> ComfyGateway:
+    """Return the shared ComfyGateway for a base URL (auto-detected local instance if None)"""
+    gateway = _gateways.get(base_url)
+    if gateway is None:
+        gateway = _gateways[base_url] = ComfyGateway(base_url)
+    return gateway
+
+
 # Convenience functions for backward compatibility and easy importing
 async def run_prompt(json_data: Dict[str, Any], base_url: Optional[str] = None) -> Dict[str, Any]:
     """
@@ -343,42 +736,66 @@ async def run_prompt(json_data: Dict[str, Any], base_url: Optional[str] = None)
     Returns:
         Dict containing the API response
     """
-    gateway = ComfyGateway(base_url)
+    gateway = get_gateway(base_url)
     return await gateway.run_prompt(json_data)
 
 
 async def get_object_info(base_url: Optional[str] = None) -> Dict[str, Any]:
-    """Standalone function to get object info - HTTP call to ComfyUI /api/object_info endpoint"""
-    gateway = ComfyGateway(base_url)
+    """Standalone function to get object info - served from the shared object_info cache"""
+    gateway = get_gateway(base_url)
     return await gateway.get_object_info()
 
 async def get_object_info_by_class(node_class: str, base_url: Optional[str] = None) -> Dict[str, Any]:
     """Standalone function to get object info for specific node class - HTTP call to ComfyUI /api/object_info/{node_class} endpoint"""
-    gateway = ComfyGateway(base_url)
+    gateway = get_gateway(base_url)
     return await gateway.get_object_info(node_class)
 
+async def get_catalog_index(name: str, builder: Callable[[Dict[str, Any]], Any], base_url: Optional[str] = None) -> Any:
+    """Standalone function to get an index derived from the cached object info, built once per catalog version"""
+    gateway = get_gateway(base_url)
+    await gateway.get_object_info()
+    return get_object_info_cache(gateway.base_url).get_derived(name, builder)
+
+def invalidate_object_info_cache(base_url: Optional[str] = None) -> None:
+    """Standalone function to drop the cached node catalog (all ComfyUI instances if base_url is None)"""
+    if base_url is None:
+        for cache in _object_info_caches.values():
+            cache.invalidate()
+        return
+    get_gateway(base_url).invalidate_object_info()
+
 
 async def get_installed_nodes(base_url: Optional[str] = None) -> List[str]:
     """Standalone function to get installed nodes - HTTP call to ComfyUI /api/object_info endpoint"""
-    gateway = ComfyGateway(base_url)
+    gateway = get_gateway(base_url)
     return await gateway.get_installed_nodes()
 
 async def manage_queue(clear: bool = False, delete: Optional[List[str]] = None, base_url: Optional[str] = None) -> Dict[str, Any]:
     """Standalone function to manage queue - HTTP call to ComfyUI /api/queue endpoint"""
-    gateway = ComfyGateway(base_url)
+    gateway = get_gateway(base_url)
     return await gateway.manage_queue(clear, delete)
 
 async def interrupt_processing(base_url: Optional[str] = None) -> Dict[str, Any]:
     """Standalone function to interrupt processing - HTTP call to ComfyUI /api/interrupt endpoint"""
-    gateway = ComfyGateway(base_url)
+    gateway = get_gateway(base_url)
     return await gateway.interrupt_processing()
 
 async def get_history(prompt_id: str, base_url: Optional[str] = None) -> Dict[str, Any]:
     """Standalone function to get history - HTTP call to ComfyUI /api/history/{prompt_id} endpoint"""
-    gateway = ComfyGateway(base_url)
+    gateway = get_gateway(base_url)
     return await gateway.get_history(prompt_id)
 
 async def get_queue_status(base_url: Optional[str] = None) -> Dict[str, Any]:
     """Standalone function to get queue status - HTTP call to ComfyUI /api/queue endpoint"""
-    gateway = ComfyGateway(base_url)
+    gateway = get_gateway(base_url)
     return await gateway.get_queue_status()
+
+async def wait_for_prompt(prompt_id: str, timeout: float = 60.0, client_id: Optional[str] = None, base_url: Optional[str] = None) -> Dict[str, Any]:
+    """Standalone function to wait for a prompt to finish - driven by ComfyUI execution events"""
+    gateway = get_gateway(base_url)
+    return await gateway.wait_for_prompt(prompt_id, timeout, client_id)
+
+async def validate_prompt(json_data: Dict[str, Any], base_url: Optional[str] = None) -> Dict[str, Any]:
+    """Standalone function to validate a prompt without queueing it - execution.validate_prompt in-process"""
+    gateway = get_gateway(base_url)
+    return await gateway.validate_prompt(json_data)
@@ -0,0 +1,251 @@
+"""
+Execution Monitor
+
+Tracks ComfyUI prompt executions from the server's own execution events
+(execution_start / executing / executed / execution_success /
+execution_error / execution_interrupted), so tools can await a prompt's
+completion instead of polling /api/history and /api/queue.
+
+- Local instance: PromptServer.send_sync is wrapped once and every event
+  carrying a prompt_id is forwarded to the monitor on the event loop.
+- Remote instance: the monitor listens on the server's /ws?clientId=...
+  socket for the client id the prompt was queued with.
+
+Completed executions are kept in a bounded LRU so a waiter that arrives
+after the prompt finished still gets its result.
+"""
+
+import json
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+import aiohttp
+
+MAX_TRACKED_EXECUTIONS = 256
+
+# Terminal statuses
+STATUS_SUCCESS = "completed"
+STATUS_ERROR = "error"
+STATUS_INTERRUPTED = "interrupted"
+TERMINAL_STATUSES = (STATUS_SUCCESS, STATUS_ERROR, STATUS_INTERRUPTED)
+
+
+class PromptExecution:
+    """Execution state of one prompt, built from execution events."""
+
+    def __init__(self, prompt_id: str):
+        self.prompt_id = prompt_id
+        self.status = "pending"
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.outputs: Dict[str, Any] = {}
+        self.node_timings: Dict[str, float] = {}
+        self.cached_nodes: list = []
+        self.error: Optional[Dict[str, Any]] = None
+        self._current_node: Optional[str] = None
+        self._node_started: Dict[str, float] = {}
+        self._done = asyncio.Event()
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def _finish_node(self, node_id: Optional[str], now: float) -> None:
+        if node_id is None:
+            return
+        started = self._node_started.pop(node_id, None)
+        if started is not None:
+            self.node_timings[node_id] = round(now - started, 3)
+
+    def _finish(self, status: str, now: float) -> None:
+        self._finish_node(self._current_node, now)
+        self._current_node = None
+        self.status = status
+        self.finished_at = now
+        self._done.set()
+
+    def on_event(self, event: str, data: Dict[str, Any]) -> None:
+        if self.done:
+            # ComfyUI still sends executing(node=None) after execution_success /
+            # execution_error; the terminal status and outputs are final.
+            return
+        now = time.monotonic()
+        if event == "execution_start":
+            self.status = "running"
+            self.started_at = now
+        elif event == "execution_cached":
+            self.cached_nodes = list(data.get("nodes") or [])
+        elif event == "executing":
+            node_id = data.get("node")
+            if self.started_at is None:
+                self.started_at = now
+            self.status = "running"
+            if node_id != self._current_node:
+                self._finish_node(self._current_node, now)
+                self._current_node = node_id
+                if node_id is not None:
+                    self._node_started[node_id] = now
+            if node_id is None:
+                # Older ComfyUI versions signal completion with executing(node=None)
+                self._finish(STATUS_SUCCESS, now)
+        elif event == "executed":
+            node_id = data.get("node")
+            if node_id is not None:
+                self._finish_node(node_id, now)
+                if node_id == self._current_node:
+                    self._current_node = None
+                if data.get("output") is not None:
+                    self.outputs[str(node_id)] = data["output"]
+        elif event == "execution_success":
+            self._finish(STATUS_SUCCESS, now)
+        elif event == "execution_error":
+            self.error = {
+                "node_id": data.get("node_id"),
+                "node_type": data.get("node_type"),
+                "exception_type": data.get("exception_type"),
+                "exception_message": data.get("exception_message"),
+            }
+            self._finish(STATUS_ERROR, now)
+        elif event == "execution_interrupted":
+            self._finish(STATUS_INTERRUPTED, now)
+
+    def load_history(self, history: Dict[str, Any]) -> None:
+        """Complete the execution from a /history entry (events were missed)."""
+        status = history.get("status") or {}
+        self.outputs = history.get("outputs") or self.outputs
+        for msg in status.get("messages") or []:
+            if isinstance(msg, (list, tuple)) and len(msg) == 2 and msg[0] == "execution_error":
+                self.on_event(msg[0], msg[1] or {})
+                return
+            if isinstance(msg, (list, tuple)) and len(msg) == 2 and msg[0] == "execution_interrupted":
+                self.on_event(msg[0], msg[1] or {})
+                return
+        self._finish(STATUS_SUCCESS, time.monotonic())
+
+    def summary(self) -> Dict[str, Any]:
+        result = {
+            "prompt_id": self.prompt_id,
+            "status": self.status,
+            "outputs": self.outputs,
+            "node_timings": self.node_timings,
+        }
+        if self.started_at is not None:
+            end = self.finished_at if self.finished_at is not None else time.monotonic()
+            result["elapsed"] = round(end - self.started_at, 3)
+        if self.cached_nodes:
+            result["cached_nodes"] = self.cached_nodes
+        if self.error:
+            result["error"] = self.error
+        return result
+
+
+class ExecutionMonitor:
+    """Routes execution events to PromptExecution records and their waiters."""
+
+    def __init__(self, max_tracked: int = MAX_TRACKED_EXECUTIONS):
+        self.max_tracked = max_tracked
+        self._executions: "OrderedDict[str, PromptExecution]" = OrderedDict()
+
+    def track(self, prompt_id: str) -> PromptExecution:
+        execution = self._executions.get(prompt_id)
+        if execution is None:
+            execution = self._executions[prompt_id] = PromptExecution(prompt_id)
+            while len(self._executions) > self.max_tracked:
+                self._executions.popitem(last=False)
+        else:
+            self._executions.move_to_end(prompt_id)
+        return execution
+
+    def dispatch(self, event: str, data: Dict[str, Any]) -> None:
+        prompt_id = data.get("prompt_id") if isinstance(data, dict) else None
+        if not prompt_id:
+            return
+        try:
+            self.track(prompt_id).on_event(event, data)
+        except Exception as e:
+            logging.warning(f"ExecutionMonitor failed to handle {event} for {prompt_id}: {e}")
+
+    async def wait(self, prompt_id: str, timeout: float) -> PromptExecution:
+        """Wait until the prompt reaches a terminal status or timeout elapses."""
+        execution = self.track(prompt_id)
+        if not execution.done:
+            try:
+                await asyncio.wait_for(execution._done.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+        return execution
+
+
+_local_monitor: Optional[ExecutionMonitor] = None
+
+
+def get_local_monitor() -> ExecutionMonitor:
+    """Monitor fed in-process by the local PromptServer (hook installed on first use)."""
+    global _local_monitor
+    if _local_monitor is None:
+        import server
+        monitor = ExecutionMonitor()
+        instance = server.PromptServer.instance
+        loop = asyncio.get_running_loop()
+        original_send_sync = instance.send_sync
+
+        def send_sync(event, data, sid=None):
+            original_send_sync(event, data, sid)
+            if isinstance(data, dict) and data.get("prompt_id"):
+                # send_sync runs on the execution thread
+                loop.call_soon_threadsafe(monitor.dispatch, event, data)
+
+        instance.send_sync = send_sync
+        _local_monitor = monitor
+    return _local_monitor
+
+
+class RemoteExecutionMonitor(ExecutionMonitor):
+    """Monitor fed by a remote ComfyUI's /ws socket, one connection per client id while waited on."""
+
+    def __init__(self, base_url: str, max_tracked: int = MAX_TRACKED_EXECUTIONS):
+        super().__init__(max_tracked)
+        self.ws_base = base_url.replace("http://", "ws://", 1).replace("https://", "wss://", 1)
+        self._sockets: Dict[str, asyncio.Task] = {}
+        self._waiters: Dict[str, int] = {}
+
+    async def _listen(self, session: aiohttp.ClientSession, client_id: str, connected: asyncio.Event) -> None:
+        try:
+            async with session.ws_connect(f"{self.ws_base}/ws?clientId={client_id}", heartbeat=30) as ws:
+                connected.set()
+                async for msg in ws:
+                    if msg.type == aiohttp.WSMsgType.TEXT:
+                        try:
+                            payload = json.loads(msg.data)
+                        except ValueError:
+                            continue
+                        self.dispatch(payload.get("type"), payload.get("data") or {})
+                    elif msg.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                        break
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.warning(f"Execution monitor websocket for {client_id} failed: {e}")
+        finally:
+            connected.set()
+            self._sockets.pop(client_id, None)
+
+    async def subscribe(self, session: aiohttp.ClientSession, client_id: str) -> None:
+        self._waiters[client_id] = self._waiters.get(client_id, 0) + 1
+        if client_id not in self._sockets:
+            connected = asyncio.Event()
+            self._sockets[client_id] = asyncio.ensure_future(self._listen(session, client_id, connected))
+            await connected.wait()
+
+    def unsubscribe(self, client_id: str) -> None:
+        remaining = self._waiters.get(client_id, 1) - 1
+        if remaining > 0:
+            self._waiters[client_id] = remaining
+            return
+        self._waiters.pop(client_id, None)
+        task = self._sockets.pop(client_id, None)
+        if task is not None:
+            task.cancel()
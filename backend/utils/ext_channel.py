@@ -0,0 +1,102 @@
+"""
+Ext Channel
+
+Per-run side channel for the "ext" part of tool outputs (workflow updates,
+checkpoints, model suggestions, ...).
+
+Tools keep returning JSON strings with an "ext" key. Function tools passed to
+create_agent are wrapped so that, while a stream handler has a channel open,
+the ext list is published to the channel under the tool call id and removed
+from the output; the model only sees the remaining result plus the ext item
+types. The stream handler picks the ext up from the tool_call_output_item
+with take_tool_ext() instead of parsing the full output again.
+
+Without an open channel (or when the SDK does not expose the tool call id)
+tool outputs are passed through unchanged.
+"""
+
+import json
+import contextvars
+import dataclasses
+from typing import Dict, Any, List, Optional
+
+from .logger import log
+
+_ext_channel: contextvars.ContextVar[Optional["ExtChannel"]] = contextvars.ContextVar('ext_channel', default=None)
+
+
+class ExtChannel:
+    """Ext lists published by tools, keyed by tool call id."""
+
+    def __init__(self):
+        self._pending: Dict[str, List[Any]] = {}
+
+    def publish(self, call_id: str, ext: List[Any]) -> None:
+        self._pending.setdefault(call_id, []).extend(ext)
+
+    def take(self, call_id: Optional[str]) -> Optional[List[Any]]:
+        if call_id is None:
+            return None
+        return self._pending.pop(call_id, None)
+
+
+def open_ext_channel() -> ExtChannel:
+    """Open a channel for the current request; call before Runner.run_streamed so tool tasks inherit it."""
+    channel = ExtChannel()
+    _ext_channel.set(channel)
+    return channel
+
+
+def get_ext_channel() -> Optional[ExtChannel]:
+    return _ext_channel.get()
+
+
+def _call_id_of(raw_item: Any) -> Optional[str]:
+    if isinstance(raw_item, dict):
+        return raw_item.get("call_id")
+    return getattr(raw_item, "call_id", None)
+
+
+def take_tool_ext(output_item: Any) -> Optional[List[Any]]:
+    """Ext published for a tool_call_output_item, or None."""
+    channel = _ext_channel.get()
+    if channel is None:
+        return None
+    return channel.take(_call_id_of(getattr(output_item, "raw_item", None)))
+
+
+def _publish_ext(call_id: Optional[str], output: Any) -> Any:
+    channel = _ext_channel.get()
+    if channel is None or call_id is None or not isinstance(output, str) or '"ext"' not in output:
+        return output
+    try:
+        data = json.loads(output)
+    except ValueError:
+        return output
+    if not isinstance(data, dict) or not isinstance(data.get("ext"), list):
+        return output
+
+    ext = data.pop("ext")
+    if ext:
+        channel.publish(call_id, ext)
+        # Short note instead of the payload, so the model knows the UI was updated
+        data["ui_updates"] = [item.get("type") for item in ext if isinstance(item, dict)]
+    return json.dumps(data, ensure_ascii=False)
+
+
+def with_ext_side_channel(tool: Any) -> Any:
+    """Copy of a FunctionTool whose ext goes to the side channel; other tools are returned as is."""
+    on_invoke_tool = getattr(tool, "on_invoke_tool", None)
+    if on_invoke_tool is None or not dataclasses.is_dataclass(tool) or getattr(on_invoke_tool, "_ext_side_channel", False):
+        return tool
+
+    async def invoke(ctx, input_json):
+        output = await on_invoke_tool(ctx, input_json)
+        try:
+            return _publish_ext(getattr(ctx, "tool_call_id", None), output)
+        except Exception as e:
+            log.warning(f"Failed to move ext of tool '{getattr(tool, 'name', '?')}' to the side channel: {e}")
+            return output
+
+    invoke._ext_side_channel = True
+    return dataclasses.replace(tool, on_invoke_tool=invoke)
@@ -118,6 +118,32 @@ DISABLE_WORKFLOW_GEN = os.getenv("DISABLE_WORKFLOW_GEN") or False
 
 TENANT_ID = os.getenv("TENANT_ID") or None
 
+# Streaming: text frames are coalesced for up to STREAM_FLUSH_WINDOW_MS or until
+# STREAM_FLUSH_MAX_BYTES of new text are pending (lower the window on LAN, raise it for remote users)
+STREAM_FLUSH_WINDOW_MS = float(os.getenv("STREAM_FLUSH_WINDOW_MS") or 40)
+STREAM_FLUSH_MAX_BYTES = int(os.getenv("STREAM_FLUSH_MAX_BYTES") or 2048)
+# Resumable streams: frames kept per session for /api/chat/resume, how long a finished run stays
+# resumable, and how long a run keeps going after its client disconnected (0 = cancel at once)
+STREAM_REPLAY_MAX_BYTES = int(os.getenv("STREAM_REPLAY_MAX_BYTES") or 8 * 1024 * 1024)
+STREAM_REPLAY_TTL_SECONDS = float(os.getenv("STREAM_REPLAY_TTL_SECONDS") or 120)
+STREAM_RESUME_GRACE_SECONDS = float(os.getenv("STREAM_RESUME_GRACE_SECONDS") or 30)
+# MCP: SSE connections are pooled per (url, API key) and reused across requests. Idle connections
+# are closed after MCP_POOL_IDLE_SECONDS; a reused connection idle for longer than
+# MCP_POOL_HEALTH_CHECK_SECONDS is pinged first. DISABLE_MCP_POOL=1 connects per request again.
+MCP_POOL_IDLE_SECONDS = float(os.getenv("MCP_POOL_IDLE_SECONDS") or 300)
+MCP_POOL_HEALTH_CHECK_SECONDS = float(os.getenv("MCP_POOL_HEALTH_CHECK_SECONDS") or 30)
+DISABLE_MCP_POOL = (os.getenv("DISABLE_MCP_POOL") or "").lower() in ("1", "true", "yes")
+# MCP tool schemas are cached per server for MCP_TOOLS_CACHE_TTL_SECONDS (stale schemas are served
+# while they are refreshed in the background). The startup warmup uses COMFYUI_COPILOT_API_KEY if set.
+MCP_TOOLS_CACHE_TTL_SECONDS = float(os.getenv("MCP_TOOLS_CACHE_TTL_SECONDS") or 3600)
+COMFYUI_COPILOT_API_KEY = os.getenv("COMFYUI_COPILOT_API_KEY") or None
+# AsyncOpenAI clients (and their keep-alive connection pools) kept for reuse by create_agent
+LLM_CLIENT_POOL_SIZE = int(os.getenv("LLM_CLIENT_POOL_SIZE") or 16)
+# Chat messages whose intent (rewrite / analyze the current workflow) is classified locally with at least
+# INTENT_ROUTER_MIN_CONFIDENCE skip the router LLM turn. DISABLE_INTENT_ROUTER=1 always uses the LLM router.
+INTENT_ROUTER_MIN_CONFIDENCE = float(os.getenv("INTENT_ROUTER_MIN_CONFIDENCE") or 0.8)
+DISABLE_INTENT_ROUTER = (os.getenv("DISABLE_INTENT_ROUTER") or "").lower() in ("1", "true", "yes")
+
 def apply_llm_env_defaults(config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     """
     Apply LLM-related defaults with precedence:
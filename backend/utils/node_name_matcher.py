@@ -0,0 +1,106 @@
+"""
+Node Name Matcher
+
+Trigram index over node class names and display names, used to suggest the
+intended node when the LLM asks for a class that does not exist. Unlike a
+substring scan it tolerates typos ("KSamplr" -> "KSampler") and only
+touches the classes that share trigrams with the query.
+
+The index is derived from the shared object_info cache and rebuilt only
+when the catalog version changes.
+"""
+
+from typing import Dict, Any, List, Optional, Set
+
+from .comfy_gateway import get_catalog_index
+
+NAME_MATCHER_NAME = "node_names"
+
+MIN_SIMILARITY = 0.3
+# Bonus when the query is a plain substring of the name (the old matching rule)
+SUBSTRING_BONUS = 0.5
+
+
+def _normalize(name: str) -> str:
+    return "".join(ch for ch in str(name).lower() if ch.isalnum())
+
+
+def trigrams(name: str) -> Set[str]:
+    """Trigrams of the normalized name, padded so short names still match."""
+    padded = f"  {_normalize(name)} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class NodeNameMatcher:
+    """Trigram (Dice coefficient) matcher over class names and display names."""
+
+    def __init__(self):
+        # trigram -> names containing it
+        self._postings: Dict[str, Set[str]] = {}
+        # indexed name -> (normalized name, trigram count, class names it refers to)
+        self._names: Dict[str, Any] = {}
+
+    @classmethod
+    def build(cls, object_info: Dict[str, Any]) -> "NodeNameMatcher":
+        matcher = cls()
+        for class_name, meta in (object_info or {}).items():
+            matcher.add(class_name, meta if isinstance(meta, dict) else {})
+        return matcher
+
+    def add(self, class_name: str, meta: Dict[str, Any]) -> None:
+        for name in (class_name, meta.get("display_name")):
+            if not name:
+                continue
+            entry = self._names.get(name)
+            if entry is None:
+                grams = trigrams(name)
+                entry = self._names[name] = (_normalize(name), len(grams), set())
+                for gram in grams:
+                    self._postings.setdefault(gram, set()).add(name)
+            entry[2].add(class_name)
+
+    def remove(self, class_name: str) -> None:
+        for name in [n for n, entry in self._names.items() if class_name in entry[2]]:
+            entry = self._names[name]
+            entry[2].discard(class_name)
+            if entry[2]:
+                continue
+            del self._names[name]
+            for gram in trigrams(name):
+                names = self._postings.get(gram)
+                if names is not None:
+                    names.discard(name)
+                    if not names:
+                        del self._postings[gram]
+
+    def suggest(self, query: str, limit: int = 5) -> List[str]:
+        """Class names most similar to query, best first."""
+        query_grams = trigrams(query)
+        normalized = _normalize(query)
+        if not normalized:
+            return []
+
+        shared: Dict[str, int] = {}
+        for gram in query_grams:
+            for name in self._postings.get(gram, ()):
+                shared[name] = shared.get(name, 0) + 1
+
+        scores: Dict[str, float] = {}
+        for name, count in shared.items():
+            name_normalized, gram_count, class_names = self._names[name]
+            score = 2.0 * count / (len(query_grams) + gram_count)
+            if normalized in name_normalized:
+                score += SUBSTRING_BONUS
+            if score < MIN_SIMILARITY:
+                continue
+            for class_name in class_names:
+                if score > scores.get(class_name, 0.0):
+                    scores[class_name] = score
+
+        ranked = sorted(scores.items(), key=lambda x: (-x[1], x[0]))
+        return [class_name for class_name, _ in ranked[:limit]]
+
+
+async def get_node_name_matcher(base_url: Optional[str] = None) -> NodeNameMatcher:
+    """Return the name matcher for the current node catalog."""
+    return await get_catalog_index(NAME_MATCHER_NAME, NodeNameMatcher.build, base_url)
@@ -0,0 +1,123 @@
+"""
+Node Schema Cache
+
+Compact "LLM view" of ComfyUI node definitions for tool output. Compared to
+the raw object_info entry, the compact schema:
+
+- truncates enum option lists to a few entries (with the total count),
+- drops tooltips and other UI-only fields (input_order, python_module, ...),
+- drops output_is_list / output_tooltips when they carry no information.
+
+IO type names are kept verbatim: the model copies them into links and
+workflow_validator compares them exactly, so abbreviated types would have to
+be mapped back on every tool call.
+
+Each class is projected and serialized once per catalog version and the
+resulting JSON string is shared across tools and sessions.
+"""
+
+import json
+from typing import Dict, Any, List, Optional
+
+from .comfy_gateway import get_catalog_index
+
+SCHEMA_CACHE_NAME = "node_schemas"
+
+MAX_ENUM_OPTIONS = 3
+
+# object_info keys that are not useful to the model
+_DROPPED_NODE_KEYS = {"input_order", "python_module", "output_tooltips", "search_aliases", "essentials_category"}
+# input config keys that are not useful to the model (forceInput is kept: the input must be linked)
+_DROPPED_CONFIG_KEYS = {"tooltip", "advanced", "rawLink"}
+
+
+def _compact_input(param_config: Any) -> Any:
+    if not isinstance(param_config, (list, tuple)) or not param_config:
+        return param_config
+
+    io_type = param_config[0]
+    config = param_config[1] if len(param_config) > 1 and isinstance(param_config[1], dict) else None
+    config = {k: v for k, v in config.items() if k not in _DROPPED_CONFIG_KEYS} if config else {}
+
+    if isinstance(io_type, (list, tuple)):
+        if len(io_type) > MAX_ENUM_OPTIONS:
+            config["options_total"] = len(io_type)
+        io_type = list(io_type[:MAX_ENUM_OPTIONS])
+    elif io_type == "COMBO" and isinstance(config.get("options"), list):
+        # V3 style combo: options live in the config dict
+        options = config["options"]
+        if len(options) > MAX_ENUM_OPTIONS:
+            config["options_total"] = len(options)
+        config["options"] = options[:MAX_ENUM_OPTIONS]
+
+    return [io_type, config] if config else [io_type]
+
+
+def compact_node_schema(meta: Dict[str, Any]) -> Dict[str, Any]:
+    """Project one object_info entry onto its compact LLM view."""
+    compact: Dict[str, Any] = {}
+    for key, value in meta.items():
+        if key in _DROPPED_NODE_KEYS:
+            continue
+        if key == "input" and isinstance(value, dict):
+            compact["input"] = {
+                section: {name: _compact_input(cfg) for name, cfg in params.items()}
+                for section, params in value.items()
+                if section in ("required", "optional") and isinstance(params, dict) and params
+            }
+        elif key == "output_is_list" and isinstance(value, list) and not any(value):
+            continue
+        elif key in ("deprecated", "experimental", "api_node") and not value:
+            continue
+        elif key == "description" and not value:
+            continue
+        else:
+            compact[key] = value
+    return compact
+
+
+class NodeSchemaCache:
+    """Lazily serialized compact schemas for the current catalog."""
+
+    def __init__(self, object_info: Dict[str, Any]):
+        self._object_info = object_info or {}
+        self._serialized: Dict[str, str] = {}
+
+    def rebind(self, object_info: Dict[str, Any]) -> None:
+        """Point the cache at a newer catalog (used for incremental updates)."""
+        self._object_info = object_info or {}
+
+    def add(self, class_name: str, meta: Dict[str, Any]) -> None:
+        # Serialized lazily from the bound catalog on next use
+        self._serialized.pop(class_name, None)
+
+    def remove(self, class_name: str) -> None:
+        self._serialized.pop(class_name, None)
+
+    def __contains__(self, class_name: str) -> bool:
+        return class_name in self._object_info
+
+    def get(self, class_name: str) -> Optional[str]:
+        """Compact schema of one class as a JSON string, or None if unknown."""
+        schema = self._serialized.get(class_name)
+        if schema is None:
+            meta = self._object_info.get(class_name)
+            if not isinstance(meta, dict):
+                return None
+            schema = json.dumps(compact_node_schema(meta), ensure_ascii=False)
+            self._serialized[class_name] = schema
+        return schema
+
+    def render(self, class_names: List[str]) -> str:
+        """JSON object {class_name: compact schema} for the known classes, in order."""
+        parts = []
+        for class_name in dict.fromkeys(class_names):
+            schema = self.get(class_name)
+            if schema is not None:
+                parts.append(f"{json.dumps(class_name, ensure_ascii=False)}: {schema}")
+        return "{" + ", ".join(parts) + "}"
+
+
+async def get_node_schema_cache(base_url: Optional[str] = None) -> NodeSchemaCache:
+    """Return the compact schema cache for the current node catalog."""
+    return await get_catalog_index(SCHEMA_CACHE_NAME, NodeSchemaCache, base_url)
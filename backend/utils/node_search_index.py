@@ -0,0 +1,243 @@
+"""
+Node Search Index
+
+Inverted index over the ComfyUI node catalog (object_info) with BM25-style
+scoring. Class names, display names, categories, descriptions, input
+parameter names and output names are indexed as separate weighted fields.
+Query terms match exactly, by prefix, or (as a last resort) as a substring
+of an indexed term.
+
+The index is derived from the shared object_info cache and rebuilt only
+when the catalog version changes.
+"""
+
+import re
+import math
+import bisect
+from typing import Dict, Any, List, Optional, Tuple
+
+from .comfy_gateway import get_catalog_index
+
+SEARCH_INDEX_NAME = "node_search"
+
+# Field weights (BM25F style: term frequencies are weighted per field)
+FIELD_WEIGHTS: Dict[str, float] = {
+    "class_name": 3.0,
+    "display_name": 2.5,
+    "category": 1.5,
+    "description": 1.0,
+    "params": 2.0,
+    "outputs": 1.0,
+}
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Query term expansion weights
+PREFIX_MATCH_WEIGHT = 0.6
+SUBSTRING_MATCH_WEIGHT = 0.3
+MAX_EXPANSIONS = 50
+
+_WORD_RE = re.compile(r"[A-Za-z0-9]+|[^\W\d_A-Za-z]+")
+_CAMEL_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lowercase index terms.
+
+    ASCII words are kept whole and additionally split on camelCase and digit
+    boundaries ("KSamplerAdvanced" -> ksampleradvanced, sampler, advanced),
+    so both the full identifier and its parts are searchable. Non-ASCII runs
+    (e.g. Chinese) are kept as single terms.
+    """
+    tokens: List[str] = []
+    for word in _WORD_RE.findall(text or ""):
+        tokens.append(word.lower())
+        if word.isascii():
+            parts = [p.lower() for p in _CAMEL_RE.findall(word) if len(p) > 1 or p.isdigit()]
+            if len(parts) > 1:
+                tokens.extend(parts)
+    return tokens
+
+
+def _input_param_names(meta: Dict[str, Any]) -> List[str]:
+    input_meta = meta.get("input") or {}
+    names: List[str] = []
+    if isinstance(input_meta, dict):
+        for section in ("required", "optional"):
+            params = input_meta.get(section) or {}
+            if isinstance(params, dict):
+                names.extend(str(p) for p in params.keys())
+    return names
+
+
+def _output_names(meta: Dict[str, Any]) -> List[str]:
+    names: List[str] = []
+    for key in ("output_name", "output"):
+        values = meta.get(key) or []
+        if isinstance(values, list):
+            names.extend(str(v) for v in values if isinstance(v, str))
+    return names
+
+
+class NodeSearchHit:
+    """A single search result."""
+
+    __slots__ = ("class_name", "score", "doc")
+
+    def __init__(self, class_name: str, score: float, doc: Dict[str, Any]):
+        self.class_name = class_name
+        self.score = score
+        self.doc = doc
+
+    def hit_params(self, query_terms: List[str]) -> List[str]:
+        """Input parameter names containing any of the query terms."""
+        return [p for p in self.doc["params"] if any(t in p.lower() for t in query_terms)]
+
+
+class NodeSearchIndex:
+    """Inverted index over node classes with weighted-field BM25 scoring."""
+
+    def __init__(self):
+        # term -> {class_name: weighted term frequency}
+        self._postings: Dict[str, Dict[str, float]] = {}
+        # class_name -> {term: weighted term frequency}
+        self._doc_terms: Dict[str, Dict[str, float]] = {}
+        self._doc_len: Dict[str, float] = {}
+        self._docs: Dict[str, Dict[str, Any]] = {}
+        self._total_len = 0.0
+        self._sorted_terms: Optional[List[str]] = None
+
+    @classmethod
+    def build(cls, object_info: Dict[str, Any]) -> "NodeSearchIndex":
+        index = cls()
+        for class_name, meta in (object_info or {}).items():
+            if isinstance(meta, dict):
+                index.add(class_name, meta)
+        return index
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def add(self, class_name: str, meta: Dict[str, Any]) -> None:
+        """Index (or re-index) one node class."""
+        if class_name in self._docs:
+            self.remove(class_name)
+
+        params = _input_param_names(meta)
+        fields = {
+            "class_name": tokenize(str(class_name)),
+            "display_name": tokenize(str(meta.get("display_name") or "")),
+            "category": tokenize(str(meta.get("category") or "")),
+            "description": tokenize(str(meta.get("description") or "")),
+            # Whole parameter names too, so "vae_name" matches as one term
+            "params": [t for p in params for t in tokenize(p) + [p.lower()]],
+            "outputs": [t for o in _output_names(meta) for t in tokenize(o)],
+        }
+
+        terms: Dict[str, float] = {}
+        length = 0.0
+        for field, tokens in fields.items():
+            weight = FIELD_WEIGHTS[field]
+            for token in tokens:
+                terms[token] = terms.get(token, 0.0) + weight
+                length += weight
+
+        for term, tf in terms.items():
+            self._postings.setdefault(term, {})[class_name] = tf
+        self._doc_terms[class_name] = terms
+        self._doc_len[class_name] = length
+        self._total_len += length
+        self._docs[class_name] = {
+            "name": str(meta.get("name", "") or ""),
+            "display_name": str(meta.get("display_name", "") or ""),
+            "category": str(meta.get("category", "") or ""),
+            "params": params,
+        }
+        self._sorted_terms = None
+
+    def remove(self, class_name: str) -> None:
+        """Drop one node class from the index."""
+        terms = self._doc_terms.pop(class_name, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(class_name, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_len -= self._doc_len.pop(class_name, 0.0)
+        self._docs.pop(class_name, None)
+        self._sorted_terms = None
+
+    def _vocabulary(self) -> List[str]:
+        if self._sorted_terms is None:
+            self._sorted_terms = sorted(self._postings)
+        return self._sorted_terms
+
+    def _expand(self, term: str) -> List[Tuple[str, float]]:
+        """Index terms matching a query term, with their match weight."""
+        expansions: List[Tuple[str, float]] = []
+        if term in self._postings:
+            expansions.append((term, 1.0))
+
+        if len(term) >= 2:
+            vocab = self._vocabulary()
+            i = bisect.bisect_right(vocab, term)
+            while i < len(vocab) and vocab[i].startswith(term) and len(expansions) < MAX_EXPANSIONS:
+                expansions.append((vocab[i], PREFIX_MATCH_WEIGHT))
+                i += 1
+
+        if not expansions and len(term) >= 3:
+            for candidate in self._vocabulary():
+                if term in candidate:
+                    expansions.append((candidate, SUBSTRING_MATCH_WEIGHT))
+                    if len(expansions) >= MAX_EXPANSIONS:
+                        break
+        return expansions
+
+    def search(self, queries: List[str], limit: int = 10) -> Tuple[List[NodeSearchHit], int]:
+        """
+        Rank node classes against the given query strings.
+
+        Returns:
+            (top hits sorted by score, total number of matching classes)
+        """
+        if not self._docs:
+            return [], 0
+
+        n_docs = len(self._docs)
+        avg_len = self._total_len / n_docs if n_docs else 1.0
+        scores: Dict[str, float] = {}
+
+        query_terms: List[str] = []
+        for q in queries:
+            whole = str(q or "").strip().lower()
+            # Whole identifiers such as "vae_name" are indexed as-is
+            if whole in self._postings:
+                query_terms.append(whole)
+            query_terms.extend(tokenize(str(q or "")))
+        for term in dict.fromkeys(query_terms):
+            # Best expansion per document, so one prefix cannot score many times
+            term_scores: Dict[str, float] = {}
+            for index_term, match_weight in self._expand(term):
+                postings = self._postings[index_term]
+                idf = math.log(1.0 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for class_name, tf in postings.items():
+                    norm = BM25_K1 * (1.0 - BM25_B + BM25_B * self._doc_len[class_name] / avg_len)
+                    score = match_weight * idf * tf * (BM25_K1 + 1.0) / (tf + norm)
+                    if score > term_scores.get(class_name, 0.0):
+                        term_scores[class_name] = score
+            for class_name, score in term_scores.items():
+                scores[class_name] = scores.get(class_name, 0.0) + score
+
+        ranked = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+        hits = [NodeSearchHit(c, s, self._docs[c]) for c, s in ranked[:max(0, limit)]]
+        return hits, len(ranked)
+
+
+async def get_node_search_index(base_url: Optional[str] = None) -> NodeSearchIndex:
+    """Return the search index for the current node catalog."""
+    return await get_catalog_index(SEARCH_INDEX_NAME, NodeSearchIndex.build, base_url)
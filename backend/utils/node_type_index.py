@@ -0,0 +1,122 @@
+"""
+Node Type Index
+
+Type-compatibility index over the ComfyUI node catalog (object_info):
+
+- producers: IO type -> [(node class, output index)]
+- consumers: IO type -> [(node class, input name, required)]
+
+Wildcard ("*") outputs and inputs are kept in separate lists so lookups for a
+concrete type can include them without scanning the catalog. Comma-separated
+input types ("IMAGE,MASK") are indexed under each member type, following
+ComfyUI's own link validation.
+
+The index is derived from the shared object_info cache and rebuilt only when
+the catalog version changes.
+"""
+
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+TYPE_INDEX_NAME = "node_types"
+
+WILDCARD_TYPE = "*"
+
+
+def split_io_type(io_type: Any) -> List[str]:
+    """
+    Split a link type into its member types.
+
+    Returns an empty list for non-link inputs (enum option lists, non-string
+    values), so combo widgets are never treated as connectable types.
+    """
+    if not isinstance(io_type, str):
+        return []
+    return [t.strip() for t in io_type.split(",") if t.strip()]
+
+
+class NodeTypeIndex:
+    """IO type -> producer outputs / consumer inputs over the node catalog."""
+
+    def __init__(self):
+        self.producers: Dict[str, List[Tuple[str, int]]] = {}
+        self.consumers: Dict[str, List[Tuple[str, str, bool]]] = {}
+        self.wildcard_producers: List[Tuple[str, int]] = []
+        self.wildcard_consumers: List[Tuple[str, str, bool]] = []
+        # node class -> types it is listed under, so remove() only touches those lists
+        self._produced_types: Dict[str, Set[str]] = {}
+        self._consumed_types: Dict[str, Set[str]] = {}
+
+    @classmethod
+    def build(cls, object_info: Dict[str, Any]) -> "NodeTypeIndex":
+        index = cls()
+        for class_name, meta in (object_info or {}).items():
+            if isinstance(meta, dict):
+                index.add(class_name, meta)
+        return index
+
+    def add(self, class_name: str, meta: Dict[str, Any]) -> None:
+        """Index the outputs and link inputs of one node class."""
+        outputs = meta.get("output") or []
+        if isinstance(outputs, list):
+            for output_index, output_type in enumerate(outputs):
+                for t in split_io_type(output_type):
+                    if t == WILDCARD_TYPE:
+                        self.wildcard_producers.append((class_name, output_index))
+                    else:
+                        self.producers.setdefault(t, []).append((class_name, output_index))
+                    self._produced_types.setdefault(class_name, set()).add(t)
+
+        input_meta = meta.get("input") or {}
+        if not isinstance(input_meta, dict):
+            return
+        for section in ("required", "optional"):
+            params = input_meta.get(section) or {}
+            if not isinstance(params, dict):
+                continue
+            for input_name, input_config in params.items():
+                if not isinstance(input_config, (list, tuple)) or not input_config:
+                    continue
+                entry = (class_name, str(input_name), section == "required")
+                for t in split_io_type(input_config[0]):
+                    if t == WILDCARD_TYPE:
+                        self.wildcard_consumers.append(entry)
+                    else:
+                        self.consumers.setdefault(t, []).append(entry)
+                    self._consumed_types.setdefault(class_name, set()).add(t)
+
+    def remove(self, class_name: str) -> None:
+        """Drop one node class from the index."""
+        produced = self._produced_types.pop(class_name, set())
+        consumed = self._consumed_types.pop(class_name, set())
+        for table, types in ((self.producers, produced), (self.consumers, consumed)):
+            for t in types - {WILDCARD_TYPE}:
+                entries = [e for e in table.get(t, []) if e[0] != class_name]
+                if entries:
+                    table[t] = entries
+                else:
+                    table.pop(t, None)
+        if WILDCARD_TYPE in produced:
+            self.wildcard_producers = [e for e in self.wildcard_producers if e[0] != class_name]
+        if WILDCARD_TYPE in consumed:
+            self.wildcard_consumers = [e for e in self.wildcard_consumers if e[0] != class_name]
+
+    def producers_of(self, io_type: str, include_wildcard: bool = False) -> List[Tuple[str, int]]:
+        """(node class, output index) pairs whose output can provide io_type."""
+        result = list(self.producers.get(io_type, []))
+        if include_wildcard:
+            result.extend(self.wildcard_producers)
+        return result
+
+    def consumers_of(self, io_type: str, include_wildcard: bool = False) -> List[Tuple[str, str, bool]]:
+        """(node class, input name, required) triples whose input accepts io_type."""
+        result = list(self.consumers.get(io_type, []))
+        if include_wildcard:
+            result.extend(self.wildcard_consumers)
+        return result
+
+
+async def get_node_type_index(base_url: Optional[str] = None) -> NodeTypeIndex:
+    """Return the type-compatibility index for the current node catalog."""
+    # Imported here so the type helpers (used by workflow_validator) load without ComfyUI
+    from .comfy_gateway import get_catalog_index
+    return await get_catalog_index(TYPE_INDEX_NAME, NodeTypeIndex.build, base_url)
@@ -0,0 +1,221 @@
+"""
+Object Info Cache
+
+Process-wide cache of a ComfyUI node catalog (object_info) and of the
+indexes derived from it. Kept free of ComfyUI imports; comfy_gateway owns one
+cache per ComfyUI base URL and supplies the fetcher.
+"""
+
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from typing import Dict, Any, Optional, List, Callable, Awaitable
+
+OBJECT_INFO_TTL = 300.0   # seconds before a cached catalog is revalidated
+# Above this share of changed classes, derived indexes are rebuilt from scratch
+INCREMENTAL_UPDATE_MAX_FRACTION = 0.5
+
+
+def hash_node_infos(object_info: Dict[str, Any]) -> Dict[str, str]:
+    """Content hash of every node class definition."""
+    return {
+        class_name: hashlib.sha1(json.dumps(meta, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        for class_name, meta in object_info.items()
+    }
+
+
+class CatalogDelta:
+    """Node classes added, removed and changed between two catalogs."""
+
+    __slots__ = ("added", "removed", "changed")
+
+    def __init__(self, added: List[str], removed: List[str], changed: List[str]):
+        self.added = added
+        self.removed = removed
+        self.changed = changed
+
+    @classmethod
+    def between(cls, old_hashes: Dict[str, str], new_hashes: Dict[str, str]) -> "CatalogDelta":
+        return cls(
+            added=[c for c in new_hashes if c not in old_hashes],
+            removed=[c for c in old_hashes if c not in new_hashes],
+            changed=[c for c, h in new_hashes.items() if c in old_hashes and old_hashes[c] != h],
+        )
+
+    def __len__(self) -> int:
+        return len(self.added) + len(self.removed) + len(self.changed)
+
+    def __str__(self) -> str:
+        return f"+{len(self.added)} -{len(self.removed)} ~{len(self.changed)}"
+
+    def apply_to(self, index: Any, object_info: Dict[str, Any]) -> bool:
+        """
+        Update a derived index in place via its add(class_name, meta) /
+        remove(class_name) methods (and rebind(object_info) if it keeps a
+        reference to the catalog). Returns False if the index cannot be
+        updated incrementally.
+        """
+        if not callable(getattr(index, "add", None)) or not callable(getattr(index, "remove", None)):
+            return False
+        rebind = getattr(index, "rebind", None)
+        if callable(rebind):
+            rebind(object_info)
+        for class_name in self.removed + self.changed:
+            index.remove(class_name)
+        for class_name in self.added + self.changed:
+            meta = object_info.get(class_name)
+            if isinstance(meta, dict):
+                index.add(class_name, meta)
+        return True
+
+
+class ObjectInfoCache:
+    """
+    Process-wide cache for the full node catalog.
+
+    - Single-flight: concurrent callers await the same in-flight fetch.
+    - Stale-while-revalidate: once populated, readers get the cached catalog
+      immediately; an expired catalog is refreshed in the background.
+    - invalidate(): forces the next reader to wait for a fresh catalog.
+    - Incremental: a refreshed catalog is diffed against the previous one by
+      per-class content hash; an unchanged catalog keeps its version, and
+      derived indexes are patched with the delta instead of being rebuilt.
+    """
+
+    def __init__(self, ttl: float = OBJECT_INFO_TTL):
+        self.ttl = ttl
+        self._data: Dict[str, Any] = {}
+        self._fetched_at = 0.0
+        self._version = 0
+        self._inflight: Optional[asyncio.Future] = None
+        # Bumped by invalidate(); a refresh started under an older generation is discarded
+        self._generation = 0
+        # class_name -> content hash of the catalog the current derived indexes describe
+        self._hashes: Dict[str, str] = {}
+        # name -> (catalog version, index) for indexes derived from the catalog
+        self._derived: Dict[str, Any] = {}
+        # Called after a new catalog or derived index is stored (snapshot persistence)
+        self.on_update: Optional[Callable[[], None]] = None
+
+    @property
+    def version(self) -> int:
+        """Monotonic counter bumped every time a new catalog is stored."""
+        return self._version
+
+    def peek(self) -> Dict[str, Any]:
+        """Return the cached catalog (possibly stale or empty) without fetching."""
+        return self._data
+
+    def is_stale(self) -> bool:
+        return not self._data or (time.monotonic() - self._fetched_at) >= self.ttl
+
+    async def get(self, fetcher: Callable[[], Awaitable[Dict[str, Any]]], force_refresh: bool = False) -> Dict[str, Any]:
+        """Return the catalog, fetching it at most once across concurrent callers."""
+        if self._data and not force_refresh:
+            if self.is_stale():
+                self._start_refresh(fetcher)
+            return self._data
+        # Shield so a cancelled caller does not cancel the fetch other callers await
+        return await asyncio.shield(self._start_refresh(fetcher))
+
+    def get_derived(self, name: str, builder: Callable[[Dict[str, Any]], Any]) -> Any:
+        """Return an index derived from the catalog, rebuilt only when the catalog version changes."""
+        entry = self._derived.get(name)
+        if entry is not None and entry[0] == self._version:
+            return entry[1]
+        index = builder(self._data)
+        self._derived[name] = (self._version, index)
+        self._notify_update()
+        return index
+
+    def seed(self, data: Dict[str, Any], derived: Dict[str, Any], hashes: Dict[str, str], trusted: bool = True) -> bool:
+        """
+        Populate an empty cache from a persisted snapshot.
+
+        A trusted snapshot is served right away but counts as stale, so the
+        first reader triggers a background revalidation. An untrusted one
+        (custom nodes changed since it was written) is not served; it only
+        provides the baseline that the first fetched catalog is diffed
+        against, so its derived indexes are patched rather than rebuilt.
+        """
+        if self._data or self._hashes or not data:
+            return False
+        self._version += 1
+        self._hashes = hashes
+        self._derived = {name: (self._version, index) for name, index in derived.items()}
+        if trusted:
+            self._data = data
+            self._fetched_at = 0.0
+        return True
+
+    def export(self):
+        """Return (catalog, {name: index}, per-class hashes) for the current catalog version."""
+        derived = {name: entry[1] for name, entry in self._derived.items() if entry[0] == self._version}
+        return self._data, derived, self._hashes
+
+    def _notify_update(self) -> None:
+        if self.on_update is not None:
+            try:
+                self.on_update()
+            except Exception as e:
+                logging.warning(f"object_info cache update hook failed: {e}")
+
+    def invalidate(self) -> None:
+        """Drop the cached catalog; the next reader waits for a fresh fetch,
+        which derived indexes are then patched against."""
+        self._data = {}
+        self._fetched_at = 0.0
+        self._inflight = None
+        self._generation += 1
+
+    def _update_derived(self, delta: Optional[CatalogDelta]) -> None:
+        """Bump the catalog version, carrying derived indexes over by patching them with the delta."""
+        previous = self._version
+        self._version += 1
+        derived: Dict[str, Any] = {}
+        if delta is not None and len(delta) <= len(self._data) * INCREMENTAL_UPDATE_MAX_FRACTION:
+            for name, (version, index) in self._derived.items():
+                if version != previous:
+                    continue
+                try:
+                    if delta.apply_to(index, self._data):
+                        derived[name] = (self._version, index)
+                except Exception as e:
+                    logging.warning(f"Rebuilding catalog index '{name}' after incremental update failed: {e}")
+            if len(delta):
+                logging.info(f"object_info changed ({delta} classes), patched {len(derived)} derived indexes")
+        self._derived = derived
+
+    def _start_refresh(self, fetcher: Callable[[], Awaitable[Dict[str, Any]]]) -> asyncio.Future:
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.ensure_future(self._refresh(fetcher, self._generation))
+        return self._inflight
+
+    async def _refresh(self, fetcher: Callable[[], Awaitable[Dict[str, Any]]], generation: int) -> Dict[str, Any]:
+        try:
+            data = await fetcher()
+        except Exception as e:
+            logging.error(f"Error refreshing object info cache: {e}")
+            data = {}
+        if generation != self._generation:
+            # invalidate() ran while this fetch was in flight: its catalog may
+            # predate the change, so hand callers a fetch started afterwards.
+            return await self._start_refresh(fetcher)
+        if data:
+            hashes = await asyncio.to_thread(hash_node_infos, data)
+            if generation != self._generation:
+                return await self._start_refresh(fetcher)
+            self._fetched_at = time.monotonic()
+            if self._data and hashes == self._hashes:
+                # Unchanged: keep the version so derived indexes stay valid
+                return self._data
+            delta = CatalogDelta.between(self._hashes, hashes) if self._hashes else None
+            self._data = data
+            self._hashes = hashes
+            self._update_derived(delta)
+            self._notify_update()
+            return data
+        # Stale is better than empty
+        return self._data
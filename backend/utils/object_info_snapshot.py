@@ -0,0 +1,216 @@
+"""
+Object Info Snapshot
+
+Persists the local node catalog (object_info) together with the indexes
+derived from it to backend/data, so the first copilot request after a
+ComfyUI restart does not pay for a full catalog build plus indexing.
+
+The snapshot is a single pickle file keyed by a fingerprint of the ComfyUI
+core node modules, the installed custom node packs and the model / input
+folders (their file names are the combo options of loader nodes). A snapshot whose
+fingerprint matches is loaded lazily on first use and marked stale, so the
+shared cache serves it immediately and revalidates it against a freshly
+built catalog in the background. A snapshot whose fingerprint does not
+match is not served, but still provides the per-class hashes and indexes
+that the first fresh catalog is diffed against, so only the classes of
+added or updated packs are re-indexed.
+"""
+
+import os
+import time
+import pickle
+import asyncio
+import hashlib
+from typing import Dict, Any, Optional
+
+import folder_paths
+import nodes
+
+from .logger import log
+
+SNAPSHOT_FORMAT = 3
+SNAPSHOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'object_info_snapshot.pkl')
+
+# Coalesce catalog/index updates into one write
+SNAPSHOT_SAVE_DELAY = 30.0
+
+# Files whose change usually means a custom node pack was installed or updated
+_PACK_MARKERS = (
+    "__init__.py",
+    "pyproject.toml",
+    "requirements.txt",
+    os.path.join(".git", "HEAD"),
+    os.path.join(".git", "ORIG_HEAD"),
+)
+
+
+def _stat_signature(path: str) -> str:
+    try:
+        st = os.stat(path)
+        return f"{path}:{st.st_mtime_ns}:{st.st_size}"
+    except OSError:
+        return f"{path}:-"
+
+
+def _file_list_directories() -> list:
+    """Folders whose file listings end up in combo options (models, input files)."""
+    directories = set()
+    for name, entry in getattr(folder_paths, "folder_names_and_paths", {}).items():
+        if name == "custom_nodes":
+            continue
+        directories.update(entry[0])
+    try:
+        directories.add(folder_paths.get_input_directory())
+    except Exception:
+        pass
+    return sorted(directories)
+
+
+def _tree_signature(h, base: str) -> None:
+    # A directory's mtime changes when entries are added, removed or renamed in it,
+    # so the directory mtimes cover the file names without listing every file.
+    # Symlinked model folders are followed, each directory at most once (symlink cycles).
+    visited = set()
+    for root, dirs, _files in os.walk(base, followlinks=True):
+        try:
+            st = os.stat(root)
+        except OSError:
+            dirs[:] = []
+            continue
+        if (st.st_dev, st.st_ino) in visited:
+            dirs[:] = []
+            continue
+        visited.add((st.st_dev, st.st_ino))
+        dirs.sort()
+        h.update(_stat_signature(root).encode())
+
+
+def compute_fingerprint() -> str:
+    """Fingerprint of everything that defines the node catalog, including the model file listings."""
+    h = hashlib.sha1()
+    h.update(f"format={SNAPSHOT_FORMAT}".encode())
+
+    try:
+        import comfyui_version
+        h.update(f"comfyui={comfyui_version.__version__}".encode())
+    except Exception:
+        pass
+
+    comfy_root = os.path.dirname(os.path.abspath(nodes.__file__))
+    for core in ("nodes.py", "comfy_extras", "comfy_api_nodes"):
+        h.update(_stat_signature(os.path.join(comfy_root, core)).encode())
+
+    try:
+        custom_node_dirs = folder_paths.get_folder_paths("custom_nodes")
+    except Exception:
+        custom_node_dirs = []
+    for base in custom_node_dirs:
+        if not os.path.isdir(base):
+            continue
+        for entry in sorted(os.scandir(base), key=lambda e: e.name):
+            h.update(_stat_signature(entry.path).encode())
+            if entry.is_dir():
+                for marker in _PACK_MARKERS:
+                    h.update(_stat_signature(os.path.join(entry.path, marker)).encode())
+
+    for directory in _file_list_directories():
+        if os.path.isdir(directory):
+            _tree_signature(h, directory)
+    return h.hexdigest()
+
+
+def load_snapshot(fingerprint: str, path: str = SNAPSHOT_PATH) -> Optional[Dict[str, Any]]:
+    """Load the snapshot if it exists; payload["trusted"] tells whether it matches the fingerprint."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as f:
+            payload = pickle.load(f)
+    except Exception as e:
+        log.warning(f"Ignoring unreadable object_info snapshot {path}: {e}")
+        return None
+    if not isinstance(payload, dict) or payload.get("format") != SNAPSHOT_FORMAT:
+        return None
+    if not payload.get("object_info") or not payload.get("hashes"):
+        return None
+    payload["trusted"] = payload.get("fingerprint") == fingerprint
+    if not payload["trusted"]:
+        log.info("object_info snapshot fingerprint changed (custom nodes or model files changed), using it as diff baseline only")
+    return payload
+
+
+def save_snapshot(payload: Dict[str, Any], path: str = SNAPSHOT_PATH) -> None:
+    """Atomically write the snapshot."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+class SnapshotStore:
+    """
+    Connects an ObjectInfoCache to the on-disk snapshot.
+
+    attach(cache) loads the snapshot into an empty cache (once) and
+    subscribes to cache updates; every update schedules a debounced save.
+    """
+
+    def __init__(self, path: str = SNAPSHOT_PATH, save_delay: float = SNAPSHOT_SAVE_DELAY):
+        self.path = path
+        self.save_delay = save_delay
+        self._fingerprint: Optional[str] = None
+        self._load_task: Optional[asyncio.Future] = None
+        self._save_handle: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def attached(self) -> bool:
+        return self._load_task is not None and self._load_task.done()
+
+    async def attach(self, cache) -> None:
+        if self._load_task is None:
+            self._load_task = asyncio.ensure_future(self._load(cache))
+        await asyncio.shield(self._load_task)
+
+    async def _load(self, cache) -> None:
+        try:
+            self._fingerprint = await asyncio.to_thread(compute_fingerprint)
+            start = time.perf_counter()
+            payload = await asyncio.to_thread(load_snapshot, self._fingerprint, self.path)
+            if payload and cache.seed(payload["object_info"], payload.get("derived") or {}, payload["hashes"], payload["trusted"]):
+                log.info(
+                    f"Loaded object_info snapshot: {len(payload['object_info'])} nodes, "
+                    f"{len(payload.get('derived') or {})} indexes in {time.perf_counter() - start:.2f}s"
+                )
+        except Exception as e:
+            log.warning(f"Failed to load object_info snapshot: {e}")
+        finally:
+            cache.on_update = lambda: self.schedule_save(cache)
+
+    def schedule_save(self, cache) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if self._save_handle is not None:
+            self._save_handle.cancel()
+        self._save_handle = loop.call_later(self.save_delay, lambda: asyncio.ensure_future(self._save(cache)))
+
+    async def _save(self, cache) -> None:
+        self._save_handle = None
+        object_info, derived, hashes = cache.export()
+        if not object_info:
+            return
+        payload = {
+            "format": SNAPSHOT_FORMAT,
+            "fingerprint": self._fingerprint or await asyncio.to_thread(compute_fingerprint),
+            "saved_at": time.time(),
+            "object_info": object_info,
+            "hashes": hashes,
+            "derived": derived,
+        }
+        try:
+            await asyncio.to_thread(save_snapshot, payload, self.path)
+            log.info(f"Saved object_info snapshot ({len(object_info)} nodes, {len(derived)} indexes)")
+        except Exception as e:
+            log.warning(f"Failed to save object_info snapshot: {e}")
@@ -0,0 +1,102 @@
+"""
+Stream Replay
+
+Bounded in-memory replay buffers for the streaming chat endpoints, so a
+client whose connection dropped can resume a run instead of starting it
+again.
+
+Every frame written by CoalescingStreamWriter gets a monotonically
+increasing event_id (per run) and is kept in the buffer of its session.
+/api/chat/resume?session_id=...&last_event_id=N replays the frames after N
+and then follows the run live until it finishes. One buffer is kept per
+session (a new run replaces the previous one); finished runs stay
+resumable for STREAM_REPLAY_TTL_SECONDS.
+"""
+
+import time
+import asyncio
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from .globals import STREAM_REPLAY_MAX_BYTES, STREAM_REPLAY_TTL_SECONDS
+
+
+class StreamReplayBuffer:
+    """Frames of one streaming run, oldest dropped first once over max_bytes."""
+
+    def __init__(self, session_id: str, max_bytes: int = STREAM_REPLAY_MAX_BYTES):
+        self.session_id = session_id
+        self.max_bytes = max_bytes
+        self.finished = False
+        self.finished_at: Optional[float] = None
+        # Resume connections currently following the run
+        self.readers = 0
+        self._frames: "deque[Tuple[int, bytes]]" = deque()
+        self._bytes = 0
+        self._last_event_id = 0
+        self._changed = asyncio.Event()
+
+    def next_event_id(self) -> int:
+        self._last_event_id += 1
+        return self._last_event_id
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def append(self, event_id: int, payload: bytes) -> None:
+        self._frames.append((event_id, payload))
+        self._bytes += len(payload)
+        # Always keep the newest frame, even if it alone exceeds the limit
+        while self._bytes > self.max_bytes and len(self._frames) > 1:
+            _, dropped = self._frames.popleft()
+            self._bytes -= len(dropped)
+        self._notify()
+
+    def frames_after(self, last_event_id: int) -> Optional[List[Tuple[int, bytes]]]:
+        """Frames with event_id > last_event_id, or None if some of them were already dropped."""
+        if self._frames and self._frames[0][0] > last_event_id + 1:
+            return None
+        return [frame for frame in self._frames if frame[0] > last_event_id]
+
+    def finish(self) -> None:
+        if not self.finished:
+            self.finished = True
+            self.finished_at = time.monotonic()
+            self._notify()
+
+    async def wait(self, timeout: float) -> None:
+        """Wait for a new frame or the end of the run, at most timeout seconds."""
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def expired(self, now: float) -> bool:
+        return self.finished and self.readers == 0 and now - self.finished_at > STREAM_REPLAY_TTL_SECONDS
+
+
+_buffers: Dict[str, StreamReplayBuffer] = {}
+
+
+def _prune() -> None:
+    now = time.monotonic()
+    for session_id in [sid for sid, buffer in _buffers.items() if buffer.expired(now)]:
+        del _buffers[session_id]
+
+
+def start_stream_replay(session_id: Optional[str]) -> Optional[StreamReplayBuffer]:
+    """New replay buffer for a run of this session (None without a session id)."""
+    _prune()
+    if not session_id:
+        return None
+    previous = _buffers.get(session_id)
+    if previous is not None:
+        previous.finish()
+    buffer = _buffers[session_id] = StreamReplayBuffer(session_id)
+    return buffer
+
+
+def get_stream_replay(session_id: str) -> Optional[StreamReplayBuffer]:
+    _prune()
+    return _buffers.get(session_id)
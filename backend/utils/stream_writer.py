@@ -0,0 +1,189 @@
+"""
+Stream Writer
+
+Coalescing writer for the newline-delimited JSON streaming endpoints.
+
+Text frames are cumulative (or, with the delta protocol, built from the
+current text at flush time), so intermediate ones can be merged: the
+writer keeps only the latest pending text frame and writes it once the
+flush window has elapsed or enough new text has accumulated. Frames that
+carry ext data (workflow updates, completion) are written immediately.
+
+STREAM_FLUSH_WINDOW_MS=0 writes every text frame as it arrives.
+
+With a replay buffer (see stream_replay) every frame also gets an event_id
+and is kept for /api/chat/resume; a write failure then detaches the writer
+instead of failing the run, so a resumed client still gets the rest.
+
+DisconnectWatcher cancels the request handler once the client connection
+closes (after a grace period while the run is resumable), so an abandoned
+agent run does not keep calling the LLM and tools.
+"""
+
+import json
+import time
+import asyncio
+from typing import Any, Callable, Dict, Optional
+
+from aiohttp import web
+
+from .globals import STREAM_FLUSH_WINDOW_MS, STREAM_FLUSH_MAX_BYTES, STREAM_RESUME_GRACE_SECONDS
+from .logger import log
+from .stream_replay import StreamReplayBuffer
+
+# How often the connection of a streaming request is checked
+CLIENT_DISCONNECT_POLL_INTERVAL = 0.5
+
+
+class CoalescingStreamWriter:
+    """Batches text frames by time window and size; other frames are written immediately."""
+
+    def __init__(self, response: web.StreamResponse,
+                 window_ms: float = STREAM_FLUSH_WINDOW_MS,
+                 max_bytes: int = STREAM_FLUSH_MAX_BYTES,
+                 replay: Optional[StreamReplayBuffer] = None):
+        self.response = response
+        self.replay = replay
+        # Set once a write failed; frames then only go to the replay buffer
+        self.detached = False
+        self.window = max(0.0, window_ms / 1000.0)
+        self.max_bytes = max(0, max_bytes)
+        self._lock = asyncio.Lock()
+        self._pending: Optional[Callable[[], Dict[str, Any]]] = None
+        self._pending_bytes = 0
+        self._last_flush = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    async def _write(self, frame: Dict[str, Any]) -> None:
+        self._last_flush = time.monotonic()
+        if self.replay is None:
+            await self.response.write(json.dumps(frame).encode() + b"\n")
+            return
+        event_id = self.replay.next_event_id()
+        payload = json.dumps({**frame, "event_id": event_id}).encode() + b"\n"
+        self.replay.append(event_id, payload)
+        if self.detached:
+            return
+        try:
+            await self.response.write(payload)
+        except ConnectionError as e:
+            self.detached = True
+            log.info(f"Stream client disconnected at event {event_id}, run stays resumable: {e}")
+
+    def _cancel_timer(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    async def _flush_pending(self) -> None:
+        self._cancel_timer()
+        build_frame, self._pending = self._pending, None
+        self._pending_bytes = 0
+        if build_frame is not None:
+            await self._write(build_frame())
+
+    async def _flush_on_timer(self) -> None:
+        self._timer = None
+        try:
+            async with self._lock:
+                await self._flush_pending()
+        except Exception as e:
+            # Client went away; the next write on the request path reports it
+            log.debug(f"Deferred stream flush failed: {e}")
+
+    async def write_text(self, build_frame: Callable[[], Dict[str, Any]], new_bytes: int) -> None:
+        """
+        Queue a text frame. build_frame is called at flush time, so it should
+        read the current text rather than capture it.
+        """
+        async with self._lock:
+            self._pending = build_frame
+            self._pending_bytes += new_bytes
+            elapsed = time.monotonic() - self._last_flush
+            if elapsed >= self.window or self._pending_bytes >= self.max_bytes:
+                await self._flush_pending()
+            elif self._timer is None:
+                loop = asyncio.get_running_loop()
+                self._timer = loop.call_later(self.window - elapsed,
+                                              lambda: asyncio.ensure_future(self._flush_on_timer()))
+
+    async def send(self, frame: Dict[str, Any], replaces_text: bool = False) -> None:
+        """
+        Write a frame now. Pending text is flushed first, or dropped when the
+        frame already carries the full text (replaces_text=True).
+        """
+        async with self._lock:
+            if replaces_text:
+                self._cancel_timer()
+                self._pending = None
+                self._pending_bytes = 0
+            else:
+                await self._flush_pending()
+            await self._write(frame)
+
+    async def close(self) -> None:
+        """Flush pending text and stop the timer."""
+        async with self._lock:
+            await self._flush_pending()
+
+    async def finish(self) -> None:
+        """Mark the run finished for resumers and end the response if the client is still there."""
+        self._cancel_timer()
+        if self.replay is not None:
+            self.replay.finish()
+        if not self.detached:
+            try:
+                await self.response.write_eof()
+            except ConnectionError as e:
+                log.info(f"Stream client disconnected before the end of the response: {e}")
+
+
+def is_client_connected(request: web.Request) -> bool:
+    transport = request.transport
+    return transport is not None and not transport.is_closing()
+
+
+class DisconnectWatcher:
+    """
+    Cancels the current (handler) task when the client disconnects.
+
+    With a replay buffer the run is cancelled only after nobody (neither the
+    original client nor a /api/chat/resume reader) followed it for `grace`
+    seconds. The handler catches the CancelledError, checks `disconnected`
+    to tell it apart from other cancellations, and calls stop() when done.
+    """
+
+    def __init__(self, request: web.Request, replay: Optional[StreamReplayBuffer] = None,
+                 grace: float = STREAM_RESUME_GRACE_SECONDS,
+                 poll_interval: float = CLIENT_DISCONNECT_POLL_INTERVAL):
+        self.request = request
+        self.replay = replay
+        self.grace = grace if replay is not None else 0.0
+        self.disconnected = False
+        self._task = asyncio.current_task()
+        self._watcher = asyncio.ensure_future(self._watch(poll_interval))
+
+    def _followed(self) -> bool:
+        return is_client_connected(self.request) or (self.replay is not None and self.replay.readers > 0)
+
+    async def _watch(self, poll_interval: float) -> None:
+        unfollowed_since: Optional[float] = None
+        while True:
+            await asyncio.sleep(poll_interval)
+            if self._followed():
+                unfollowed_since = None
+                continue
+            now = time.monotonic()
+            if unfollowed_since is None:
+                unfollowed_since = now
+            if now - unfollowed_since >= self.grace:
+                self.disconnected = True
+                log.info(f"Client disconnected from {self.request.path}, cancelling the run")
+                self._task.cancel()
+                return
+
+    def stop(self) -> None:
+        self._watcher.cancel()
+        if self.disconnected and hasattr(self._task, "uncancel"):
+            # The cancellation was handled; do not leave it counted on the task (Python 3.11+)
+            self._task.uncancel()
@@ -0,0 +1,91 @@
+"""
+Workflow Patch
+
+RFC 6902 (JSON Patch) diffs for the workflow_data carried by workflow_update
+and param_update ext items.
+
+Clients that opt in (workflow_patch=true in the request body) tell the server
+which workflow version they already have (workflow_checkpoint_id). Each ext
+item that carries a full workflow is then sent as
+{"base_version_id", "version_id", "workflow_patch"} instead of
+{"workflow_data"}, and the next patch is computed against that version.
+
+A full snapshot is sent instead whenever the base is unknown (no checkpoint,
+checkpoint from another session, item without version_id) or the patch would
+not be smaller than the workflow itself. Clients that cannot find the base
+version fetch the target version from /api/restore-workflow-checkpoint.
+"""
+
+import json
+from typing import Dict, Any, List, Optional
+
+PATCHABLE_EXT_TYPES = ("workflow_update", "param_update")
+
+
+def _escape(token: Any) -> str:
+    return str(token).replace("~", "~0").replace("/", "~1")
+
+
+def make_patch(old: Any, new: Any, path: str = "") -> List[Dict[str, Any]]:
+    """
+    add/remove/replace operations turning old into new.
+
+    Lists of different length are replaced as a whole; workflow inputs only
+    hold short lists (links, fixed-size values).
+    """
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops: List[Dict[str, Any]] = []
+        for key in old:
+            if key not in new:
+                ops.append({"op": "remove", "path": f"{path}/{_escape(key)}"})
+        for key, value in new.items():
+            child = f"{path}/{_escape(key)}"
+            if key not in old:
+                ops.append({"op": "add", "path": child, "value": value})
+            else:
+                ops.extend(make_patch(old[key], value, child))
+        return ops
+    if isinstance(old, list) and isinstance(new, list) and len(old) == len(new):
+        ops = []
+        for index, (old_item, new_item) in enumerate(zip(old, new)):
+            ops.extend(make_patch(old_item, new_item, f"{path}/{index}"))
+        return ops
+    # type() check keeps 1 -> True and 1 -> 1.0 as real changes
+    if type(old) is not type(new) or old != new:
+        return [{"op": "replace", "path": path, "value": new}]
+    return []
+
+
+class WorkflowPatchEncoder:
+    """Per-stream encoder tracking the workflow version the client holds."""
+
+    def __init__(self, base_version_id: Optional[int] = None, base_workflow: Optional[Dict[str, Any]] = None):
+        self._version_id = base_version_id if base_workflow is not None else None
+        self._workflow = base_workflow
+
+    def encode(self, ext: Optional[List[Any]]) -> Optional[List[Any]]:
+        """Return ext with full workflows replaced by patches where possible (items are not mutated)."""
+        if not ext:
+            return ext
+        return [self._encode_item(item) for item in ext]
+
+    def _encode_item(self, item: Any) -> Any:
+        data = item.get("data") if isinstance(item, dict) and item.get("type") in PATCHABLE_EXT_TYPES else None
+        if not isinstance(data, dict) or not isinstance(data.get("workflow_data"), dict):
+            return item
+
+        workflow = data["workflow_data"]
+        version_id = data.get("version_id")
+        encoded = item
+        if self._workflow is not None and version_id is not None:
+            patch = make_patch(self._workflow, workflow)
+            if len(json.dumps(patch)) < len(json.dumps(workflow)):
+                patched_data = {k: v for k, v in data.items() if k != "workflow_data"}
+                patched_data["base_version_id"] = self._version_id
+                patched_data["workflow_patch"] = patch
+                encoded = {**item, "data": patched_data}
+
+        # Without a version id the client cannot reference this state, so no patch can follow it
+        self._workflow = workflow if version_id is not None else None
+        self._version_id = version_id
+        return encoded
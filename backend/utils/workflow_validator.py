@@ -0,0 +1,322 @@
+"""
+Workflow Validator
+
+Static validation of API-format workflows against the cached node catalog
+(object_info), without a round trip to ComfyUI. Checks:
+
+- unknown node classes,
+- missing required inputs,
+- links to nodes that do not exist and malformed links,
+- output indices out of range for the source node,
+- link type mismatches (with "*" and comma-separated type handling),
+- enum values not in the allowed list and numbers outside min/max,
+- dependency cycles,
+- prompts without any output node.
+
+The result uses the same structure and error type names as ComfyUI's own
+validation (/api/prompt), so callers can treat both the same way.
+
+Enum and min/max checks are only advisory: the cached catalog can be older
+than the model and input folders (a just-uploaded image, a model added after
+the catalog was built), so prevalidate_workflow() decides on structural
+errors alone and leaves everything else to ComfyUI. Inputs that a node
+checks itself in VALIDATE_INPUTS are not value-checked at all, as in ComfyUI.
+"""
+
+from typing import Callable, Collection, Dict, Any, List, Optional, Set, Tuple
+
+from .node_type_index import WILDCARD_TYPE, split_io_type
+
+# Error types grouped by the agent that can fix them
+CONNECTION_ERROR_TYPES = {
+    "required_input_missing",
+    "return_type_mismatch",
+    "bad_linked_input",
+    "dangling_link",
+    "output_index_out_of_range",
+    "dependency_cycle",
+}
+PARAMETER_ERROR_TYPES = {
+    "value_not_in_list",
+    "value_smaller_than_min",
+    "value_bigger_than_max",
+    "invalid_input_type",
+}
+# Errors that depend on file listings and option ranges of a possibly stale catalog
+ADVISORY_ERROR_TYPES = PARAMETER_ERROR_TYPES
+
+# class_type -> (VALIDATE_INPUTS argument names, takes **kwargs), None without VALIDATE_INPUTS
+SelfValidatedInputs = Callable[[str], Optional[Tuple[Collection[str], bool]]]
+
+
+def is_link(value: Any) -> bool:
+    """ComfyUI treats every two-element list in "inputs" as a link."""
+    return isinstance(value, list) and len(value) == 2
+
+
+def is_type_compatible(received_type: Any, input_type: Any) -> bool:
+    """Same rule as ComfyUI's validate_node_input (non-strict)."""
+    if not isinstance(received_type, str) or not isinstance(input_type, str):
+        # Enum (combo) inputs and non-string types are not checked
+        return True
+    if WILDCARD_TYPE in (received_type, input_type) or received_type == input_type:
+        return True
+    return bool(set(split_io_type(received_type)) & set(split_io_type(input_type)))
+
+
+def _normalize_option(value: Any) -> Any:
+    return value.replace("\\", "/") if isinstance(value, str) else value
+
+
+class _Result:
+    def __init__(self, workflow: Dict[str, Any]):
+        self.workflow = workflow
+        self.node_errors: Dict[str, Dict[str, Any]] = {}
+
+    def add(self, node_id: str, error_type: str, message: str, details: str, input_name: Optional[str] = None, **extra) -> None:
+        node = self.workflow.get(node_id) if isinstance(self.workflow.get(node_id), dict) else {}
+        entry = self.node_errors.setdefault(str(node_id), {
+            "errors": [],
+            "dependent_outputs": [],
+            "class_type": node.get("class_type"),
+        })
+        extra_info = dict(extra)
+        if input_name is not None:
+            extra_info["input_name"] = input_name
+        entry["errors"].append({
+            "type": error_type,
+            "message": message,
+            "details": details,
+            "extra_info": extra_info,
+        })
+
+
+def _check_link(result: _Result, object_info: Dict[str, Any], node_id: str, input_name: str, value: List[Any], input_type: Any,
+                check_type: bool = True) -> None:
+    source_id, output_index = value
+    if not isinstance(source_id, (str, int)) or isinstance(output_index, bool) or not isinstance(output_index, int):
+        result.add(node_id, "bad_linked_input", "Bad linked input, must be a length-2 list of [node_id, slot_index]",
+                   f"{input_name}", input_name, received_value=value)
+        return
+
+    source = result.workflow.get(str(source_id))
+    if not isinstance(source, dict):
+        result.add(node_id, "dangling_link", "Linked node does not exist",
+                   f"{input_name}: node '{source_id}' is not in the workflow", input_name, linked_node=str(source_id))
+        return
+
+    source_meta = object_info.get(source.get("class_type"))
+    if not isinstance(source_meta, dict):
+        return  # reported as missing_node_type on the source node
+
+    outputs = source_meta.get("output") or []
+    if output_index < 0 or output_index >= len(outputs):
+        result.add(node_id, "output_index_out_of_range", "Linked output index is out of range",
+                   f"{input_name}: node '{source_id}' ({source.get('class_type')}) has {len(outputs)} output(s), got index {output_index}",
+                   input_name, linked_node=[str(source_id), output_index])
+        return
+
+    received_type = outputs[output_index]
+    if check_type and not is_type_compatible(received_type, input_type):
+        result.add(node_id, "return_type_mismatch", "Return type mismatch between linked nodes",
+                   f"{input_name}, received_type({received_type}) mismatch input_type({input_type})",
+                   input_name, received_type=received_type, linked_node=[str(source_id), output_index])
+
+
+def _check_value(result: _Result, node_id: str, input_name: str, value: Any, input_config: Any) -> None:
+    if not isinstance(input_config, (list, tuple)) or not input_config:
+        return
+    input_type = input_config[0]
+    options = input_config[1] if len(input_config) > 1 and isinstance(input_config[1], dict) else {}
+
+    allowed = None
+    if isinstance(input_type, (list, tuple)):
+        allowed = input_type
+    elif input_type == "COMBO" and isinstance(options.get("options"), list):
+        allowed = options["options"]
+
+    if allowed is not None:
+        if allowed and _normalize_option(value) not in {_normalize_option(v) for v in allowed}:
+            shown = list(allowed[:20]) + (["..."] if len(allowed) > 20 else [])
+            result.add(node_id, "value_not_in_list", "Value not in list",
+                       f"{input_name}: '{value}' not in {shown}", input_name, received_value=value)
+        return
+
+    if input_type in ("INT", "FLOAT"):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            if not isinstance(value, str):
+                result.add(node_id, "invalid_input_type", f"Failed to convert an input value to a {input_type} value",
+                           f"{input_name}, {value}", input_name, received_value=value)
+            return
+        minimum, maximum = options.get("min"), options.get("max")
+        if isinstance(minimum, (int, float)) and value < minimum:
+            result.add(node_id, "value_smaller_than_min", f"Value {value} smaller than min of {minimum}",
+                       f"{input_name}", input_name, received_value=value)
+        if isinstance(maximum, (int, float)) and value > maximum:
+            result.add(node_id, "value_bigger_than_max", f"Value {value} bigger than max of {maximum}",
+                       f"{input_name}", input_name, received_value=value)
+
+
+def _find_cycle_nodes(workflow: Dict[str, Any]) -> Set[str]:
+    """Nodes that take part in a link cycle (iterative DFS)."""
+    edges: Dict[str, List[str]] = {}
+    for node_id, node in workflow.items():
+        deps = []
+        if isinstance(node, dict):
+            for value in (node.get("inputs") or {}).values():
+                if is_link(value) and str(value[0]) in workflow:
+                    deps.append(str(value[0]))
+        edges[str(node_id)] = deps
+
+    WHITE, GRAY, BLACK = 0, 1, 2
+    color = {n: WHITE for n in edges}
+    in_cycle: Set[str] = set()
+    for root in edges:
+        if color[root] != WHITE:
+            continue
+        stack = [(root, iter(edges[root]))]
+        path = [root]
+        color[root] = GRAY
+        while stack:
+            node, children = stack[-1]
+            child = next(children, None)
+            if child is None:
+                color[node] = BLACK
+                stack.pop()
+                path.pop()
+            elif color[child] == GRAY:
+                in_cycle.update(path[path.index(child):])
+            elif color[child] == WHITE:
+                color[child] = GRAY
+                stack.append((child, iter(edges[child])))
+                path.append(child)
+    return in_cycle
+
+
+def validate_workflow(workflow: Dict[str, Any], object_info: Dict[str, Any],
+                      self_validated_inputs: Optional[SelfValidatedInputs] = None) -> Dict[str, Any]:
+    """
+    Validate an API-format workflow against the node catalog.
+
+    self_validated_inputs tells which inputs a node class checks itself in
+    VALIDATE_INPUTS (see comfy_gateway.get_self_validated_inputs); those are
+    not value-checked, and links are not type-checked when it receives
+    "input_types".
+
+    Returns:
+        {"success": bool, "error": {...} (on failure), "node_errors": {node_id: {...}}}
+    """
+    if not isinstance(workflow, dict) or not workflow:
+        return {
+            "success": False,
+            "error": {"type": "invalid_prompt", "message": "Workflow is empty or not an object", "details": "", "extra_info": {}},
+            "node_errors": {},
+        }
+
+    result = _Result(workflow)
+    has_output = False
+
+    for node_id, node in workflow.items():
+        node_id = str(node_id)
+        if not isinstance(node, dict) or "class_type" not in node:
+            result.add(node_id, "missing_class_type", "Node is missing the class_type property", f"Node ID '#{node_id}'")
+            continue
+
+        class_type = node["class_type"]
+        meta = object_info.get(class_type)
+        if not isinstance(meta, dict):
+            result.add(node_id, "missing_node_type", f"Node '{class_type}' not found. The custom node may not be installed.",
+                       f"Node ID '#{node_id}'", class_type=class_type)
+            continue
+        if meta.get("output_node"):
+            has_output = True
+
+        inputs = node.get("inputs") or {}
+        validated_names, validates_all = (), False
+        if self_validated_inputs is not None:
+            validated_names, validates_all = self_validated_inputs(class_type) or ((), False)
+        input_meta = meta.get("input") or {}
+        required = input_meta.get("required") or {}
+        optional = input_meta.get("optional") or {}
+
+        for input_name, input_config in required.items():
+            if input_name not in inputs:
+                result.add(node_id, "required_input_missing", "Required input is missing", f"{input_name}", input_name)
+
+        for input_name, value in inputs.items():
+            input_config = required.get(input_name, optional.get(input_name))
+            if input_config is None:
+                continue  # extra inputs are ignored by ComfyUI
+            if is_link(value):
+                input_type = input_config[0] if isinstance(input_config, (list, tuple)) and input_config else None
+                _check_link(result, object_info, node_id, input_name, value, input_type,
+                            check_type="input_types" not in validated_names)
+            elif not validates_all and input_name not in validated_names:
+                _check_value(result, node_id, input_name, value, input_config)
+
+    for node_id in sorted(_find_cycle_nodes(workflow)):
+        result.add(node_id, "dependency_cycle", "Dependency cycle detected", f"Node ID '#{node_id}' is part of a link cycle")
+
+    if result.node_errors:
+        return {
+            "success": False,
+            "error": {"type": "prompt_outputs_failed_validation", "message": "Prompt outputs failed validation", "details": "", "extra_info": {}},
+            "node_errors": result.node_errors,
+        }
+    if not has_output:
+        return {
+            "success": False,
+            "error": {"type": "prompt_no_outputs", "message": "Prompt has no outputs", "details": "", "extra_info": {}},
+            "node_errors": {},
+        }
+    return {"success": True, "node_errors": {}}
+
+
+def error_types(validation_result: Dict[str, Any]) -> List[str]:
+    """All error type names in a validation result (top-level and per node)."""
+    types: List[str] = []
+    error = validation_result.get("error")
+    if isinstance(error, dict) and error.get("type"):
+        types.append(error["type"])
+    for entry in (validation_result.get("node_errors") or {}).values():
+        if isinstance(entry, dict):
+            types.extend(e.get("type") for e in entry.get("errors") or [] if isinstance(e, dict) and e.get("type"))
+    return types
+
+
+def structural_errors(validation_result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    The failed result restricted to errors the catalog can decide on its own
+    (advisory errors dropped), or None if there are none.
+    """
+    if validation_result.get("success"):
+        return None
+    node_errors = {}
+    for node_id, entry in (validation_result.get("node_errors") or {}).items():
+        errors = [e for e in entry.get("errors") or [] if e.get("type") not in ADVISORY_ERROR_TYPES]
+        if errors:
+            node_errors[node_id] = {**entry, "errors": errors}
+    if not node_errors and validation_result.get("node_errors"):
+        return None
+    return {**validation_result, "node_errors": node_errors}
+
+
+async def prevalidate_workflow(workflow: Dict[str, Any], base_url: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Validate against the cached catalog. Returns the failed result when the
+    workflow has structural errors; None when ComfyUI has to decide (no
+    structural errors, or the catalog is unavailable).
+    """
+    from .comfy_gateway import get_gateway, get_self_validated_inputs
+
+    gateway = get_gateway(base_url)
+    object_info = await gateway.get_object_info()
+    if not object_info:
+        return None
+    # VALIDATE_INPUTS is only known for the node classes of this process
+    result = validate_workflow(workflow, object_info, get_self_validated_inputs if gateway.is_local else None)
+    errors = structural_errors(result)
+    if errors is None:
+        return None
+    errors["static_validation"] = True
+    return errors
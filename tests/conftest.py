@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Import the plugin's backend package directly; the repository root __init__.py
+# is the ComfyUI entry point and needs a running ComfyUI.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,54 @@
+from backend.utils.execution_monitor import (
+    STATUS_ERROR,
+    STATUS_SUCCESS,
+    ExecutionMonitor,
+)
+
+PROMPT_ID = "prompt-1"
+IMAGES = {"images": [{"filename": "ComfyUI_00001_.png", "subfolder": "", "type": "output"}]}
+
+
+def _run(monitor, events):
+    for event, data in events:
+        monitor.dispatch(event, dict(data, prompt_id=PROMPT_ID))
+    return monitor.track(PROMPT_ID)
+
+
+def test_executing_none_after_success_keeps_status():
+    execution = _run(ExecutionMonitor(), [
+        ("execution_start", {}),
+        ("executing", {"node": "9"}),
+        ("executed", {"node": "9", "output": IMAGES}),
+        ("execution_success", {}),
+        ("executing", {"node": None}),
+    ])
+    assert execution.done
+    assert execution.status == STATUS_SUCCESS
+    assert execution.outputs == {"9": IMAGES}
+    assert execution.summary()["status"] == STATUS_SUCCESS
+
+
+def test_executing_none_after_error_keeps_status():
+    execution = _run(ExecutionMonitor(), [
+        ("execution_start", {}),
+        ("executing", {"node": "3"}),
+        ("executed", {"node": "3", "output": IMAGES}),
+        ("executing", {"node": "5"}),
+        ("execution_error", {"node_id": "5", "node_type": "KSampler", "exception_message": "boom"}),
+        ("executing", {"node": None}),
+    ])
+    assert execution.done
+    assert execution.status == STATUS_ERROR
+    assert execution.error["node_id"] == "5"
+    assert execution.outputs == {"3": IMAGES}
+
+
+def test_executing_none_alone_completes_older_servers():
+    execution = _run(ExecutionMonitor(), [
+        ("execution_start", {}),
+        ("executing", {"node": "9"}),
+        ("executed", {"node": "9", "output": IMAGES}),
+        ("executing", {"node": None}),
+    ])
+    assert execution.status == STATUS_SUCCESS
+    assert execution.outputs == {"9": IMAGES}
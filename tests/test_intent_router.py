@@ -0,0 +1,102 @@
+import pytest
+
+from backend.service import intent_router
+from backend.service.intent_router import INTENT_ANALYZE, INTENT_REWRITE, INTENT_SEARCH, rewrite_input, route_intent
+
+
+@pytest.fixture(autouse=True)
+def _router_settings(monkeypatch):
+    monkeypatch.setattr(intent_router, "DISABLE_INTENT_ROUTER", False)
+    monkeypatch.setattr(intent_router, "INTENT_ROUTER_MIN_CONFIDENCE", 0.8)
+
+
+def _user(content):
+    return [{"role": "user", "content": content}]
+
+
+@pytest.mark.parametrize("text, expected", [
+    # Clear edits of the current workflow
+    ("add a LoRA to the current workflow", INTENT_REWRITE),
+    ("I want to add a face detailer to my workflow", INTENT_REWRITE),
+    ("change the sampler to euler", INTENT_REWRITE),
+    ("remove the upscale node", INTENT_REWRITE),
+    ("replace the checkpoint with sdxl", INTENT_REWRITE),
+    ("set steps to 30 and cfg to 7", INTENT_REWRITE),
+    ("把当前工作流的采样步数改成30", INTENT_REWRITE),
+    ("加一个controlnet", INTENT_REWRITE),
+    ("调整一下cfg", INTENT_REWRITE),
+    # Clear analysis of the current workflow
+    ("Please explain this workflow", INTENT_ANALYZE),
+    ("how does this workflow work?", INTENT_ANALYZE),
+    ("分析一下当前的工作流", INTENT_ANALYZE),
+    ("这个工作流是怎么工作的？", INTENT_ANALYZE),
+    # New workflows
+    ("generate a new workflow for anime portraits", INTENT_SEARCH),
+    # Questions mention edit verbs without asking for an edit
+    ("how do I add a lora?", None),
+    ("which nodes can change the resolution?", None),
+    ("what does the VAE node do?", None),
+    ("能帮我加一个lora吗", None),
+    ("Can you update me on the latest flux models?", None),
+    # Weak evidence
+    ("find me a workflow for product photos", None),
+    ("upscale my image", None),
+    # Abstain: errors, prompt writing, follow-ups, short replies
+    ("fix this error: Traceback (most recent call last): KeyError 'model'", None),
+    ("write a prompt for a cat and add it to the workflow", None),
+    ("change the sampler back", None),
+    ("add the same LoRA as before to the workflow", None),
+    ("把采样器改回原来的", None),
+    ("ok", None),
+])
+def test_route_intent(text, expected):
+    decision = route_intent(_user(text))
+    assert (decision.intent if decision else None) == expected
+
+
+def test_route_intent_uses_last_user_message():
+    messages = [
+        {"role": "user", "content": "explain this workflow"},
+        {"role": "assistant", "content": "This workflow ..."},
+        {"role": "user", "content": [{"type": "text", "text": "replace the checkpoint with sdxl"}]},
+    ]
+    assert route_intent(messages).intent == INTENT_REWRITE
+
+
+def test_route_intent_skips_images():
+    content = [{"type": "text", "text": "add a LoRA to the current workflow"},
+               {"type": "image_url", "image_url": {"url": "data:image/png;base64,..."}}]
+    assert route_intent(_user(content)) is None
+
+
+def test_route_intent_threshold(monkeypatch):
+    # "change the sampler to euler" scores just above 0.8
+    monkeypatch.setattr(intent_router, "INTENT_ROUTER_MIN_CONFIDENCE", 0.9)
+    assert route_intent(_user("change the sampler to euler")) is None
+    assert route_intent(_user("add a LoRA to the current workflow")).intent == INTENT_REWRITE
+
+
+def test_route_intent_disabled(monkeypatch):
+    monkeypatch.setattr(intent_router, "DISABLE_INTENT_ROUTER", True)
+    assert route_intent(_user("add a LoRA to the current workflow")) is None
+
+
+def test_rewrite_input_first_turn():
+    assert rewrite_input(_user("add a LoRA"), "add a LoRA") == [{"role": "user", "content": "add a LoRA"}]
+
+
+def test_rewrite_input_keeps_earlier_user_turns():
+    messages = [
+        {"role": "user", "content": "add a LoRA to the current workflow"},
+        {"role": "assistant", "content": "Added LoraLoader."},
+        {"role": "user", "content": [{"type": "text", "text": "make it anime style"},
+                                     {"type": "image_url", "image_url": {"url": "data:..."}}]},
+        {"role": "assistant", "content": "Done."},
+        {"role": "user", "content": "set the lora strength to 0.6"},
+    ]
+    (message,) = rewrite_input(messages, "set the lora strength to 0.6")
+    assert message["role"] == "user"
+    content = message["content"]
+    assert "- add a LoRA to the current workflow\n- make it anime style\n" in content
+    assert content.endswith("Current request: set the lora strength to 0.6")
+    assert "Added LoraLoader" not in content
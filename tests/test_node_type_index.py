@@ -0,0 +1,48 @@
+from backend.utils.node_type_index import NodeTypeIndex
+
+OBJECT_INFO = {
+    "VAEDecode": {
+        "input": {"required": {"samples": ["LATENT"], "vae": ["VAE"]}},
+        "output": ["IMAGE"],
+    },
+    "SaveImage": {
+        "input": {"required": {"images": ["IMAGE"], "filename_prefix": ["STRING", {}]}},
+        "output": [],
+    },
+    "Reroute": {
+        "input": {"required": {"value": ["*"]}},
+        "output": ["*"],
+    },
+    "ImageOrMask": {
+        "input": {"optional": {"source": ["IMAGE,MASK"]}},
+        "output": ["MASK"],
+    },
+}
+
+
+def _tables(index):
+    return (index.producers, index.consumers, index.wildcard_producers, index.wildcard_consumers)
+
+
+def test_remove_matches_rebuild_without_class():
+    for removed in OBJECT_INFO:
+        index = NodeTypeIndex.build(OBJECT_INFO)
+        index.remove(removed)
+        rest = {name: meta for name, meta in OBJECT_INFO.items() if name != removed}
+        assert _tables(index) == _tables(NodeTypeIndex.build(rest)), removed
+
+
+def test_remove_then_add_restores_class():
+    index = NodeTypeIndex.build(OBJECT_INFO)
+    index.remove("VAEDecode")
+    assert "LATENT" not in index.consumers
+    index.add("VAEDecode", OBJECT_INFO["VAEDecode"])
+    assert ("VAEDecode", 0) in index.producers_of("IMAGE")
+    index.remove("VAEDecode")
+    assert ("VAEDecode", 0) not in index.producers_of("IMAGE")
+
+
+def test_remove_unknown_class_is_noop():
+    index = NodeTypeIndex.build(OBJECT_INFO)
+    index.remove("NotInstalled")
+    assert _tables(index) == _tables(NodeTypeIndex.build(OBJECT_INFO))
@@ -0,0 +1,51 @@
+import asyncio
+
+from backend.utils.object_info_cache import ObjectInfoCache
+
+OLD_CATALOG = {"KSampler": {"output": ["LATENT"]}}
+NEW_CATALOG = {"KSampler": {"output": ["LATENT"]}, "MyCustomNode": {"output": ["IMAGE"]}}
+
+
+def test_invalidate_discards_in_flight_fetch():
+    async def scenario():
+        cache = ObjectInfoCache()
+        started = asyncio.Event()
+        release = asyncio.Event()
+        calls = []
+
+        async def fetcher():
+            calls.append(len(calls))
+            if len(calls) == 1:
+                # First fetch is slow and returns the catalog from before the invalidate
+                started.set()
+                await release.wait()
+                return OLD_CATALOG
+            return NEW_CATALOG
+
+        first = asyncio.ensure_future(cache.get(fetcher))
+        await started.wait()
+
+        cache.invalidate()
+        release.set()
+
+        assert await first == NEW_CATALOG
+        assert cache.peek() == NEW_CATALOG
+        assert len(calls) == 2
+        assert await cache.get(fetcher) == NEW_CATALOG
+        assert len(calls) == 2
+
+    asyncio.run(scenario())
+
+
+def test_refresh_without_invalidate_is_stored():
+    async def scenario():
+        cache = ObjectInfoCache()
+
+        async def fetcher():
+            return OLD_CATALOG
+
+        assert await cache.get(fetcher) == OLD_CATALOG
+        assert cache.peek() == OLD_CATALOG
+        assert cache.version == 1
+
+    asyncio.run(scenario())
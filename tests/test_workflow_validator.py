@@ -0,0 +1,209 @@
+import copy
+
+import pytest
+
+from backend.utils.workflow_validator import error_types, structural_errors, validate_workflow
+
+OBJECT_INFO = {
+    "CheckpointLoaderSimple": {
+        "input": {"required": {"ckpt_name": [["sd15.safetensors", "sdxl.safetensors"]]}},
+        "output": ["MODEL", "CLIP", "VAE"],
+    },
+    "CLIPTextEncode": {
+        "input": {"required": {"text": ["STRING", {"multiline": True}], "clip": ["CLIP"]}},
+        "output": ["CONDITIONING"],
+    },
+    "EmptyLatentImage": {
+        "input": {"required": {"width": ["INT", {"default": 512, "min": 16, "max": 8192}]}},
+        "output": ["LATENT"],
+    },
+    "KSampler": {
+        "input": {
+            "required": {
+                "model": ["MODEL"],
+                "positive": ["CONDITIONING"],
+                "latent_image": ["LATENT"],
+                "steps": ["INT", {"default": 20, "min": 1, "max": 10000}],
+                "cfg": ["FLOAT", {"default": 8.0, "min": 0.0, "max": 100.0}],
+                "sampler_name": ["COMBO", {"options": ["euler", "dpmpp_2m"]}],
+            },
+        },
+        "output": ["LATENT"],
+    },
+    "VAEDecode": {
+        "input": {"required": {"samples": ["LATENT"], "vae": ["VAE"]}},
+        "output": ["IMAGE"],
+    },
+    "ImageOrMask": {
+        "input": {"required": {"pixels": ["IMAGE,MASK"]}, "optional": {"anything": ["*"]}},
+        "output": ["IMAGE"],
+    },
+    "LoadImage": {
+        "input": {"required": {"image": [["example.png"], {"image_upload": True}]}},
+        "output": ["IMAGE", "MASK"],
+    },
+    "SaveImage": {
+        "input": {"required": {"images": ["IMAGE"]}},
+        "output": [],
+        "output_node": True,
+    },
+}
+
+WORKFLOW = {
+    "1": {"class_type": "CheckpointLoaderSimple", "inputs": {"ckpt_name": "sd15.safetensors"}},
+    "2": {"class_type": "CLIPTextEncode", "inputs": {"text": "a cat", "clip": ["1", 1]}},
+    "3": {"class_type": "EmptyLatentImage", "inputs": {"width": 512}},
+    "4": {"class_type": "KSampler", "inputs": {
+        "model": ["1", 0], "positive": ["2", 0], "latent_image": ["3", 0],
+        "steps": 20, "cfg": 7.5, "sampler_name": "euler",
+    }},
+    "5": {"class_type": "VAEDecode", "inputs": {"samples": ["4", 0], "vae": ["1", 2]}},
+    "6": {"class_type": "SaveImage", "inputs": {"images": ["5", 0]}},
+}
+
+
+def _workflow(**changes):
+    """WORKFLOW with node inputs replaced: _workflow(**{"4": {"steps": 0}})."""
+    workflow = copy.deepcopy(WORKFLOW)
+    for node_id, inputs in changes.items():
+        workflow[node_id]["inputs"].update(inputs)
+    return workflow
+
+
+def _node_error_types(result, node_id):
+    return [e["type"] for e in result["node_errors"].get(node_id, {}).get("errors", [])]
+
+
+def test_valid_workflow():
+    assert validate_workflow(WORKFLOW, OBJECT_INFO) == {"success": True, "node_errors": {}}
+
+
+def test_empty_workflow():
+    result = validate_workflow({}, OBJECT_INFO)
+    assert not result["success"]
+    assert result["error"]["type"] == "invalid_prompt"
+
+
+def test_missing_class_type():
+    workflow = _workflow()
+    workflow["7"] = {"inputs": {}}
+    assert _node_error_types(validate_workflow(workflow, OBJECT_INFO), "7") == ["missing_class_type"]
+
+
+def test_missing_node_type():
+    workflow = _workflow()
+    workflow["7"] = {"class_type": "NotInstalled", "inputs": {}}
+    result = validate_workflow(workflow, OBJECT_INFO)
+    assert _node_error_types(result, "7") == ["missing_node_type"]
+    assert result["error"]["type"] == "prompt_outputs_failed_validation"
+
+
+def test_required_input_missing():
+    workflow = _workflow()
+    del workflow["5"]["inputs"]["vae"]
+    assert _node_error_types(validate_workflow(workflow, OBJECT_INFO), "5") == ["required_input_missing"]
+
+
+@pytest.mark.parametrize("link", [["1", "0"], [None, 0], ["1", True]])
+def test_bad_linked_input(link):
+    result = validate_workflow(_workflow(**{"5": {"vae": link}}), OBJECT_INFO)
+    assert _node_error_types(result, "5") == ["bad_linked_input"]
+
+
+def test_dangling_link():
+    result = validate_workflow(_workflow(**{"5": {"vae": ["99", 0]}}), OBJECT_INFO)
+    assert _node_error_types(result, "5") == ["dangling_link"]
+
+
+def test_output_index_out_of_range():
+    result = validate_workflow(_workflow(**{"5": {"vae": ["1", 3]}}), OBJECT_INFO)
+    assert _node_error_types(result, "5") == ["output_index_out_of_range"]
+
+
+def test_return_type_mismatch():
+    result = validate_workflow(_workflow(**{"5": {"vae": ["1", 0]}}), OBJECT_INFO)
+    assert _node_error_types(result, "5") == ["return_type_mismatch"]
+
+
+def test_comma_and_wildcard_types_are_compatible():
+    workflow = _workflow()
+    workflow["7"] = {"class_type": "ImageOrMask", "inputs": {"pixels": ["5", 0], "anything": ["1", 0]}}
+    assert validate_workflow(workflow, OBJECT_INFO)["success"]
+
+
+@pytest.mark.parametrize("node_id, inputs, expected", [
+    ("1", {"ckpt_name": "new_model.safetensors"}, "value_not_in_list"),
+    ("4", {"sampler_name": "unknown"}, "value_not_in_list"),
+    ("4", {"steps": 0}, "value_smaller_than_min"),
+    ("4", {"cfg": 101.0}, "value_bigger_than_max"),
+    ("3", {"width": None}, "invalid_input_type"),
+])
+def test_value_errors(node_id, inputs, expected):
+    result = validate_workflow(_workflow(**{node_id: inputs}), OBJECT_INFO)
+    assert _node_error_types(result, node_id) == [expected]
+
+
+def test_windows_paths_match_options():
+    info = {**OBJECT_INFO, "CheckpointLoaderSimple": {
+        "input": {"required": {"ckpt_name": [["sd\\sd15.safetensors"]]}},
+        "output": ["MODEL", "CLIP", "VAE"],
+    }}
+    assert validate_workflow(_workflow(**{"1": {"ckpt_name": "sd/sd15.safetensors"}}), info)["success"]
+
+
+def test_dependency_cycle():
+    workflow = _workflow()
+    workflow["7"] = {"class_type": "ImageOrMask", "inputs": {"pixels": ["8", 0]}}
+    workflow["8"] = {"class_type": "ImageOrMask", "inputs": {"pixels": ["7", 0]}}
+    result = validate_workflow(workflow, OBJECT_INFO)
+    assert _node_error_types(result, "7") == ["dependency_cycle"]
+    assert _node_error_types(result, "8") == ["dependency_cycle"]
+
+
+def test_prompt_no_outputs():
+    workflow = _workflow()
+    del workflow["6"]
+    result = validate_workflow(workflow, OBJECT_INFO)
+    assert result["error"]["type"] == "prompt_no_outputs"
+    assert structural_errors(result)["error"]["type"] == "prompt_no_outputs"
+
+
+def test_validate_inputs_skips_value_checks():
+    workflow = _workflow()
+    workflow["7"] = {"class_type": "LoadImage", "inputs": {"image": "uploaded_after_catalog.png [input]"}}
+    workflow["8"] = {"class_type": "SaveImage", "inputs": {"images": ["7", 0]}}
+    assert _node_error_types(validate_workflow(workflow, OBJECT_INFO), "7") == ["value_not_in_list"]
+
+    self_validated = {"LoadImage": (frozenset({"image"}), False)}
+    assert validate_workflow(workflow, OBJECT_INFO, self_validated.get)["success"]
+
+
+def test_validate_inputs_kwargs_skips_all_value_checks():
+    workflow = _workflow(**{"4": {"steps": 0, "sampler_name": "custom"}})
+    assert validate_workflow(workflow, OBJECT_INFO, {"KSampler": ((), True)}.get)["success"]
+    # Other inputs of classes without VALIDATE_INPUTS are still checked
+    result = validate_workflow(workflow, OBJECT_INFO, {"KSampler": (("steps",), False)}.get)
+    assert _node_error_types(result, "4") == ["value_not_in_list"]
+
+
+def test_validate_inputs_with_input_types_skips_link_type_checks():
+    workflow = _workflow(**{"5": {"vae": ["1", 0]}})
+    self_validated = {"VAEDecode": (("input_types",), False)}
+    assert validate_workflow(workflow, OBJECT_INFO, self_validated.get)["success"]
+
+
+def test_structural_errors_drop_advisory_errors():
+    advisory_only = validate_workflow(_workflow(**{"1": {"ckpt_name": "new_model.safetensors"}, "4": {"steps": 0}}),
+                                      OBJECT_INFO)
+    assert not advisory_only["success"]
+    assert structural_errors(advisory_only) is None
+
+    workflow = _workflow(**{"1": {"ckpt_name": "new_model.safetensors"}})
+    del workflow["5"]["inputs"]["vae"]
+    errors = structural_errors(validate_workflow(workflow, OBJECT_INFO))
+    assert error_types(errors) == ["prompt_outputs_failed_validation", "required_input_missing"]
+    assert list(errors["node_errors"]) == ["5"]
+
+
+def test_structural_errors_of_valid_workflow():
+    assert structural_errors(validate_workflow(WORKFLOW, OBJECT_INFO)) is None
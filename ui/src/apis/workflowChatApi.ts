@@ -15,6 +15,7 @@ import { Message, ChatResponse, OptimizedWorkflowRequest, OptimizedWorkflowRespo
 import { generateUUID } from '../utils/uuid';
 import { encryptWithRsaPublicKey } from '../utils/crypto';
 import { app } from '../utils/comfyapp';
+import { rememberWorkflowVersion } from '../utils/workflowPatch';
 
 const BASE_URL = config.apiBaseUrl
 
@@ -133,6 +134,63 @@ export namespace WorkflowChatAPI {
     }
   }
 
+  // Reads the newline-delimited JSON frames of a streaming response. If the
+  // connection drops before the final frame, the run is resumed from the last
+  // received event_id via /api/chat/resume (the backend keeps it running briefly).
+  const MAX_STREAM_RESUMES = 3;
+
+  async function* readStreamFrames(
+    response: Response,
+    resumeSessionId: string | null,
+    signal?: AbortSignal
+  ): AsyncGenerator<any> {
+    let current = response;
+    let lastEventId = 0;
+    let finished = false;
+    for (let resumes = 0; ; resumes++) {
+      const reader = current.body!.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      try {
+        while (true) {
+          const { done, value } = await reader.read();
+          if (done) break;
+          buffer += decoder.decode(value, { stream: true });
+          const lines = buffer.split('\n');
+          buffer = lines.pop() || '';
+          for (const line of lines) {
+            if (line.trim()) {
+              const frame = JSON.parse(line);
+              lastEventId = frame.event_id ?? lastEventId;
+              finished = finished || !!frame.finished;
+              yield frame;
+            }
+          }
+        }
+        if (buffer.trim()) {
+          yield JSON.parse(buffer);
+        }
+        return;
+      } catch (error) {
+        if (finished || signal?.aborted || !resumeSessionId || !lastEventId || resumes >= MAX_STREAM_RESUMES) {
+          throw error;
+        }
+        console.warn(`Stream interrupted after event ${lastEventId}, resuming...`, error);
+        await new Promise(resolve => setTimeout(resolve, 1000 * (resumes + 1)));
+        const resumed = await fetch(
+          `/api/chat/resume?session_id=${encodeURIComponent(resumeSessionId)}&last_event_id=${lastEventId}`,
+          { signal }
+        );
+        if (!resumed.ok || !resumed.body) {
+          throw error;
+        }
+        current = resumed;
+      } finally {
+        reader.releaseLock();
+      }
+    }
+  }
+
   export async function* streamInvokeServer(
     sessionId: string, 
     prompt: string, 
@@ -239,6 +297,8 @@ export namespace WorkflowChatAPI {
             userMessageId
           );
           workflowCheckpointId = checkpointData.checkpoint_id;
+          // Base version for workflow_update patches sent back in this stream
+          rememberWorkflowVersion(workflowCheckpointId, workflowPrompt.output);
           console.log(`Successfully saved workflow checkpoint with ID: ${workflowCheckpointId}`);
         } catch (error) {
           console.error('Failed to save workflow checkpoint before invoke:', error);
@@ -302,7 +362,9 @@ export namespace WorkflowChatAPI {
           ext: finalExt,
           messages: allOpenaiMessages,
           images: [],  // 保持向后兼容，但现在图片已经在messages中
-          workflow_checkpoint_id: workflowCheckpointId
+          workflow_checkpoint_id: workflowCheckpointId,
+          workflow_patch: true,  // workflow_update 以 JSON Patch 形式发送（基于 workflow_checkpoint_id）
+          stream_protocol: 2  // 增量协议：服务端只发送新增文本（不支持的服务端仍发送完整文本）
         }),
         signal: controller.signal
       });
@@ -312,30 +374,24 @@ export namespace WorkflowChatAPI {
       
       checkAndSaveApiKey(response);
       
-      const reader = response.body!.getReader();
-      let buffer = '';
-
-      while (true) {
-        const { done, value } = await reader.read();
-        if (done) break;
-        
-        buffer += new TextDecoder().decode(value);
-        const lines = buffer.split('\n');
-        buffer = lines.pop() || '';
-
-        for (const line of lines) {
-          if (line.trim()) {
-            yield {
-              ...JSON.parse(line) as ChatResponse,
-              message_id: messageId
-            };
-          }
+      let fullText = '';
+
+      // Delta frames carry an offset: text = text[:offset] + frame.text.
+      // Frames without an offset already carry the full text.
+      const parseFrame = (frame: ChatResponse & { offset?: number }): ChatResponse => {
+        if (typeof frame.offset === 'number') {
+          fullText = fullText.slice(0, frame.offset) + (frame.text ?? '');
+          return { ...frame, text: fullText };
         }
-      }
+        fullText = frame.text ?? fullText;
+        return frame;
+      };
 
-      if (buffer.trim()) {
+      // Only the local backend keeps runs resumable
+      const resumeSessionId = chatUrl.startsWith('/') ? sessionId : null;
+      for await (const frame of readStreamFrames(response, resumeSessionId, controller.signal)) {
         yield {
-          ...JSON.parse(buffer) as ChatResponse,
+          ...parseFrame(frame),
           message_id: messageId
         };
       }
@@ -946,6 +1002,7 @@ export namespace WorkflowChatAPI {
           goal: goal,
           messages: messages,
           model: model,
+          workflow_patch: true,
         }),
         signal: controller.signal
       });
@@ -956,45 +1013,16 @@ export namespace WorkflowChatAPI {
         throw new Error(`Agent mode request failed: ${response.statusText}`);
       }
 
-      const reader = response.body?.getReader();
-      if (!reader) {
+      if (!response.body) {
         throw new Error('No response body');
       }
 
-      let buffer = '';
       const messageId = generateUUID();
-      try {
-        while (true) {
-          const { done, value } = await reader.read();
-          if (done) break;
-
-          buffer += new TextDecoder().decode(value);
-          const lines = buffer.split('\n');
-          buffer = lines.pop() || '';
-
-          for (const line of lines) {
-            if (line.trim()) {
-              yield {
-                ...JSON.parse(line) as ChatResponse,
-                message_id: messageId
-              };
-            }
-          }
-        }
-
-        // Process remaining buffer
-        if (buffer.trim()) {
-          try {
-            yield {
-              ...JSON.parse(buffer) as ChatResponse,
-              message_id: messageId
-            };
-          } catch (parseError) {
-            console.error('Error parsing final agent mode response:', parseError);
-          }
-        }
-      } finally {
-        reader.releaseLock();
+      for await (const frame of readStreamFrames(response, session_id, controller.signal)) {
+        yield {
+          ...frame as ChatResponse,
+          message_id: messageId
+        };
       }
 
     } catch (error: unknown) {
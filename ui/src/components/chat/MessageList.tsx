@@ -264,17 +264,20 @@ export function MessageList({ messages, latestInput, onOptionClick, installedNod
 
                 // 处理工作流更新：实时更新画布 
                 if (workflowUpdateExt && workflowUpdateExt.data) {
-                    const { workflow_data } = workflowUpdateExt.data;
-                    if (typeof window !== 'undefined' && (window as any).app && workflow_data) {
+                    // workflow_data 为完整快照，workflow_patch 为基于 base_version_id 的增量
+                    const { workflow_data, workflow_patch, version_id } = workflowUpdateExt.data;
+                    if (typeof window !== 'undefined' && (window as any).app && (workflow_data || workflow_patch)) {
                         // 使用更具体的key，包含workflow_data的hash以检测实际内容变化
-                        const contentHash = JSON.stringify(workflow_data).slice(0, 100); // 简单的内容标识
+                        const contentHash = version_id ?? JSON.stringify(workflow_data || workflow_patch).slice(0, 100); // 简单的内容标识
                         const workflowUpdateKey = `workflow_update_${message.id}_${contentHash}`;
                         
                         if (!processedUpdates.current.has(workflowUpdateKey)) {
                             const applyWorkflowWithRetry = async (retryCount = 0) => {
                                 try {
                                     const { applyNewWorkflow } = await import('../../utils/graphUtils');
-                                    const success = applyNewWorkflow(workflow_data);
+                                    const { resolveWorkflowUpdate } = await import('../../utils/workflowPatch');
+                                    const resolvedWorkflow = await resolveWorkflowUpdate(workflowUpdateExt.data);
+                                    const success = !!resolvedWorkflow && applyNewWorkflow(resolvedWorkflow);
                                     
                                     if (success) {
                                         console.log('[MessageList] Successfully applied workflow update');
@@ -328,12 +331,15 @@ export function MessageList({ messages, latestInput, onOptionClick, installedNod
                             const applyParamsWithRetry = async (retryCount = 0) => {
                                 try {
                                     const { applyParameterChanges } = await import('../../utils/graphUtils');
+                                    const { rememberWorkflowUpdate } = await import('../../utils/workflowPatch');
                                     // 支持单个change对象或changes数组
                                     const changesList = Array.isArray(changes) ? changes : [changes];
                                     const success = applyParameterChanges(changesList);
                                     
                                     if (success) {
                                         console.log(`[MessageList] Successfully applied ${changesList.length} parameter changes`);
+                                        // 服务端以该版本作为下一个 workflow_patch 的基准
+                                        rememberWorkflowUpdate(paramUpdateExt.data);
                                         // 标记该更新已处理（只有成功时才标记）
                                         processedUpdates.current.add(paramUpdateKey);
                                     } else {
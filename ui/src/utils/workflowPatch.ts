@@ -0,0 +1,112 @@
+// Copyright (C) 2025 AIDC-AI
+// Licensed under the MIT License.
+
+// Resolves workflow_update ext data sent either as a full snapshot
+// ({ workflow_data, version_id }) or as an RFC 6902 patch against a version
+// this client already holds ({ base_version_id, version_id, workflow_patch }).
+
+import { WorkflowChatAPI } from "../apis/workflowChatApi";
+
+type PatchOp = { op: 'add' | 'remove' | 'replace'; path: string; value?: any };
+
+const MAX_CACHED_VERSIONS = 20;
+const workflowVersions = new Map<number, any>();
+
+export function rememberWorkflowVersion(versionId: number | null | undefined, workflow: any) {
+    if (versionId === null || versionId === undefined || !workflow) {
+        return;
+    }
+    workflowVersions.delete(versionId);
+    workflowVersions.set(versionId, workflow);
+    while (workflowVersions.size > MAX_CACHED_VERSIONS) {
+        workflowVersions.delete(workflowVersions.keys().next().value as number);
+    }
+}
+
+function unescapeToken(token: string): string {
+    return token.replace(/~1/g, '/').replace(/~0/g, '~');
+}
+
+export function applyJsonPatch(document: any, patch: PatchOp[]): any {
+    let result = JSON.parse(JSON.stringify(document));
+    for (const op of patch) {
+        if (op.path === '') {
+            result = JSON.parse(JSON.stringify(op.value));
+            continue;
+        }
+        const tokens = op.path.split('/').slice(1).map(unescapeToken);
+        const key = tokens.pop() as string;
+        let parent = result;
+        for (const token of tokens) {
+            parent = parent[Array.isArray(parent) ? Number(token) : token];
+            if (parent === undefined || parent === null) {
+                throw new Error(`Invalid patch path: ${op.path}`);
+            }
+        }
+        if (op.op === 'remove') {
+            if (Array.isArray(parent)) {
+                parent.splice(Number(key), 1);
+            } else {
+                delete parent[key];
+            }
+        } else {
+            parent[Array.isArray(parent) ? Number(key) : key] = JSON.parse(JSON.stringify(op.value));
+        }
+    }
+    return result;
+}
+
+// Remember the version carried by an ext item that is applied some other way
+// (param_update applies its changes list), so later patches can build on it.
+// Unlike resolveWorkflowUpdate it never fetches: an unknown base is skipped.
+export function rememberWorkflowUpdate(data: any) {
+    if (!data || data.version_id === undefined || data.version_id === null) {
+        return;
+    }
+    if (data.workflow_data) {
+        rememberWorkflowVersion(data.version_id, data.workflow_data);
+        return;
+    }
+    const base = data.workflow_patch ? workflowVersions.get(data.base_version_id) : undefined;
+    if (base && !workflowVersions.has(data.version_id)) {
+        try {
+            rememberWorkflowVersion(data.version_id, applyJsonPatch(base, data.workflow_patch));
+        } catch (error) {
+            console.warn('[workflowPatch] Failed to apply workflow patch:', error);
+        }
+    }
+}
+
+// Full API-format workflow for a workflow_update ext item, or null if none
+export async function resolveWorkflowUpdate(data: any): Promise<any | null> {
+    if (!data) {
+        return null;
+    }
+    if (data.workflow_data) {
+        rememberWorkflowVersion(data.version_id, data.workflow_data);
+        return data.workflow_data;
+    }
+    if (!data.workflow_patch || data.version_id === undefined || data.version_id === null) {
+        return null;
+    }
+
+    const cached = workflowVersions.get(data.version_id);
+    if (cached) {
+        return cached;
+    }
+    const base = workflowVersions.get(data.base_version_id);
+    if (base) {
+        try {
+            const workflow = applyJsonPatch(base, data.workflow_patch);
+            rememberWorkflowVersion(data.version_id, workflow);
+            return workflow;
+        } catch (error) {
+            console.warn('[workflowPatch] Failed to apply workflow patch, fetching full snapshot:', error);
+        }
+    }
+
+    // Base version unknown here: fall back to the full snapshot of the target version
+    const version = await WorkflowChatAPI.restoreWorkflowCheckpoint(data.version_id);
+    rememberWorkflowVersion(data.version_id, version.workflow_data);
+    return version.workflow_data;
+}